@@ -1,6 +1,7 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from services.metrics import metrics
 
 @csrf_exempt
 @require_http_methods(["GET"])
@@ -13,3 +14,12 @@ def health_check(request):
         'message': 'Backend is running',
         'version': '1.0.0'
     })
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def metrics_snapshot(request):
+    """
+    In-process service metrics (counters, ratios and timings) for this worker
+    """
+    return JsonResponse(metrics.snapshot())
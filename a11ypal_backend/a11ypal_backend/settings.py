@@ -173,3 +173,184 @@ CORS_ALLOW_ALL_ORIGINS = os.getenv("DEBUG")
 # Media files
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+
+# Object detection
+# Square model input size; pooled letterbox buffers are allocated per input shape
+OBJECT_DETECTION_INPUT_SIZE = int(os.getenv("OBJECT_DETECTION_INPUT_SIZE", "640"))
+
+# Pre-inference quality gate: frames whose Laplacian variance or mean luminance
+# (measured on a THUMBNAIL_SIZE grayscale thumbnail) fall below these thresholds
+# are answered with a retake hint instead of running the detector
+DETECTION_QUALITY_GATE = {
+    "ENABLED": os.getenv("DETECTION_QUALITY_GATE_ENABLED", "True") == "True",
+    "BLUR_THRESHOLD": float(os.getenv("DETECTION_BLUR_THRESHOLD", "20.0")),
+    "MIN_BRIGHTNESS": float(os.getenv("DETECTION_MIN_BRIGHTNESS", "25.0")),
+    "THUMBNAIL_SIZE": 160,
+}
+
+# Motion gate: when a frame's normalized mean absolute difference against the
+# session's previous THUMBNAIL_SIZE thumbnail is below THRESHOLD, the previous
+# detections are reused (at most MAX_REUSE times in a row)
+DETECTION_MOTION_GATE = {
+    "ENABLED": os.getenv("DETECTION_MOTION_GATE_ENABLED", "True") == "True",
+    "THRESHOLD": float(os.getenv("DETECTION_MOTION_THRESHOLD", "0.02")),
+    "THUMBNAIL_SIZE": 32,
+    "MAX_REUSE": 30,
+}
+
+# Second-stage attribute classifiers (traffic-light state, door state, person
+# facing). Crops from concurrent requests are batched for up to BATCH_WAIT
+# seconds; attributes not ready within TIMEOUT seconds are left out
+DETECTION_ATTRIBUTES = {
+    "ENABLED": os.getenv("DETECTION_ATTRIBUTES_ENABLED", "True") == "True",
+    "TIMEOUT": float(os.getenv("DETECTION_ATTRIBUTES_TIMEOUT", "0.05")),
+    "BATCH_SIZE": 32,
+    "BATCH_WAIT": 0.005,
+}
+
+# QR/barcode scanning: codes are located on a grayscale copy downscaled to
+# DETECT_SIZE pixels (longest side) and decoded from the full-resolution region
+# grown by MARGIN on each side
+CODE_SCANNER = {
+    "DETECT_SIZE": 800,
+    "MARGIN": 0.15,
+}
+
+# Color analysis: k-means over at most MAX_PIXELS sampled pixels
+COLOR_ANALYSIS = {
+    "CLUSTERS": 5,
+    "PALETTE_SIZE": 10,
+    "MAX_PIXELS": 16384,
+}
+
+# OCR: BACKEND is a registered name ('tesseract', 'easyocr') or a dotted path
+# to an OCRBackend subclass. Text regions are detected on a DETECT_SIZE
+# grayscale copy and recognized in parallel by WORKERS processes
+OCR = {
+    "BACKEND": os.getenv("OCR_BACKEND", "tesseract"),
+    "WORKERS": int(os.getenv("OCR_WORKERS", "2")),
+    "DETECT_SIZE": 1024,
+    "REGION_PADDING": 6,
+}
+
+# Video obstacle timelines: frames are sampled at SAMPLE_FPS and become
+# keyframes when their thumbnail differs from the last keyframe by
+# SCENE_THRESHOLD (or after MAX_GAP seconds). At most QUEUE_BATCHES batches of
+# BATCH_SIZE keyframes wait for the detector, which bounds memory use
+VIDEO_ANALYSIS = {
+    "SAMPLE_FPS": 5.0,
+    "SCENE_THRESHOLD": 0.12,
+    "MIN_GAP": 0.4,
+    "MAX_GAP": 2.0,
+    "BATCH_SIZE": 4,
+    "QUEUE_BATCHES": 2,
+    "MAX_SIDE": 1280,
+    "MAX_DURATION": float(os.getenv("VIDEO_MAX_DURATION", "120")),
+    "MERGE_GAP": 2.0,
+    "THUMBNAIL_SIZE": 64,
+}
+
+# Live captions WebSocket (/ws/hearing-assist/live-captions/): webrtcvad cuts
+# the stream into speech segments; partial captions every PARTIAL_INTERVAL
+# seconds are dropped when the recognizer is behind, finals never are. At most
+# MAX_PENDING_SECONDS of unframed audio and MAX_QUEUED_SEGMENTS segments are
+# buffered per connection
+LIVE_CAPTIONS = {
+    "VAD_MODE": 2,
+    "PADDING_MS": 300,
+    "TRIGGER_RATIO": 0.8,
+    "PARTIAL_INTERVAL": 1.0,
+    "MAX_SEGMENT_SECONDS": 10.0,
+    "MAX_PENDING_SECONDS": 2.0,
+    "MAX_QUEUED_SEGMENTS": 4,
+    "WORKERS": int(os.getenv("LIVE_CAPTION_WORKERS", "2")),
+    "TARGET_RTF": 0.5,
+}
+
+# Speech-to-text: ENGINE 'google' uses the web recognizer (Sphinx fallback);
+# 'faster_whisper' (MODEL is a Whisper size or CTranslate2 model path) and
+# 'vosk' (MODEL is a model directory) run locally on CPU, loaded once per
+# process on first use. A dotted path to an STTEngine subclass also works.
+# Local-engine clips from concurrent requests are batched per language and
+# BATCH_LENGTH_BUCKET-second duration bucket for up to BATCH_WAIT seconds
+# (BATCH_SIZE 1 disables batching). With TRIM_SILENCE, webrtcvad (VAD_MODE
+# 0-3) cuts non-speech beyond VAD_PADDING_MS before recognition, unless less
+# than MIN_TRIM_RATIO of the audio would go. Recordings longer than
+# LONG_AUDIO_SECONDS are cut at pauses into ~CHUNK_SECONDS chunks (hard cuts
+# with CHUNK_OVERLAP_SECONDS of overlap past MAX_CHUNK_SECONDS) and
+# transcribed by CHUNK_WORKERS processes (0 disables chunking)
+SPEECH_TO_TEXT = {
+    "ENGINE": os.getenv("STT_ENGINE", "google"),
+    "MODEL": os.getenv("STT_MODEL", "base"),
+    "COMPUTE_TYPE": os.getenv("STT_COMPUTE_TYPE", "int8"),
+    "CPU_THREADS": int(os.getenv("STT_CPU_THREADS", "0")),
+    "BEAM_SIZE": 1,
+    "BATCH_SIZE": int(os.getenv("STT_BATCH_SIZE", "8")),
+    "BATCH_WAIT": 0.05,
+    "BATCH_LENGTH_BUCKET": 5.0,
+    "TRIM_SILENCE": True,
+    "VAD_MODE": 2,
+    "VAD_PADDING_MS": 300,
+    "VAD_MIN_GAP_MS": 300,
+    "VAD_MIN_SPEECH_MS": 150,
+    "MIN_TRIM_RATIO": 0.05,
+    "MAX_UPLOAD_MB": int(os.getenv("STT_MAX_UPLOAD_MB", "50")),
+    "LONG_AUDIO_SECONDS": 60.0,
+    "CHUNK_SECONDS": 30.0,
+    "MAX_CHUNK_SECONDS": 45.0,
+    "CHUNK_OVERLAP_SECONDS": 1.0,
+    "CHUNK_WORKERS": int(os.getenv("STT_CHUNK_WORKERS", "2")),
+    "RESULT_CACHE": "transcriptions",
+}
+
+# Asynchronous transcription jobs (/api/hearing-assist/transcribe/jobs/).
+# Jobs live in the database; IN_PROCESS_WORKERS threads per web process (0 to
+# use only `manage.py run_transcription_worker`) claim them. A running job whose
+# worker has not renewed its lease for LEASE_SECONDS is queued again, at most
+# MAX_ATTEMPTS times in total
+TRANSCRIPTION_JOBS = {
+    "IN_PROCESS_WORKERS": int(os.getenv("TRANSCRIPTION_WORKERS", "1")),
+    "MAX_ACTIVE_PER_USER": 3,
+    "LEASE_SECONDS": 60.0,
+    "MAX_ATTEMPTS": 3,
+    "IDLE_POLL": 5.0,
+    "EVENT_POLL_INTERVAL": 0.5,
+    "EVENT_STREAM_TIMEOUT": 300,
+}
+
+# Audio resampling backend: 'soxr' (libsoxr HQ), 'polyphase' (scipy, filter
+# kernels cached per rate pair) or 'auto' (soxr when installed)
+RESAMPLING = {
+    "BACKEND": os.getenv("RESAMPLING_BACKEND", "auto"),
+}
+
+# Caches. "transcriptions" holds speech-to-text results keyed by audio content,
+# language and engine (SPEECH_TO_TEXT['RESULT_CACHE']; empty disables it). It
+# is on local disk so every worker process shares it and it survives restarts;
+# entries expire after TIMEOUT seconds and a random third is culled once
+# there are MAX_ENTRIES
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "transcriptions": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("TRANSCRIPTION_CACHE_DIR", str(BASE_DIR / "cache" / "transcriptions")),
+        "TIMEOUT": 7 * 24 * 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 5000, "CULL_FREQUENCY": 3},
+    },
+}
+
+# Level and spectrum analyses (detect-noise and friends) read uploads in
+# BLOCK_SECONDS blocks and measure levels over FRAME_SECONDS frames ('fast'
+# time weighting). CALIBRATION_OFFSET_DB is the dB SPL that 0 dBFS corresponds
+# to (clients can send their own per device); stored level timelines have at
+# most TIMELINE_POINTS entries. analyze-combined runs the analyses of one upload
+# on COMBINED_WORKERS threads
+AUDIO_ANALYSIS = {
+    "BLOCK_SECONDS": 1.0,
+    "FRAME_SECONDS": 0.125,
+    "CALIBRATION_OFFSET_DB": 120.0,
+    "TIMELINE_POINTS": 120,
+    "COMBINED_WORKERS": 4,
+}
@@ -23,6 +23,7 @@ from . import health_views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/health/', health_views.health_check, name='health_check'),
+    path('api/health/metrics/', health_views.metrics_snapshot, name='metrics_snapshot'),
     path('api/users/', include('users.urls')),
     path('api/visual-assist/', include('visual_assist.urls')),
     path('api/hearing-assist/', include('hearing_assist.urls')),
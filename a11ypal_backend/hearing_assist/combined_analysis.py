@@ -0,0 +1,156 @@
+"""
+Several audio analyses of one upload, decoded once.
+
+The upload is decoded a single time into a float32 buffer. Speech-to-text
+gets its own normalized 16 kHz copy; the noise, volume and frequency
+analyzers read the shared buffer block by block (slices, no copies). The
+analyses run concurrently on a small thread pool (NumPy, SciPy and the
+recognizers release the GIL for their heavy work). The file is stored once
+and every result row points at it; the rows are written in one transaction.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from services.audio_decoding import AudioClip
+from services.uploads import read_upload
+from services.metrics import metrics
+from services.noise_analysis import NoiseAnalyzer
+from services.spectrum_analysis import SpectrumAnalyzer
+from services.speech_to_text_service import speech_to_text_service
+from services.volume_analysis import VolumeAnalyzer
+from .models import FrequencyAnalysis, NoiseDetection, SpeechToText, VolumeAnalysis
+
+logger = logging.getLogger(__name__)
+
+# Analyses the combined endpoint runs, by AudioAnalysis.analysis_type
+COMBINED_ANALYSES = ('speech_to_text', 'noise_detection', 'volume_analysis', 'frequency_analysis')
+AUDIO_UPLOAD_DIR = 'hearing_assist/audio/'
+
+analysis_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'AUDIO_ANALYSIS', {}).get('COMBINED_WORKERS', 4),
+    thread_name_prefix='audio-analysis',
+)
+
+
+def _run_blocks(analyzer, clip: AudioClip) -> Dict:
+    block_frames = max(1, int(getattr(settings, 'AUDIO_ANALYSIS', {}).get('BLOCK_SECONDS', 1.0) * clip.sample_rate))
+    for start in range(0, len(clip.samples), block_frames):
+        analyzer.feed(clip.samples[start:start + block_frames])
+    return analyzer.result()
+
+
+def _run_analysis(analysis_type: str, audio_file, clip: AudioClip, language: str,
+                  calibration_offset: Optional[float]) -> Dict:
+    start_time = time.perf_counter()
+    if analysis_type == 'speech_to_text':
+        result = speech_to_text_service.process_audio_file(audio_file, language, decoded=clip)
+    elif analysis_type == 'noise_detection':
+        result = _run_blocks(NoiseAnalyzer.from_settings(clip.sample_rate, calibration_offset), clip)
+    elif analysis_type == 'volume_analysis':
+        result = _run_blocks(VolumeAnalyzer.from_settings(clip.sample_rate, calibration_offset), clip)
+    else:
+        result = _run_blocks(SpectrumAnalyzer(clip.sample_rate), clip)
+    metrics.observe(f'hearing.combined.{analysis_type}_seconds', time.perf_counter() - start_time)
+    return result
+
+
+def run_analyses(audio_file, analyses: Iterable[str], language: str = 'en',
+                 calibration_offset: Optional[float] = None) -> Tuple[AudioClip, Dict[str, Dict], Dict[str, str]]:
+    """
+    Decode an upload once and run the requested analyses on it concurrently
+
+    Args:
+        audio_file: Uploaded file
+        analyses: Entries of COMBINED_ANALYSES
+        language: Language for speech-to-text
+        calibration_offset: dB SPL at 0 dBFS for the level analyses
+
+    Returns:
+        (decoded clip, results by analysis type, error messages by analysis type);
+        an analysis that fails only adds an error, decoding failures raise
+    """
+    start_time = time.perf_counter()
+    clip = AudioClip.from_bytes(read_upload(audio_file))
+    metrics.observe('hearing.combined.decode_seconds', time.perf_counter() - start_time)
+
+    futures = {
+        analysis_type: analysis_executor.submit(
+            _run_analysis, analysis_type, audio_file, clip, language, calibration_offset
+        )
+        for analysis_type in analyses
+    }
+    results, errors = {}, {}
+    for analysis_type, future in futures.items():
+        try:
+            results[analysis_type] = future.result()
+        except Exception as e:
+            logger.error(f"Combined {analysis_type} failed: {str(e)}")
+            errors[analysis_type] = str(e)
+    return clip, results, errors
+
+
+def save_results(user, audio_file, results: Dict[str, Dict]) -> Dict[str, object]:
+    """
+    Store the upload once and write one row per analysis in one transaction
+
+    Returns:
+        Created model instances by analysis type
+    """
+    stored_name = default_storage.save(AUDIO_UPLOAD_DIR + audio_file.name, audio_file)
+    try:
+        with transaction.atomic():
+            return {
+                analysis_type: _create_row(analysis_type, user, stored_name, result)
+                for analysis_type, result in results.items()
+            }
+    except Exception:
+        default_storage.delete(stored_name)
+        raise
+
+
+def _create_row(analysis_type: str, user, stored_name: str, result: Dict):
+    if analysis_type == 'speech_to_text':
+        return SpeechToText.objects.create(
+            user=user,
+            audio_file=stored_name,
+            transcribed_text=result['transcribed_text'],
+            language=result['language'],
+            confidence_score=result['confidence_score'],
+            speaker_count=result['speaker_count'],
+            timestamps=result['timestamps'],
+        )
+    if analysis_type == 'noise_detection':
+        return NoiseDetection.objects.create(
+            user=user,
+            audio_file=stored_name,
+            noise_level=result['noise_level'],
+            noise_type=result['noise_type'],
+            recommendations=result['recommendations'],
+            duration=result['statistics']['duration'],
+            statistics=result['statistics'],
+            level_timeline=result['level_timeline'],
+        )
+    if analysis_type == 'volume_analysis':
+        return VolumeAnalysis.objects.create(
+            user=user,
+            audio_file=stored_name,
+            average_volume=result['average_volume'],
+            peak_volume=result['peak_volume'],
+            volume_consistency=result['volume_consistency'],
+            recommendations=result['recommendations'],
+            duration=result['statistics']['duration'],
+            statistics=result['statistics'],
+        )
+    return FrequencyAnalysis.objects.create(
+        user=user,
+        audio_file=stored_name,
+        dominant_frequencies=result['dominant_frequencies'],
+        frequency_spectrum=result['frequency_spectrum'],
+        hearing_aid_recommendations=result['hearing_aid_recommendations'],
+    )
@@ -0,0 +1,235 @@
+"""
+WebSocket live captions (plain ASGI, routed from a11ypal_backend/asgi.py).
+
+Protocol, all JSON text messages except audio:
+
+- connect to /ws/hearing-assist/live-captions/?token=<auth token>
+- optional first message: {"type": "config", "encoding": "pcm16" | "opus", "language": "en",
+  "sample_rate": 16000}
+- binary messages: mono little-endian PCM (resampled to 16 kHz as it arrives
+  when another sample_rate is configured), or one Opus packet each
+- server pushes {"type": "partial" | "final", "segment", "text", "start", "end", "delay", ...}
+- {"type": "end"} flushes the open segment; the server answers {"type": "end", ...} and closes
+"""
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qs
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from services.live_captions import (
+    SAMPLE_RATE, CaptionSegmenter, OpusDecoder, caption_message, record_caption_metrics
+)
+from services.metrics import metrics
+from services.resampling import streaming_resampler
+from services.speech_to_text_service import speech_to_text_service
+from .models import HearingAssistSession
+
+logger = logging.getLogger(__name__)
+
+LIVE_CAPTIONS = getattr(settings, 'LIVE_CAPTIONS', {})
+
+# Accepted input sample rates (Hz) for PCM that is resampled on arrival
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+
+# Recognition runs off the event loop; the pool size bounds concurrent decodes per process
+caption_executor = ThreadPoolExecutor(
+    max_workers=LIVE_CAPTIONS.get('WORKERS', 2), thread_name_prefix='live-captions'
+)
+
+
+@sync_to_async
+def _authenticate(scope):
+    from rest_framework.authentication import TokenAuthentication
+
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    if not token:
+        return None
+    try:
+        user, _ = TokenAuthentication().authenticate_credentials(token)
+        return user
+    except Exception:
+        return None
+
+
+def _sample_rate(value) -> Optional[int]:
+    """A configured input sample rate, or None when it is not a sane integer"""
+    if isinstance(value, bool):
+        return None
+    try:
+        rate = int(value)
+    except (TypeError, ValueError):
+        return None
+    if rate != value and str(rate) != str(value):
+        return None  # e.g. 44100.5
+    return rate if MIN_SAMPLE_RATE <= rate <= MAX_SAMPLE_RATE else None
+
+
+def _to_pcm16(samples: np.ndarray) -> bytes:
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+
+class LiveCaptionConnection:
+    """State of one captioning WebSocket"""
+
+    def __init__(self, user, send):
+        self.user = user
+        self.send = send
+        self.language = 'en'
+        self.opus = None
+        self.resampler = None
+        self.segmenter = CaptionSegmenter.from_settings()
+        self.target_rtf = LIVE_CAPTIONS.get('TARGET_RTF', 0.5)
+        # Bounded: finals wait for room (backpressure), partials are dropped instead
+        self.segments = asyncio.Queue(maxsize=LIVE_CAPTIONS.get('MAX_QUEUED_SEGMENTS', 4))
+        self.finals = 0
+        self.audio_bytes = 0
+        self.session = None
+
+    async def send_json(self, message):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    async def run(self, receive):
+        self.session = await sync_to_async(HearingAssistSession.objects.create)(
+            user=self.user, session_type='live_stream'
+        )
+        worker = asyncio.create_task(self._recognize_segments())
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if message.get('bytes') is not None:
+                    await self._on_audio(message['bytes'])
+                elif message.get('text') is not None:
+                    try:
+                        control = json.loads(message['text'])
+                        if not isinstance(control, dict):
+                            raise ValueError("expected a JSON object")
+                    except ValueError as e:
+                        await self.send_json({'type': 'error', 'error': f'Malformed control message: {str(e)}'})
+                        await self.send({'type': 'websocket.close', 'code': 4400})
+                        break
+                    if not await self._on_control(control):
+                        break
+        finally:
+            worker.cancel()
+            await self._finish_session()
+
+    async def _on_control(self, message) -> bool:
+        """Handle a JSON control message; returns False once the stream is over"""
+        if message.get('type') == 'config':
+            self.language = message.get('language', self.language)
+            if message.get('encoding') == 'opus':
+                try:
+                    self.opus = OpusDecoder()
+                except Exception as e:
+                    await self.send_json({'type': 'error', 'error': str(e)})
+                    await self.send({'type': 'websocket.close', 'code': 4400})
+                    return False
+            else:
+                sample_rate = _sample_rate(message.get('sample_rate', SAMPLE_RATE))
+                if sample_rate is None:
+                    await self.send_json({
+                        'type': 'error',
+                        'error': f'sample_rate must be an integer from {MIN_SAMPLE_RATE} to {MAX_SAMPLE_RATE}',
+                    })
+                    await self.send({'type': 'websocket.close', 'code': 4400})
+                    return False
+                if sample_rate != SAMPLE_RATE:
+                    self.resampler = streaming_resampler(sample_rate, SAMPLE_RATE)
+            return True
+
+        if message.get('type') == 'end':
+            if self.resampler:
+                await self._feed(_to_pcm16(self.resampler.flush()))
+            for segment in self.segmenter.flush():
+                await self.segments.put(segment)
+            await self.segments.join()
+            await self.send_json({
+                'type': 'end',
+                'finals': self.finals,
+                'audio_seconds': round(self.audio_bytes / 2 / SAMPLE_RATE, 3),
+                'dropped_seconds': round(self.segmenter.dropped_bytes / 2 / SAMPLE_RATE, 3),
+            })
+            await self.send({'type': 'websocket.close', 'code': 1000})
+            return False
+        return True
+
+    async def _on_audio(self, data: bytes):
+        try:
+            pcm = self.opus.decode(data) if self.opus else data
+            if self.resampler:
+                pcm = _to_pcm16(self.resampler.process(np.frombuffer(pcm, dtype=np.int16) / 32768.0))
+        except Exception as e:
+            # A corrupt packet costs its own audio, not the connection
+            metrics.increment('hearing.live.bad_packets')
+            await self.send_json({'type': 'error', 'error': f'Could not decode audio: {str(e)}'})
+            return
+        await self._feed(pcm)
+
+    async def _feed(self, pcm: bytes):
+        self.audio_bytes += len(pcm)
+        for segment in self.segmenter.feed(pcm, time.time()):
+            if segment.final:
+                await self.segments.put(segment)
+                continue
+            metrics.increment('hearing.live.partials')
+            if self.segments.empty():
+                self.segments.put_nowait(segment)
+            else:
+                # Recognizer is behind; a fresher partial or the final will follow
+                metrics.increment('hearing.live.partials_dropped')
+
+    async def _recognize_segments(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            segment = await self.segments.get()
+            try:
+                start_time = time.perf_counter()
+                result = await loop.run_in_executor(
+                    caption_executor, speech_to_text_service.transcribe_samples,
+                    segment.samples(), SAMPLE_RATE, self.language
+                )
+                delay = record_caption_metrics(segment, time.perf_counter() - start_time, self.target_rtf)
+                if segment.final:
+                    self.finals += 1
+                await self.send_json(caption_message(segment, result, delay))
+            except Exception as e:
+                logger.error(f"Live caption recognition failed: {str(e)}")
+                await self.send_json({'type': 'error', 'segment': segment.index, 'error': str(e)})
+            finally:
+                self.segments.task_done()
+
+    async def _finish_session(self):
+        self.session.end_time = timezone.now()
+        self.session.total_analyses = self.finals
+        self.session.session_data = {
+            'audio_seconds': round(self.audio_bytes / 2 / SAMPLE_RATE, 3),
+            'language': self.language,
+            'encoding': 'opus' if self.opus else 'pcm16',
+        }
+        await sync_to_async(self.session.save)()
+
+
+async def live_captions(scope, receive, send):
+    """ASGI WebSocket handler for live captions"""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    user = await _authenticate(scope)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+
+    await send({'type': 'websocket.accept'})
+    await LiveCaptionConnection(user, send).run(receive)
@@ -0,0 +1,81 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from services.audio_decoding import STT_SAMPLE_RATE
+from services.resampling import polyphase_kernel, rate_ratio, resample, soxr, streaming_resampler
+
+COMMON_RATES = [8000, 11025, 22050, 32000, 44100, 48000]
+
+
+def snr(reference: np.ndarray, output: np.ndarray) -> float:
+    """Signal-to-difference ratio in dB, ignoring the filter edges"""
+    n = min(len(reference), len(output))
+    edge = n // 20
+    reference, output = reference[edge:n - edge], output[edge:n - edge]
+    return 10 * np.log10(np.sum(reference ** 2) / max(np.sum((reference - output) ** 2), 1e-20))
+
+
+class Command(BaseCommand):
+    help = "Compare resampling backends with librosa for common input rates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=30.0, help='Length of the test signal')
+        parser.add_argument('--target', type=int, default=STT_SAMPLE_RATE)
+        parser.add_argument('--rates', type=int, nargs='+', default=COMMON_RATES)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per backend')
+        parser.add_argument('--chunk-ms', type=int, default=20, help='Chunk size for the streaming runs')
+
+    def handle(self, *args, **options):
+        import librosa
+
+        target = options['target']
+        backends = ['polyphase'] + (['soxr'] if soxr is not None else [])
+        rng = np.random.default_rng(0)
+
+        start_time = time.perf_counter()
+        librosa.resample(np.zeros(1000, dtype=np.float32), orig_sr=44100, target_sr=target)
+        self.stdout.write(f"librosa first call: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
+        header = f"{'rate':>6} {'librosa':>9}"
+        for backend in backends:
+            header += f" {backend:>10} {'stream':>8} {'SNR dB':>7}"
+        self.stdout.write(header + f" {'kernel':>8}  (ms per {options['seconds']:g}s of audio)")
+
+        for rate in options['rates']:
+            # Chirp up to 80% of the lower Nyquist frequency (where both
+            # filters should be transparent) plus a little noise
+            t = np.arange(int(options['seconds'] * rate)) / rate
+            top = 0.4 * min(rate, target)
+            signal = 0.5 * np.sin(2 * np.pi * (50 * t + (top - 50) * t ** 2 / (2 * t[-1])))
+            signal = (signal + 0.001 * rng.standard_normal(len(t))).astype(np.float32)
+
+            reference = librosa.resample(signal, orig_sr=rate, target_sr=target)
+            line = f"{rate:6} {self._time(lambda: librosa.resample(signal, orig_sr=rate, target_sr=target), options['repeat']):9.1f}"
+
+            kernel_ms = 0.0
+            for backend in backends:
+                if backend == 'polyphase':
+                    polyphase_kernel.cache_clear()
+                    start_time = time.perf_counter()
+                    polyphase_kernel(*rate_ratio(rate, target))
+                    kernel_ms = (time.perf_counter() - start_time) * 1000
+                output = resample(signal, rate, target, backend=backend)
+                one_shot = self._time(lambda: resample(signal, rate, target, backend=backend), options['repeat'])
+                stream = self._time(lambda: self._stream(signal, rate, target, backend, options['chunk_ms']), 1)
+                line += f" {one_shot:10.1f} {stream:8.1f} {snr(reference, output):7.1f}"
+            self.stdout.write(line + f" {kernel_ms:8.1f}")
+
+    def _time(self, function, repeat: int) -> float:
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        return (time.perf_counter() - start_time) / repeat * 1000
+
+    def _stream(self, signal: np.ndarray, rate: int, target: int, backend: str, chunk_ms: int):
+        resampler = streaming_resampler(rate, target, backend=backend)
+        step = rate * chunk_ms // 1000
+        for start in range(0, len(signal), step):
+            resampler.process(signal[start:start + step])
+        resampler.flush()
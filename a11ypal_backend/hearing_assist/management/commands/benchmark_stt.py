@@ -0,0 +1,66 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from services.audio_decoding import STT_SAMPLE_RATE, AudioClip
+from services.stt_engines import load_engine
+
+AUDIO_SUFFIXES = {'.wav', '.flac', '.ogg', '.mp3', '.m4a', '.webm'}
+
+
+class Command(BaseCommand):
+    help = "Measure the real-time factor of a local STT engine on sample audio"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Audio files or directories of audio files')
+        parser.add_argument('--engine', help='Engine name or dotted path (default: settings.SPEECH_TO_TEXT)')
+        parser.add_argument('--model', help='Model size or path (default: settings.SPEECH_TO_TEXT)')
+        parser.add_argument('--language', default='en')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per file')
+
+    def handle(self, *args, **options):
+        files = []
+        for path in map(Path, options['paths']):
+            if path.is_dir():
+                files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in AUDIO_SUFFIXES))
+            elif path.is_file():
+                files.append(path)
+        if not files:
+            raise CommandError("No audio files found")
+
+        config = dict(getattr(settings, 'SPEECH_TO_TEXT', {}))
+        if options['model']:
+            config['MODEL'] = options['model']
+        name = options['engine'] or config.get('ENGINE', 'google')
+
+        start_time = time.perf_counter()
+        try:
+            engine = load_engine(name, config)
+        except Exception as e:
+            raise CommandError(f"Could not load engine '{name}': {str(e)}")
+        self.stdout.write(f"Loaded {name} in {time.perf_counter() - start_time:.2f}s")
+
+        total_audio = total_time = 0.0
+        self.stdout.write(f"{'file':40} {'audio (s)':>10} {'time (s)':>10} {'RTF':>7} {'words':>6}")
+        for path in files:
+            clip = AudioClip.from_bytes(path.read_bytes()).resample(STT_SAMPLE_RATE)
+            # First run warms the engine
+            engine.transcribe(clip.samples, options['language'])
+            start_time = time.perf_counter()
+            for _ in range(options['repeat']):
+                result = engine.transcribe(clip.samples, options['language'])
+            elapsed = (time.perf_counter() - start_time) / options['repeat']
+            total_audio += clip.duration
+            total_time += elapsed
+
+            self.stdout.write(
+                f"{path.name[:40]:40} {clip.duration:10.2f} {elapsed:10.3f} "
+                f"{elapsed / max(clip.duration, 1e-9):7.3f} {len(result['words']):6}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: {total_audio:.2f}s of audio in {total_time:.3f}s, "
+            f"RTF {total_time / max(total_audio, 1e-9):.3f}"
+        ))
@@ -0,0 +1,38 @@
+import os
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+
+from hearing_assist.transcription_jobs import transcription_queue
+
+
+class Command(BaseCommand):
+    help = "Run transcription job workers outside the web process"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Jobs transcribed at the same time')
+        parser.add_argument('--exit-when-idle', action='store_true', help='Stop once the queue is empty')
+
+    def handle(self, *args, **options):
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [
+            threading.Thread(
+                target=transcription_queue.work,
+                args=(f'{prefix}:{i}',),
+                kwargs={'exit_when_idle': options['exit_when_idle']},
+                daemon=True,
+            )
+            for i in range(options['concurrency'])
+        ]
+        self.stdout.write(f"Starting {len(threads)} transcription worker(s) as {prefix}")
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1.0)
+        except KeyboardInterrupt:
+            # Running jobs are requeued by other workers once their lease expires
+            self.stdout.write("Interrupted")
+        self.stdout.write(self.style.SUCCESS("Workers stopped"))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hearing_assist', '0002_transcription_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='noisedetection',
+            name='duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='noisedetection',
+            name='level_timeline',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='noisedetection',
+            name='statistics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
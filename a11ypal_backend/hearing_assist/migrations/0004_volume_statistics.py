@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hearing_assist', '0003_noise_statistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='volumeanalysis',
+            name='duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='volumeanalysis',
+            name='statistics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -61,6 +61,9 @@ class NoiseDetection(models.Model):
         ]
     )
     recommendations = models.TextField(blank=True)
+    duration = models.FloatField(null=True, blank=True)  # Audio duration in seconds
+    statistics = models.JSONField(default=dict, blank=True)  # LEQ, percentile levels, classifier features
+    level_timeline = models.JSONField(default=list, blank=True)  # [{'time', 'level'}], downsampled
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -83,6 +86,8 @@ class VolumeAnalysis(models.Model):
         ]
     )
     recommendations = models.TextField(blank=True)
+    duration = models.FloatField(null=True, blank=True)  # Audio duration in seconds
+    statistics = models.JSONField(default=dict, blank=True)  # True peak (dBTP), rolling level spread
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -135,4 +140,42 @@ class HearingAidSettings(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"Hearing Aid Settings - {self.user.username}"
\ No newline at end of file
+        return f"Hearing Aid Settings - {self.user.username}"
+
+
+class TranscriptionJob(models.Model):
+    """Queued transcription; workers claim jobs from this table"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transcription_jobs')
+    audio_file = models.FileField(upload_to='hearing_assist/speech/')
+    language = models.CharField(max_length=10, default='en')
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('queued', 'Queued'),
+            ('running', 'Running'),
+            ('completed', 'Completed'),
+            ('failed', 'Failed'),
+        ],
+        default='queued'
+    )
+    progress = models.FloatField(default=0.0)  # 0-1
+    chunks_done = models.IntegerField(default=0)
+    chunks_total = models.IntegerField(default=0)
+    partial_text = models.TextField(blank=True)
+    transcription = models.OneToOneField(
+        SpeechToText, on_delete=models.SET_NULL, null=True, blank=True, related_name='job'
+    )
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Lease renewed while running
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+    
+    def __str__(self):
+        return f"Transcription Job {self.id} - {self.status}"
@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from .models import (
     AudioAnalysis, SpeechToText, NoiseDetection, 
-    VolumeAnalysis, FrequencyAnalysis, HearingAssistSession, HearingAidSettings
+    VolumeAnalysis, FrequencyAnalysis, HearingAssistSession, HearingAidSettings,
+    TranscriptionJob
 )
 
 
@@ -37,6 +38,28 @@ class SpeechToTextSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+class TranscriptionJobSerializer(serializers.ModelSerializer):
+    transcription = SpeechToTextSerializer(read_only=True)
+    
+    class Meta:
+        model = TranscriptionJob
+        fields = [
+            'id',
+            'status',
+            'language',
+            'progress',
+            'chunks_done',
+            'chunks_total',
+            'partial_text',
+            'transcription',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
+
+
 class NoiseDetectionSerializer(serializers.ModelSerializer):
     class Meta:
         model = NoiseDetection
@@ -46,6 +69,9 @@ class NoiseDetectionSerializer(serializers.ModelSerializer):
             'noise_level',
             'noise_type',
             'recommendations',
+            'duration',
+            'statistics',
+            'level_timeline',
             'created_at',
         ]
         read_only_fields = ['id', 'created_at']
@@ -61,6 +87,8 @@ class VolumeAnalysisSerializer(serializers.ModelSerializer):
             'peak_volume',
             'volume_consistency',
             'recommendations',
+            'duration',
+            'statistics',
             'created_at',
         ]
         read_only_fields = ['id', 'created_at']
@@ -1,3 +1,680 @@
-from django.test import TestCase
+import array
+import difflib
+import importlib.util
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+import soundfile as sf
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from services.chunked_transcription import plan_chunks, stitch_chunks, transcribe_chunk
+from services.noise_analysis import NoiseAnalyzer
+from services.resampling import resample, streaming_resampler
+from services.spectrum_analysis import SpectrumAnalyzer
+from services.audio_decoding import AudioClip, decode_audio
+from services.stt_engines import FasterWhisperEngine, LazySTTEngine, STTEngine
+from services.transcription_cache import TranscriptionCache
+from services.volume_analysis import VolumeAnalyzer
+from services.voice_activity import SpeechTrim
+from .combined_analysis import run_analyses
+from .consumers import LiveCaptionConnection
+from .models import SpeechToText, TranscriptionJob
+from .transcription_jobs import TranscriptionQueue
+from .views import _calibration_offset, create_transcription_job, detect_noise, transcription_job_events
+
+
+class AudioDecodingTests(SimpleTestCase):
+    """Uploads are decoded once, from memory"""
+
+    def setUp(self):
+        patches = [mock.patch(f'tempfile.{name}', side_effect=AssertionError('temporary file used'))
+                   for name in ('NamedTemporaryFile', 'TemporaryFile', 'SpooledTemporaryFile', 'mkstemp', 'mkdtemp')]
+        self.temp_mocks = [patch.start() for patch in patches]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        for temp_mock in self.temp_mocks:
+            temp_mock.assert_not_called()
+
+    def test_wav_from_memory(self):
+        t = np.arange(22050) / 44100
+        stereo = np.stack([0.5 * np.sin(2 * np.pi * 440 * t), -0.25 * np.ones_like(t)], axis=1)
+        buffer = io.BytesIO()
+        sf.write(buffer, stereo, 44100, format='WAV', subtype='PCM_16')
+
+        samples, sample_rate = decode_audio(buffer.getvalue())
+        self.assertEqual((samples.shape, samples.dtype, sample_rate), ((22050, 2), np.float32, 44100))
+        self.assertLessEqual(float(np.abs(samples).max()), 1.0)
+        self.assertAlmostEqual(float(samples[:, 0].max()), 0.5, places=3)
+
+        clip = AudioClip.from_bytes(buffer.getvalue())
+        self.assertEqual((clip.channels, clip.samples.ndim, clip.sample_rate), (2, 1, 44100))
+        self.assertAlmostEqual(clip.duration, 0.5)
+        self.assertEqual(len(clip.copy().resample().samples), 8000)
+
+    def test_other_formats_go_through_pydub(self):
+        segment = mock.Mock(channels=2, sample_width=2, frame_rate=8000)
+        segment.get_array_of_samples.return_value = array.array('h', [16384, -32768, 0, 8192])
+        pydub = mock.Mock()
+        pydub.AudioSegment.from_file.return_value = segment
+
+        with mock.patch.dict(sys.modules, {'pydub': pydub}):
+            samples, sample_rate = decode_audio(b'\xff\xf3not-a-wav')
+        self.assertIsInstance(pydub.AudioSegment.from_file.call_args[0][0], io.BytesIO)
+        self.assertEqual((samples.shape, sample_rate), ((2, 2), 8000))
+        np.testing.assert_allclose(samples, [[0.5, -1.0], [0.0, 0.25]])
+
+    def test_undecodable_bytes(self):
+        pydub = mock.Mock()
+        pydub.AudioSegment.from_file.side_effect = Exception('ffmpeg failed')
+        with mock.patch.dict(sys.modules, {'pydub': pydub}), self.assertRaisesMessage(ValueError, 'ffmpeg failed'):
+            decode_audio(b'garbage')
+
+
+class SpeechTrimTests(SimpleTestCase):
+    """Silence trimming offset map"""
+
+    def setUp(self):
+        # Speech at 1.0-2.0 s and 4.0-4.5 s of a 6 s, 1 kHz recording
+        self.trim = SpeechTrim(np.zeros(6000, dtype=np.float32), [(1000, 2000), (4000, 4500)], 1000)
+
+    def test_trimmed_audio(self):
+        self.assertEqual(len(self.trim.samples), 1500)
+        self.assertAlmostEqual(self.trim.speech_duration, 1.5)
+        self.assertAlmostEqual(self.trim.removed_ratio, 0.75)
+
+    def test_times_map_to_original(self):
+        self.assertAlmostEqual(self.trim.to_original(0.25), 1.25)
+        self.assertAlmostEqual(self.trim.to_original(1.0), 4.0)
+        self.assertAlmostEqual(self.trim.to_original(1.0, is_end=True), 2.0)
+        self.assertAlmostEqual(self.trim.to_original(1.4), 4.4)
+
+    def test_word_timestamps(self):
+        words = self.trim.map_words([{'word': 'hi', 'start': 0.5, 'end': 1.0}, {'word': 'there', 'start': 1.0, 'end': 1.5}])
+        self.assertEqual([(w['start'], w['end']) for w in words], [(1.5, 2.0), (4.0, 4.5)])
+
+
+class ChunkedTranscriptionTests(SimpleTestCase):
+    """Splitting long recordings and stitching the parts"""
+
+    def test_cuts_in_pauses(self):
+        # 10 s speech / 1 s pause, repeated, at 100 Hz
+        regions = [(i * 1100, i * 1100 + 1000) for i in range(6)]
+        chunks = plan_chunks(regions, 6600, 100, chunk_seconds=20, max_chunk_seconds=30)
+        self.assertEqual([(c.start, c.end) for c in chunks], [(0, 2150), (2150, 4350), (4350, 6600)])
+
+    def test_hard_cut_overlap_is_deduplicated(self):
+        chunks = plan_chunks([(0, 5000)], 5000, 100, chunk_seconds=30, max_chunk_seconds=40, overlap_seconds=2)
+        self.assertEqual([(c.start, c.end) for c in chunks], [(0, 3200), (2800, 5000)])
+
+        def words(times):
+            return {'text': '', 'confidence': 0.9, 'aligned': True,
+                    'timestamps': [{'word': w, 'start': t, 'end': t + 0.5} for w, t in times]}
+
+        # Both chunks heard "b" (at 29.5 s) and "c" (at 31 s)
+        result = stitch_chunks(chunks, [
+            words([('a', 10.0), ('b', 29.5), ('c', 31.0)]),
+            words([('b', 1.5), ('c', 3.0), ('d', 10.0)]),
+        ], 100)
+        self.assertEqual(result['text'], 'a b c d')
+        self.assertEqual([w['start'] for w in result['timestamps']], [10.0, 29.5, 31.0, 38.0])
+
+    def test_hard_cut_overlap_without_word_timings(self):
+        chunks = plan_chunks([(0, 5000)], 5000, 100, chunk_seconds=30, max_chunk_seconds=40, overlap_seconds=2)
+
+        def text(words):
+            return {'text': words, 'confidence': 0.9, 'timestamps': []}
+
+        result = stitch_chunks(chunks, [text('turn left at the next corner'), text('Next corner, then straight on')], 100)
+        self.assertEqual(result['text'], 'turn left at the next corner then straight on')
+        # Nothing repeated: nothing dropped
+        result = stitch_chunks(chunks, [text('turn left'), text('then right')], 100)
+        self.assertEqual(result['text'], 'turn left then right')
+
+    def test_failed_chunk_is_left_out(self):
+        placeholder = {'text': 'Transcription unavailable. Please try again.', 'engine': 'none', 'confidence': 0.0}
+        with mock.patch('services.speech_to_text_service.speech_to_text_service._transcribe_audio',
+                        return_value=placeholder):
+            self.assertIsNone(transcribe_chunk(np.zeros(1600, dtype=np.float32), 16000, 'en'))
+
+        chunks = plan_chunks([(0, 1000), (1100, 2100), (2200, 3200)], 3200, 100, chunk_seconds=10, max_chunk_seconds=15)
+        self.assertEqual(len(chunks), 3)
+        heard = {'text': 'go', 'confidence': 0.8, 'timestamps': []}
+        result = stitch_chunks(chunks, [heard, None, dict(heard, text='stop')], 100)
+        self.assertEqual(result['text'], 'go stop')
+        self.assertAlmostEqual(result['confidence'], 0.8)
+
+
+class ResamplingTests(SimpleTestCase):
+    """Polyphase resampler against librosa"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.signals = {}
+        for rate in (8000, 44100, 48000):
+            t = np.arange(rate * 2) / rate
+            tones = sum(np.sin(2 * np.pi * f * t + rng.uniform(0, 6)) for f in (220, 1000, 3100, 6000) if f < 0.4 * rate)
+            self.signals[rate] = (0.2 * tones).astype(np.float32)
+
+    def test_matches_librosa(self):
+        import librosa
+
+        for rate, signal in self.signals.items():
+            expected = librosa.resample(signal, orig_sr=rate, target_sr=16000)
+            output = resample(signal, rate, 16000, backend='polyphase')
+            self.assertEqual(len(output), len(expected))
+            # Ignore the filter edges
+            error = (output - expected)[1000:-1000]
+            snr = 10 * np.log10(np.sum(expected[1000:-1000] ** 2) / np.sum(error ** 2))
+            self.assertGreater(snr, 60, f'{rate} Hz')
+
+    def test_streaming_matches_one_shot(self):
+        signal = self.signals[44100]
+        resampler = streaming_resampler(44100, 16000, backend='polyphase')
+        pieces = [resampler.process(signal[i:i + 441]) for i in range(0, len(signal), 441)]
+        output = np.concatenate(pieces + [resampler.flush()])
+        np.testing.assert_allclose(output, resample(signal, 44100, 16000, backend='polyphase'), atol=1e-6)
+
+
+@override_settings(CACHES={'transcriptions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TranscriptionCacheTests(SimpleTestCase):
+    """Result cache keys"""
+
+    def test_keys_depend_on_audio_language_and_engine(self):
+        cache = TranscriptionCache('transcriptions', 'faster_whisper', 'small')
+        samples = np.arange(1600, dtype=np.float32)
+        key = cache.audio_key(samples, 'en')
+        self.assertEqual(key, cache.audio_key(samples.copy(), 'en'))
+        self.assertNotEqual(key, cache.audio_key(samples, 'de'))
+        self.assertNotEqual(key, cache.audio_key(samples + 1, 'en'))
+        self.assertNotEqual(key, cache.audio_key(samples, 'en', engine='google'))
+        self.assertNotEqual(key, TranscriptionCache('transcriptions', 'vosk').audio_key(samples, 'en'))
+
+    @override_settings(CACHES={'stt-test': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_failed_and_fallback_recognition_is_not_cached(self):
+        import speech_recognition as sr
+        from services.speech_to_text_service import speech_to_text_service as service
+
+        t = np.arange(16000) / 16000
+        wav = io.BytesIO()
+        sf.write(wav, (0.3 * np.sin(2 * np.pi * 300 * t)).astype(np.float32), 16000, format='WAV')
+        upload = SimpleUploadedFile('a.wav', wav.getvalue(), content_type='audio/wav')
+
+        with mock.patch.object(service, 'result_cache', TranscriptionCache('stt-test', 'google')), \
+                mock.patch.object(service, 'engine', mock.Mock()) as engine, \
+                mock.patch.object(service.recognizer, 'recognize_google') as google, \
+                mock.patch.object(service.recognizer, 'recognize_sphinx') as sphinx:
+            engine.name = 'google'
+            # Web recognizer unreachable and Sphinx failing: placeholder text
+            google.side_effect = sr.RequestError('offline')
+            sphinx.side_effect = RuntimeError('no model')
+            result = service.process_audio_file(upload)
+            self.assertEqual(result['confidence_score'], 0.0)
+            self.assertFalse(service.process_audio_file(upload)['cached'])
+
+            # Sphinx fallback: a real transcript, but not from the configured engine
+            sphinx.side_effect = None
+            sphinx.return_value = 'fallback text'
+            self.assertEqual(service.process_audio_file(upload)['transcribed_text'], 'fallback text')
+            self.assertFalse(service.process_audio_file(upload)['cached'])
+
+            # The retry reaches the web recognizer, whose result is kept
+            google.side_effect = None
+            google.return_value = 'hello world'
+            self.assertFalse(service.process_audio_file(upload)['cached'])
+            result = service.process_audio_file(upload)
+            self.assertTrue(result['cached'])
+            self.assertEqual(result['transcribed_text'], 'hello world')
+            self.assertEqual(google.call_count, 5)
+
+
+class CalibrationOffsetTests(SimpleTestCase):
+    """Client-supplied dBFS to dB SPL offset"""
+
+    def test_rejects_non_finite_values(self):
+        self.assertEqual(_calibration_offset(mock.Mock(data={'calibration_offset': '94.5'})), 94.5)
+        self.assertIsNone(_calibration_offset(mock.Mock(data={})))
+        for value in ('nan', 'inf', '-Infinity', 'loud'):
+            with self.assertRaises(ValueError):
+                _calibration_offset(mock.Mock(data={'calibration_offset': value}))
+
+
+class NoiseAnalyzerTests(SimpleTestCase):
+    """Streaming noise levels"""
+
+    def feed(self, analyzer, samples, block):
+        for start in range(0, len(samples), block):
+            analyzer.feed(samples[start:start + block])
+        return analyzer.result()
+
+    def test_levels_do_not_depend_on_block_size(self):
+        rng = np.random.default_rng(0)
+        # 10 s of white noise at -30 dBFS, then 10 s at -50 dBFS
+        samples = np.concatenate((0.0316 * rng.standard_normal(160000), 0.00316 * rng.standard_normal(160000)))
+        samples = samples.astype(np.float32)
+        result = self.feed(NoiseAnalyzer(16000, calibration_offset=100, timeline_points=20), samples, 16000)
+        self.assertAlmostEqual(result['noise_level'], 100 - 30 - 3 + 0.04, delta=0.2)
+        self.assertAlmostEqual(result['statistics']['l90'], 50, delta=0.5)
+        self.assertAlmostEqual(result['statistics']['l10'], 70, delta=0.5)
+        self.assertEqual(len(result['level_timeline']), 20)
+        self.assertAlmostEqual(result['level_timeline'][-1]['time'], 19.0)
+
+        other = self.feed(NoiseAnalyzer(16000, calibration_offset=100, timeline_points=20), samples, 3333)
+        self.assertEqual(other['noise_level'], result['noise_level'])
+        self.assertEqual(other['level_timeline'], result['level_timeline'])
+
+    def test_classifies_low_rumble_as_traffic(self):
+        from scipy.signal import lfilter
+
+        rumble = lfilter([1], [1, -0.995], np.random.default_rng(1).standard_normal(16000 * 10))
+        result = self.feed(NoiseAnalyzer(16000), (0.01 * rumble).astype(np.float32), 16000)
+        self.assertEqual(result['noise_type'], 'traffic')
+
+
+class VolumeAnalyzerTests(SimpleTestCase):
+    """Streaming volume metrics"""
+
+    def analyze(self, samples, block=44100):
+        analyzer = VolumeAnalyzer(44100, calibration_offset=0)
+        for start in range(0, len(samples), block):
+            analyzer.feed(samples[start:start + block])
+        return analyzer.result()
+
+    def test_true_peak_finds_inter_sample_peaks(self):
+        # Samples of this sine all sit at +-0.707; the waveform reaches 1.0
+        t = np.arange(44100) / 44100
+        samples = np.sin(2 * np.pi * 11025 * t + np.pi / 4).astype(np.float32)
+        result = self.analyze(samples, block=1000)
+        self.assertAlmostEqual(result['statistics']['sample_peak_dbfs'], -3.01, delta=0.05)
+        self.assertAlmostEqual(result['statistics']['true_peak_dbtp'], 0.0, delta=0.3)
+        self.assertAlmostEqual(result['average_volume'], -3.0, delta=0.1)
+
+    def test_consistency_rating(self):
+        noise = 0.1 * np.random.default_rng(0).standard_normal(44100 * 30)
+        self.assertEqual(self.analyze(noise.astype(np.float32))['volume_consistency'], 'very_consistent')
+        # Loudness jumping by up to 50 dB every half second
+        gains = np.repeat(10 ** (np.random.default_rng(1).uniform(-2.5, 0, 60)), 22050)
+        self.assertEqual(self.analyze((noise * gains).astype(np.float32))['volume_consistency'], 'inconsistent')
+
+
+class SpectrumAnalyzerTests(SimpleTestCase):
+    """Streaming Welch PSD"""
+
+    def test_matches_scipy_welch_and_bands(self):
+        from scipy.signal import welch
+
+        t = np.arange(16000 * 5) / 16000
+        samples = 0.5 * np.sin(2 * np.pi * 1000 * t) + 0.01 * np.random.default_rng(0).standard_normal(len(t))
+        samples = samples.astype(np.float32)
+        analyzer = SpectrumAnalyzer(16000)
+        for start in range(0, len(samples), 3000):
+            analyzer.feed(samples[start:start + 3000])
+        result = analyzer.result()
+
+        _, expected = welch(samples, 16000, nperseg=analyzer.nperseg)
+        np.testing.assert_allclose(analyzer.psd(), expected, rtol=1e-4, atol=1e-12)
+        # 8 kHz band does not fit below the 8 kHz Nyquist frequency
+        self.assertEqual(list(result['frequency_spectrum']['bands']), ['250Hz', '500Hz', '1000Hz', '2000Hz', '4000Hz'])
+        self.assertAlmostEqual(result['frequency_spectrum']['bands']['1000Hz'], -9.0, delta=0.1)
+        self.assertEqual(result['frequency_spectrum']['relative']['1000Hz'], 1.0)
+        self.assertEqual(result['dominant_frequencies'][0], 1000)
+
+
+class CombinedAnalysisTests(SimpleTestCase):
+    """One decode shared by several analyses"""
+
+    def test_matches_separate_analyses_and_keeps_partial_results(self):
+        samples = (0.1 * np.random.default_rng(0).standard_normal(22050 * 3)).astype(np.float32)
+        wav = io.BytesIO()
+        sf.write(wav, np.stack([samples, samples], axis=1), 22050, format='WAV')
+        upload = SimpleUploadedFile('a.wav', wav.getvalue(), content_type='audio/wav')
+
+        with mock.patch('hearing_assist.combined_analysis.SpectrumAnalyzer', side_effect=RuntimeError('boom')):
+            clip, results, errors = run_analyses(
+                upload, ['noise_detection', 'volume_analysis', 'frequency_analysis'], calibration_offset=90.0
+            )
+
+        self.assertEqual(clip.sample_rate, 22050)
+        self.assertEqual(errors, {'frequency_analysis': 'boom'})
+        volume = VolumeAnalyzer(22050, calibration_offset=90.0)
+        volume.feed(samples)
+        self.assertEqual(results['volume_analysis']['average_volume'], volume.result()['average_volume'])
+        self.assertAlmostEqual(results['noise_detection']['noise_level'], 70.0, delta=0.1)
+
+
+def wav_upload(seconds=1.0, sample_rate=16000):
+    samples = np.zeros(int(seconds * sample_rate), dtype=np.float32)
+    wav = io.BytesIO()
+    sf.write(wav, samples, sample_rate, format='WAV')
+    return SimpleUploadedFile('a.wav', wav.getvalue(), content_type='audio/wav')
+
+
+class AudioUploadValidationTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = get_user_model().objects.create_user(username='listener', password='pw')
+
+    def post(self, upload):
+        request = APIRequestFactory().post('/api/hearing-assist/detect-noise/', {'audio_file': upload},
+                                           format='multipart')
+        force_authenticate(request, self.user)
+        return detect_noise(request)
+
+    def upload(self, content_type, format='WAV'):
+        data = io.BytesIO()
+        sf.write(data, 0.1 * np.sin(np.arange(16000) / 5.0), 16000, format=format)
+        return SimpleUploadedFile(f'clip.{format.lower()}', data.getvalue(), content_type=content_type)
+
+    def test_common_wav_and_flac_types_are_accepted(self):
+        for content_type, format in (('audio/x-wav', 'WAV'), ('audio/flac', 'FLAC')):
+            response = self.post(self.upload(content_type, format))
+            self.assertEqual(response.status_code, 201, (content_type, response.data))
+
+    def test_unlisted_type_is_sniffed(self):
+        self.assertEqual(self.post(self.upload('application/octet-stream')).status_code, 201)
+        response = self.post(SimpleUploadedFile('notes.txt', b'not audio at all', content_type='text/plain'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Unsupported audio format', response.data['error'])
+
+
+@override_settings(TRANSCRIPTION_JOBS={'IN_PROCESS_WORKERS': 0, 'MAX_ACTIVE_PER_USER': 1,
+                                       'EVENT_POLL_INTERVAL': 0.01, 'EVENT_STREAM_TIMEOUT': 5})
+class TranscriptionQueueTests(TestCase):
+    """Database-backed transcription jobs"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = get_user_model().objects.create_user('listener', 'listener@example.com', 'password')
+        self.queue = TranscriptionQueue(lease_seconds=60, max_attempts=2)
+
+    def job(self, **fields):
+        return TranscriptionJob.objects.create(user=self.user, audio_file=ContentFile(b'RIFF', name='a.wav'), **fields)
+
+    def test_claim_skips_jobs_other_workers_won(self):
+        first, second = self.job(), self.job()
+        filter_jobs = TranscriptionJob.objects.filter
+
+        def racing_filter(*args, **kwargs):
+            # Another worker claims the first job between listing and claiming
+            if kwargs.get('id') == first.id and kwargs.get('status') == 'queued':
+                filter_jobs(id=first.id).update(status='running', worker='rival')
+            return filter_jobs(*args, **kwargs)
+
+        with mock.patch.object(TranscriptionJob.objects, 'filter', side_effect=racing_filter):
+            claimed = self.queue.claim('worker-1')
+
+        self.assertEqual(claimed.id, second.id)
+        self.assertEqual((claimed.status, claimed.worker, claimed.attempts), ('running', 'worker-1', 1))
+        self.assertIsNone(self.queue.claim('worker-2'))
+
+    def test_requeue_stale(self):
+        stale = timezone.now() - timedelta(seconds=120)
+        retry = self.job(status='running', worker='gone', heartbeat_at=stale, attempts=1)
+        exhausted = self.job(status='running', worker='gone', heartbeat_at=stale, attempts=2)
+        alive = self.job(status='running', worker='busy', heartbeat_at=timezone.now(), attempts=1)
+
+        self.assertEqual(self.queue.requeue_stale(), 1)
+
+        retry.refresh_from_db()
+        exhausted.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual((retry.status, retry.worker), ('queued', ''))
+        self.assertEqual(exhausted.status, 'failed')
+        self.assertIsNotNone(exhausted.finished_at)
+        self.assertEqual((alive.status, alive.worker), ('running', 'busy'))
+
+    def run_claimed_job(self, transcribe):
+        self.job()
+        job = self.queue.claim('worker-1')
+        result = {'transcribed_text': 'hello', 'language': 'en', 'confidence_score': 0.9,
+                  'speaker_count': 1, 'timestamps': []}
+        with mock.patch('hearing_assist.transcription_jobs.speech_to_text_service') as service:
+            service.process_audio_file.side_effect = lambda *args: transcribe(job) or result
+            self.queue.run_job(job)
+        job.refresh_from_db()
+        return job
+
+    def test_run_job_stores_result(self):
+        job = self.run_claimed_job(lambda job: None)
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.transcription.transcribed_text, 'hello')
+
+    def test_run_job_drops_result_of_superseded_worker(self):
+        def taken_over(job):
+            # The lease ran out; the job was requeued and claimed by another worker
+            TranscriptionJob.objects.filter(id=job.id).update(worker='worker-2', attempts=2)
+
+        job = self.run_claimed_job(taken_over)
+        self.assertEqual((job.status, job.worker), ('running', 'worker-2'))
+        self.assertFalse(SpeechToText.objects.exists())
+
+    def test_active_job_limit(self):
+        self.job()
+        request = APIRequestFactory().post('/api/hearing-assist/transcribe/jobs/',
+                                           {'audio_file': wav_upload()}, format='multipart')
+        force_authenticate(request, self.user)
+
+        response = create_transcription_job(request)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(TranscriptionJob.objects.count(), 1)
+
+    def test_events_stream_before_the_job_finishes(self):
+        job = self.job()
+        request = APIRequestFactory().get(f'/api/hearing-assist/transcribe/jobs/{job.id}/events/')
+        force_authenticate(request, self.user)
+        stream = transcription_job_events(request, job.id).streaming_content
+
+        async def read_events():
+            # The first event arrives while the job is still queued
+            first = (await stream.__anext__()).decode()
+            await sync_to_async(TranscriptionJob.objects.filter(id=job.id).update)(
+                status='completed', updated_at=timezone.now()
+            )
+            return first, (await stream.__anext__()).decode()
+
+        first, last = async_to_sync(read_events)()
+        self.assertTrue(first.startswith('event: progress\n'))
+        self.assertIn('"status": "queued"', first)
+        self.assertTrue(last.startswith('event: completed\n'))
+
+
+class LiveCaptionProtocolTests(TestCase):
+    """WebSocket live captions protocol, with a fake receive/send"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('listener', 'listener@example.com', 'password')
+
+    async def converse(self, *messages, opus=None):
+        """Run a connection over messages; returns what the server sent (JSON decoded)"""
+        incoming = list(messages)
+        sent = []
+
+        async def receive():
+            return incoming.pop(0) if incoming else {'type': 'websocket.disconnect'}
+
+        async def send(message):
+            sent.append(json.loads(message['text']) if 'text' in message else message)
+
+        connection = LiveCaptionConnection(self.user, send)
+        connection.opus = opus
+        await connection.run(receive)
+        return sent
+
+    async def test_end_flushes_and_closes(self):
+        sent = await self.converse(
+            {'type': 'websocket.receive', 'bytes': bytes(3200)},
+            {'type': 'websocket.receive', 'text': '{"type": "end"}'},
+        )
+        self.assertEqual(sent[0]['type'], 'end')
+        self.assertEqual(sent[0]['audio_seconds'], 0.1)
+        self.assertEqual(sent[1], {'type': 'websocket.close', 'code': 1000})
+
+    async def test_malformed_control_message(self):
+        for text in ('{"type": ', '[1, 2]'):
+            sent = await self.converse({'type': 'websocket.receive', 'text': text})
+            self.assertEqual(sent[0]['type'], 'error')
+            self.assertEqual(sent[1], {'type': 'websocket.close', 'code': 4400})
+
+    async def test_sample_rate_is_validated(self):
+        for rate in ('fast', 0, -16000, 1000000, 44100.5, None):
+            sent = await self.converse({'type': 'websocket.receive', 'text': json.dumps(
+                {'type': 'config', 'sample_rate': rate})})
+            self.assertEqual(sent[0]['type'], 'error', rate)
+            self.assertEqual(sent[1], {'type': 'websocket.close', 'code': 4400})
+
+        sent = await self.converse(
+            {'type': 'websocket.receive', 'text': '{"type": "config", "sample_rate": "48000"}'},
+            {'type': 'websocket.receive', 'bytes': bytes(9600)},
+            {'type': 'websocket.receive', 'text': '{"type": "end"}'},
+        )
+        self.assertEqual(sent[0]['type'], 'end')
+        self.assertAlmostEqual(sent[0]['audio_seconds'], 0.1, delta=0.01)
+
+    async def test_bad_opus_packet_keeps_the_connection(self):
+        opus = mock.Mock()
+        opus.decode.side_effect = RuntimeError('corrupted stream')
+        sent = await self.converse(
+            {'type': 'websocket.receive', 'bytes': b'garbage'},
+            {'type': 'websocket.receive', 'text': '{"type": "end"}'},
+            opus=opus,
+        )
+        self.assertEqual([m['type'] for m in sent], ['error', 'end', 'websocket.close'])
+        self.assertIn('corrupted stream', sent[0]['error'])
+
+    def test_unrecognizable_segment_is_an_empty_caption(self):
+        import speech_recognition as sr
+        from services.speech_to_text_service import speech_to_text_service as service
+
+        with mock.patch.object(service, 'engine', mock.Mock()) as engine, \
+                mock.patch.object(service.recognizer, 'recognize_sphinx', side_effect=sr.UnknownValueError()) as sphinx:
+            engine.name = 'google'
+            result = service.transcribe_samples(np.zeros(16000, dtype=np.float32), language='fr')
+        self.assertEqual(result['text'], '')
+        self.assertEqual(sphinx.call_args.kwargs['language'], 'fr-FR')
+
+
+class CountingEngine(STTEngine):
+    """Transcribes every clip as its length; counts instances"""
+
+    name = 'counting'
+    instances = 0
+
+    def __init__(self, config):
+        super().__init__(config)
+        time.sleep(0.05)  # Loading a model is slow
+        CountingEngine.instances += 1
+
+    def transcribe(self, samples, language='en'):
+        return {'text': f'{len(samples)} {language}', 'confidence': 1.0, 'words': []}
+
+
+class STTEngineTests(SimpleTestCase):
+    def setUp(self):
+        CountingEngine.instances = 0
+        self.proxy = LazySTTEngine('hearing_assist.tests.CountingEngine', {'MODEL': 'tiny'})
+
+    def test_base_class_requires_transcribe(self):
+        with self.assertRaises(TypeError):
+            STTEngine({})
+
+    def test_engine_loads_once_on_first_use(self):
+        self.assertFalse(self.proxy.loaded)
+        self.assertEqual(self.proxy.name, 'hearing_assist.tests.CountingEngine')  # Proxy's own attribute
+        self.assertEqual(CountingEngine.instances, 0)
+
+        threads = [threading.Thread(target=self.proxy.transcribe, args=(np.zeros(10),)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(self.proxy.loaded)
+        self.assertEqual(CountingEngine.instances, 1)
+        self.assertEqual(self.proxy.config, {'MODEL': 'tiny'})
+
+    def test_default_batch_transcribes_each_clip(self):
+        results = self.proxy.transcribe_batch([np.zeros(3), np.zeros(5)], 'fr')
+        self.assertEqual([result['text'] for result in results], ['3 fr', '5 fr'])
+
+
+class FasterWhisperFallbackTests(SimpleTestCase):
+    """Batches fall back to per-clip transcribe() when faster-whisper internals differ"""
+
+    def setUp(self):
+        # Skip __init__, which loads a real model
+        self.engine = FasterWhisperEngine.__new__(FasterWhisperEngine)
+        self.engine.config = {}
+        self.engine._model = mock.Mock(spec=['transcribe'])  # No .model, .hf_tokenizer, ...
+        self.engine._model.transcribe.side_effect = lambda samples, **kwargs: ([mock.Mock(
+            text=f' {len(samples)} samples', words=[mock.Mock(word=' hi', start=0.0, end=0.5, probability=0.9)],
+        )], None)
+
+    def test_batch_falls_back_to_single_clips(self):
+        clips = [np.zeros(16000, dtype=np.float32), np.zeros(8000, dtype=np.float32)]
+        # The packages import, but the model lacks the internals the batch path uses
+        modules = {'ctranslate2': mock.Mock(), 'faster_whisper': mock.Mock(), 'faster_whisper.tokenizer': mock.Mock()}
+        with mock.patch.dict(sys.modules, modules), self.assertLogs('services.stt_engines', 'WARNING') as logs:
+            results = self.engine.transcribe_batch(clips, 'en')
+
+        self.assertIn('AttributeError', logs.output[0])
+        self.assertEqual([result['text'] for result in results], ['16000 samples', '8000 samples'])
+        self.assertEqual(results[0]['words'], [{'word': 'hi', 'start': 0.0, 'end': 0.5, 'confidence': 0.9}])
+        self.assertEqual(self.engine._model.transcribe.call_count, 2)
+
+
+@skipUnless(importlib.util.find_spec('faster_whisper'), 'faster-whisper is not installed')
+class FasterWhisperBatchTests(SimpleTestCase):
+    """transcribe_batch drives faster-whisper internals; check it against the public transcribe()"""
+
+    def setUp(self):
+        path = os.environ.get('STT_TEST_AUDIO')
+        if not path:
+            self.skipTest('Set STT_TEST_AUDIO to a short (< 30 s) speech recording')
+        with open(path, 'rb') as audio_file:
+            clip = AudioClip.from_bytes(audio_file.read()).resample().normalize()
+        self.clips = [clip.samples, clip.samples[:len(clip.samples) // 2]]
+        self.engine = FasterWhisperEngine({'MODEL': os.environ.get('STT_TEST_MODEL', 'tiny')})
+
+    def words(self, text):
+        return re.findall(r"[a-z0-9']+", text.lower())
+
+    def test_batch_matches_single_clips(self):
+        batch = self.engine.transcribe_batch(self.clips, 'en')
+        single = [self.engine.transcribe(samples, 'en') for samples in self.clips]
+
+        for samples, batched, alone in zip(self.clips, batch, single):
+            self.assertTrue(alone['text'])
+            similarity = difflib.SequenceMatcher(None, self.words(batched['text']), self.words(alone['text']))
+            self.assertGreaterEqual(similarity.ratio(), 0.8, (batched['text'], alone['text']))
+
+            duration = len(samples) / 16000
+            starts = [word['start'] for word in batched['words']]
+            self.assertEqual(starts, sorted(starts))
+            self.assertTrue(all(0 <= word['start'] <= word['end'] <= duration + 0.5 for word in batched['words']))
+            self.assertAlmostEqual(batched['words'][0]['start'], alone['words'][0]['start'], delta=0.5)
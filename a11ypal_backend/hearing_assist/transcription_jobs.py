@@ -0,0 +1,195 @@
+"""
+Database-backed queue for asynchronous transcription.
+
+Submitting a job only stores the audio and a TranscriptionJob row. Workers
+claim queued rows with a conditional UPDATE, so any number of worker threads
+and processes can share the table. While a job runs its worker renews a
+heartbeat; a job whose heartbeat is older than LEASE_SECONDS (its worker was
+restarted or died) is queued again, up to MAX_ATTEMPTS times. Progress and the
+partial text are written to the row as chunks of a long recording finish.
+
+Workers run as daemon threads in the web process (IN_PROCESS_WORKERS, started
+on first use) and/or as separate processes (manage.py run_transcription_worker).
+"""
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from services.metrics import metrics
+from services.speech_to_text_service import speech_to_text_service
+from .models import SpeechToText, TranscriptionJob
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class TranscriptionQueue:
+    """
+    Claims and runs TranscriptionJob rows
+
+    Args:
+        lease_seconds: A running job without a heartbeat for this long is requeued
+        max_attempts: Jobs are failed instead of requeued after this many tries
+        idle_poll: Seconds an idle worker waits before looking again
+    """
+
+    def __init__(self, lease_seconds: float = 60.0, max_attempts: int = 3, idle_poll: float = 5.0):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.idle_poll = idle_poll
+        self.wakeup = threading.Event()
+
+    @classmethod
+    def from_settings(cls) -> 'TranscriptionQueue':
+        config = getattr(settings, 'TRANSCRIPTION_JOBS', {})
+        return cls(
+            lease_seconds=config.get('LEASE_SECONDS', 60.0),
+            max_attempts=config.get('MAX_ATTEMPTS', 3),
+            idle_poll=config.get('IDLE_POLL', 5.0),
+        )
+
+    def requeue_stale(self) -> int:
+        """Queue again (or fail) running jobs whose worker stopped renewing its lease"""
+        cutoff = timezone.now() - timedelta(seconds=self.lease_seconds)
+        stale = TranscriptionJob.objects.filter(status='running', heartbeat_at__lt=cutoff)
+        failed = stale.filter(attempts__gte=self.max_attempts).update(
+            status='failed', error='Worker stopped too many times', finished_at=timezone.now()
+        )
+        requeued = stale.update(status='queued', worker='')
+        if requeued or failed:
+            logger.warning(f"Requeued {requeued} and failed {failed} stale transcription jobs")
+        return requeued
+
+    def claim(self, worker_name: str) -> Optional[TranscriptionJob]:
+        """Take the oldest queued job, or None when there is nothing to do"""
+        candidates = TranscriptionJob.objects.filter(status='queued').order_by('created_at')
+        # Another worker may win the race for a row; try the next one
+        for job_id in candidates.values_list('id', flat=True)[:5]:
+            now = timezone.now()
+            claimed = TranscriptionJob.objects.filter(id=job_id, status='queued').update(
+                status='running', worker=worker_name, heartbeat_at=now, started_at=now,
+                attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return TranscriptionJob.objects.get(id=job_id)
+        return None
+
+    def run_job(self, job: TranscriptionJob):
+        """
+        Transcribe one claimed job and store the result
+
+        Every write is conditional on the job still being this worker's: a job
+        requeued after its lease ran out may be running on another worker, and
+        only one of them records a result.
+        """
+        metrics.observe('hearing.jobs.queue_wait_seconds', (job.started_at - job.created_at).total_seconds())
+        owned = TranscriptionJob.objects.filter(id=job.id, worker=job.worker, status='running')
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(owned, stop), daemon=True)
+        heartbeat.start()
+
+        def on_progress(done: int, total: int, partial_text: str):
+            owned.update(
+                chunks_done=done, chunks_total=total, progress=done / total,
+                partial_text=partial_text, heartbeat_at=timezone.now(), updated_at=timezone.now(),
+            )
+
+        try:
+            with job.audio_file.open('rb') as audio_file:
+                result = speech_to_text_service.process_audio_file(audio_file, job.language, on_progress)
+
+            with transaction.atomic():
+                # Lock the row so the result and the status change land together
+                if not owned.select_for_update().exists():
+                    logger.warning(f"Transcription job {job.id} was taken over; dropping this worker's result")
+                    metrics.increment('hearing.jobs.superseded')
+                    return
+                transcription = SpeechToText.objects.create(
+                    user_id=job.user_id,
+                    audio_file=job.audio_file.name,
+                    transcribed_text=result['transcribed_text'],
+                    language=result['language'],
+                    confidence_score=result['confidence_score'],
+                    speaker_count=result['speaker_count'],
+                    timestamps=result['timestamps'],
+                )
+                owned.update(
+                    status='completed', progress=1.0, partial_text=result['transcribed_text'],
+                    transcription=transcription, finished_at=timezone.now(), updated_at=timezone.now(),
+                )
+            metrics.increment('hearing.jobs.completed')
+        except Exception as e:
+            logger.error(f"Transcription job {job.id} failed: {str(e)}")
+            if owned.update(status='failed', error=str(e), finished_at=timezone.now(), updated_at=timezone.now()):
+                metrics.increment('hearing.jobs.failed')
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    def _heartbeat(self, owned, stop: threading.Event):
+        try:
+            while not stop.wait(self.lease_seconds / 3):
+                owned.update(heartbeat_at=timezone.now())
+        finally:
+            connection.close()
+
+    def work(self, worker_name: str, stop: Optional[threading.Event] = None, exit_when_idle: bool = False):
+        """
+        Claim and run jobs until stop is set
+
+        Args:
+            worker_name: Recorded on claimed jobs
+            stop: Set to end the loop after the current job
+            exit_when_idle: Return as soon as the queue is empty
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                self.requeue_stale()
+                job = self.claim(worker_name)
+            except Exception as e:
+                # e.g. the database is briefly unavailable; keep the worker alive
+                logger.error(f"Transcription worker {worker_name} failed to claim a job: {str(e)}")
+                job = None
+            if job is not None:
+                self.run_job(job)
+                continue
+            if exit_when_idle:
+                return
+            self.wakeup.wait(self.idle_poll)
+            self.wakeup.clear()
+
+
+transcription_queue = TranscriptionQueue.from_settings()
+
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def ensure_workers():
+    """Start the in-process worker threads (if configured) and wake them up"""
+    count = getattr(settings, 'TRANSCRIPTION_JOBS', {}).get('IN_PROCESS_WORKERS', 1)
+    with _workers_lock:
+        _workers[:] = [thread for thread in _workers if thread.is_alive()]
+        for i in range(len(_workers), count):
+            name = f'{socket.gethostname()}:{os.getpid()}:{i}'
+            thread = threading.Thread(
+                target=transcription_queue.work, args=(name,), name=f'transcription-worker-{i}', daemon=True
+            )
+            thread.start()
+            _workers.append(thread)
+    transcription_queue.wakeup.set()
+
+
+def active_job_count(user) -> int:
+    return TranscriptionJob.objects.filter(user=user, status__in=ACTIVE_STATUSES).count()
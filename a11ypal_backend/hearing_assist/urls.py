@@ -5,10 +5,14 @@ urlpatterns = [
     # Audio Analysis
     path('analyses/', views.AudioAnalysisListView.as_view(), name='audio-analysis-list'),
     path('analyze/', views.AudioAnalysisListView.as_view(), name='analyze-audio'),
+    path('analyze-combined/', views.analyze_audio_combined, name='analyze-audio-combined'),
     
     # Speech to Text
     path('speech-to-text/', views.SpeechToTextListView.as_view(), name='speech-to-text-list'),
     path('transcribe/', views.transcribe_audio, name='transcribe-audio'),
+    path('transcribe/jobs/', views.create_transcription_job, name='transcription-job-create'),
+    path('transcribe/jobs/<int:job_id>/', views.transcription_job, name='transcription-job'),
+    path('transcribe/jobs/<int:job_id>/events/', views.transcription_job_events, name='transcription-job-events'),
     
     # Noise Detection
     path('noise-detection/', views.NoiseDetectionListView.as_view(), name='noise-detection-list'),
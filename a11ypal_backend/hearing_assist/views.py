@@ -1,19 +1,35 @@
 from rest_framework import generics, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+import asyncio
+import json
 import logging
+import math
+import time
 from .models import (
     AudioAnalysis, SpeechToText, NoiseDetection, 
-    VolumeAnalysis, FrequencyAnalysis, HearingAssistSession, HearingAidSettings
+    VolumeAnalysis, FrequencyAnalysis, HearingAssistSession, HearingAidSettings,
+    TranscriptionJob
 )
 from .serializers import (
     AudioAnalysisSerializer, SpeechToTextSerializer, NoiseDetectionSerializer,
     VolumeAnalysisSerializer, FrequencyAnalysisSerializer, HearingAssistSessionSerializer,
-    HearingAidSettingsSerializer, AudioAnalysisCreateSerializer
+    HearingAidSettingsSerializer, AudioAnalysisCreateSerializer, TranscriptionJobSerializer
 )
+from services.audio_decoding import AudioBlockStream, sniff_audio
+from services.noise_analysis import NoiseAnalyzer
+from services.spectrum_analysis import SpectrumAnalyzer
+from services.volume_analysis import VolumeAnalyzer
 from services.speech_to_text_service import speech_to_text_service
+from .combined_analysis import COMBINED_ANALYSES, run_analyses, save_results
+from .transcription_jobs import active_job_count, ensure_workers
 
 logger = logging.getLogger(__name__)
 
@@ -100,6 +116,60 @@ class HearingAidSettingsView(generics.RetrieveUpdateAPIView):
         return settings
 
 
+# Content types of the formats libsndfile streams (WAV, FLAC, OGG, MP3) and
+# those decoded whole through pydub (M4A/AAC, WebM)
+AUDIO_CONTENT_TYPES = {
+    'audio/wav', 'audio/x-wav', 'audio/wave', 'audio/vnd.wave',
+    'audio/flac', 'audio/x-flac',
+    'audio/ogg', 'audio/opus',
+    'audio/mp3', 'audio/mpeg',
+    'audio/m4a', 'audio/x-m4a', 'audio/mp4', 'audio/aac', 'audio/webm',
+}
+
+
+def _validate_audio_upload(audio_file):
+    """Error message for an unusable audio upload, or None"""
+    # Validate file type; other content types (e.g. application/octet-stream)
+    # pass when libsndfile recognizes the contents
+    if audio_file.content_type not in AUDIO_CONTENT_TYPES and not sniff_audio(audio_file):
+        return 'Unsupported audio format. Please upload WAV, FLAC, MP3, OGG, M4A or WebM files.'
+    
+    # Validate file size; long recordings are transcribed in parallel chunks
+    max_size_mb = getattr(settings, 'SPEECH_TO_TEXT', {}).get('MAX_UPLOAD_MB', 50)
+    if audio_file.size > max_size_mb * 1024 * 1024:
+        return f'File too large. Maximum size is {max_size_mb}MB.'
+    return None
+
+
+def _calibration_offset(request):
+    """Optional per-device offset from dBFS to dB SPL; ValueError when malformed"""
+    value = request.data.get('calibration_offset')
+    if value in (None, ''):
+        return None
+    offset = float(value)
+    # NaN and infinity would end up in JSON fields, which cannot hold them
+    if not math.isfinite(offset):
+        raise ValueError(f"Calibration offset must be finite: {value}")
+    return offset
+
+
+def _analyze_blocks(audio_file, make_analyzer):
+    """
+    Stream an upload through an analyzer block by block
+
+    Args:
+        audio_file: Uploaded file
+        make_analyzer: Called with the sample rate; returns an object with
+            feed(block) and result()
+    """
+    block_seconds = getattr(settings, 'AUDIO_ANALYSIS', {}).get('BLOCK_SECONDS', 1.0)
+    blocks = AudioBlockStream(audio_file, block_seconds)
+    analyzer = make_analyzer(blocks.sample_rate)
+    for block in blocks:
+        analyzer.feed(block)
+    return analyzer.result()
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def transcribe_audio(request):
@@ -111,19 +181,9 @@ def transcribe_audio(request):
         audio_file = request.FILES['audio_file']
         language = request.data.get('language', 'en')
         
-        # Validate file type
-        allowed_types = ['audio/wav', 'audio/mp3', 'audio/mpeg', 'audio/ogg', 'audio/m4a']
-        if audio_file.content_type not in allowed_types:
-            return Response({
-                'error': 'Unsupported audio format. Please upload WAV, MP3, OGG, or M4A files.'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Validate file size (max 10MB)
-        max_size = 10 * 1024 * 1024  # 10MB
-        if audio_file.size > max_size:
-            return Response({
-                'error': 'File too large. Maximum size is 10MB.'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        error = _validate_audio_upload(audio_file)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
         
         logger.info(f"Processing audio file: {audio_file.name}, size: {audio_file.size} bytes, language: {language}")
         
@@ -152,7 +212,9 @@ def transcribe_audio(request):
             'speaker_count': speech_to_text.speaker_count,
             'timestamps': speech_to_text.timestamps,
             'duration': transcription_result['duration'],
+            'speech_duration': transcription_result['speech_duration'],
             'processing_time': transcription_result['processing_time'],
+            'cached': transcription_result['cached'],
             'created_at': speech_to_text.created_at
         }, status=status.HTTP_201_CREATED)
         
@@ -163,26 +225,139 @@ def transcribe_audio(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_transcription_job(request):
+    """Queue audio for transcription and return the job id right away"""
+    if 'audio_file' not in request.FILES:
+        return Response({'error': 'Audio file required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    audio_file = request.FILES['audio_file']
+    error = _validate_audio_upload(audio_file)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+    
+    max_active = getattr(settings, 'TRANSCRIPTION_JOBS', {}).get('MAX_ACTIVE_PER_USER', 3)
+    if active_job_count(request.user) >= max_active:
+        return Response({
+            'error': f'Too many transcriptions in progress. At most {max_active} may be queued or running.'
+        }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    
+    job = TranscriptionJob.objects.create(
+        user=request.user,
+        audio_file=audio_file,
+        language=request.data.get('language', 'en'),
+    )
+    ensure_workers()
+    
+    data = TranscriptionJobSerializer(job).data
+    data['status_url'] = reverse('transcription-job', args=[job.id])
+    data['events_url'] = reverse('transcription-job-events', args=[job.id])
+    return Response(data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def transcription_job(request, job_id):
+    """Current status, progress and partial text of a transcription job"""
+    job = get_object_or_404(TranscriptionJob, id=job_id, user=request.user)
+    if job.status in ('queued', 'running'):
+        # Workers of a restarted web process start again on first use
+        ensure_workers()
+    return Response(TranscriptionJobSerializer(job).data)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients ask for text/event-stream; the view streams the body itself"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f"event: error\ndata: {json.dumps(data)}\n\n".encode()
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def transcription_job_events(request, job_id):
+    """
+    Server-sent events for a transcription job
+    
+    A "progress" event carries the job whenever it changes; the stream ends
+    with a "completed" or "failed" event (or after EVENT_STREAM_TIMEOUT
+    seconds, when clients should reconnect).
+    """
+    job = get_object_or_404(TranscriptionJob, id=job_id, user=request.user)
+    ensure_workers()
+    config = getattr(settings, 'TRANSCRIPTION_JOBS', {})
+    poll_interval = config.get('EVENT_POLL_INTERVAL', 0.5)
+    timeout = config.get('EVENT_STREAM_TIMEOUT', 300)
+    
+    def snapshot():
+        current = TranscriptionJob.objects.select_related('transcription').get(id=job.id)
+        return current.status, current.updated_at, TranscriptionJobSerializer(current).data
+    
+    # An async generator, so under ASGI each event is flushed as it happens
+    # and a waiting stream holds no worker thread between polls
+    async def events():
+        deadline = time.monotonic() + timeout
+        last_update = None
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            job_status, updated_at, data = await sync_to_async(snapshot)()
+            if updated_at != last_update:
+                last_update = updated_at
+                last_sent = time.monotonic()
+                event = job_status if job_status in ('completed', 'failed') else 'progress'
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+                if event != 'progress':
+                    return
+            elif time.monotonic() - last_sent > 15:
+                # Comment line keeps proxies from closing an idle stream
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(poll_interval)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def detect_noise(request):
-    """Analyze audio file for noise detection"""
+    """Measure the noise level of an audio file and classify the noise"""
     if 'audio_file' not in request.FILES:
         return Response({'error': 'Audio file required'}, status=status.HTTP_400_BAD_REQUEST)
     
     audio_file = request.FILES['audio_file']
+    error = _validate_audio_upload(audio_file)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Mock noise detection result
-    mock_noise_level = 75.5  # Decibels
-    mock_noise_type = 'traffic'
-    mock_recommendations = "Consider using noise-canceling headphones or moving to a quieter location for better audio clarity."
+    try:
+        calibration_offset = _calibration_offset(request)
+    except ValueError:
+        return Response({'error': 'calibration_offset must be a finite number'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        result = _analyze_blocks(
+            audio_file, lambda sample_rate: NoiseAnalyzer.from_settings(sample_rate, calibration_offset)
+        )
+    except Exception as e:
+        logger.error(f"Error detecting noise: {str(e)}")
+        return Response({'error': f'Noise detection failed: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
     
     noise_detection = NoiseDetection.objects.create(
         user=request.user,
         audio_file=audio_file,
-        noise_level=mock_noise_level,
-        noise_type=mock_noise_type,
-        recommendations=mock_recommendations
+        noise_level=result['noise_level'],
+        noise_type=result['noise_type'],
+        recommendations=result['recommendations'],
+        duration=result['statistics']['duration'],
+        statistics=result['statistics'],
+        level_timeline=result['level_timeline'],
     )
     
     return Response(NoiseDetectionSerializer(noise_detection).data, status=status.HTTP_201_CREATED)
@@ -191,25 +366,37 @@ def detect_noise(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def analyze_volume(request):
-    """Analyze audio volume levels"""
+    """Measure average and peak volume and how consistent it is"""
     if 'audio_file' not in request.FILES:
         return Response({'error': 'Audio file required'}, status=status.HTTP_400_BAD_REQUEST)
     
     audio_file = request.FILES['audio_file']
+    error = _validate_audio_upload(audio_file)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Mock volume analysis result
-    mock_avg_volume = 65.2  # Average decibels
-    mock_peak_volume = 85.7  # Peak decibels
-    mock_consistency = 'consistent'
-    mock_recommendations = "Volume levels are within normal range. Consider adjusting if you experience hearing difficulties."
+    try:
+        calibration_offset = _calibration_offset(request)
+    except ValueError:
+        return Response({'error': 'calibration_offset must be a finite number'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        result = _analyze_blocks(
+            audio_file, lambda sample_rate: VolumeAnalyzer.from_settings(sample_rate, calibration_offset)
+        )
+    except Exception as e:
+        logger.error(f"Error analyzing volume: {str(e)}")
+        return Response({'error': f'Volume analysis failed: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
     
     volume_analysis = VolumeAnalysis.objects.create(
         user=request.user,
         audio_file=audio_file,
-        average_volume=mock_avg_volume,
-        peak_volume=mock_peak_volume,
-        volume_consistency=mock_consistency,
-        recommendations=mock_recommendations
+        average_volume=result['average_volume'],
+        peak_volume=result['peak_volume'],
+        volume_consistency=result['volume_consistency'],
+        recommendations=result['recommendations'],
+        duration=result['statistics']['duration'],
+        statistics=result['statistics'],
     )
     
     return Response(VolumeAnalysisSerializer(volume_analysis).data, status=status.HTTP_201_CREATED)
@@ -218,35 +405,101 @@ def analyze_volume(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def analyze_frequency(request):
-    """Analyze audio frequency spectrum"""
+    """Analyze the frequency spectrum of an audio file in audiometric octave bands"""
     if 'audio_file' not in request.FILES:
         return Response({'error': 'Audio file required'}, status=status.HTTP_400_BAD_REQUEST)
     
     audio_file = request.FILES['audio_file']
+    error = _validate_audio_upload(audio_file)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Mock frequency analysis result
-    mock_dominant_frequencies = [250, 500, 1000, 2000, 4000, 8000]  # Hz
-    mock_frequency_spectrum = {
-        '250Hz': 0.8,
-        '500Hz': 0.9,
-        '1000Hz': 0.95,
-        '2000Hz': 0.85,
-        '4000Hz': 0.7,
-        '8000Hz': 0.6
-    }
-    mock_recommendations = "Consider hearing aid adjustments for frequencies below 2000Hz where sensitivity is reduced."
+    try:
+        result = _analyze_blocks(audio_file, SpectrumAnalyzer)
+    except Exception as e:
+        logger.error(f"Error analyzing frequency: {str(e)}")
+        return Response({'error': f'Frequency analysis failed: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
     
     frequency_analysis = FrequencyAnalysis.objects.create(
         user=request.user,
         audio_file=audio_file,
-        dominant_frequencies=mock_dominant_frequencies,
-        frequency_spectrum=mock_frequency_spectrum,
-        hearing_aid_recommendations=mock_recommendations
+        dominant_frequencies=result['dominant_frequencies'],
+        frequency_spectrum=result['frequency_spectrum'],
+        hearing_aid_recommendations=result['hearing_aid_recommendations'],
     )
     
     return Response(FrequencyAnalysisSerializer(frequency_analysis).data, status=status.HTTP_201_CREATED)
 
 
+COMBINED_SERIALIZERS = {
+    'speech_to_text': SpeechToTextSerializer,
+    'noise_detection': NoiseDetectionSerializer,
+    'volume_analysis': VolumeAnalysisSerializer,
+    'frequency_analysis': FrequencyAnalysisSerializer,
+}
+
+
+def _requested_analyses(request):
+    """Analyses asked for (a list or comma-separated string, default all); ValueError when unknown"""
+    if hasattr(request.data, 'getlist'):
+        values = request.data.getlist('analyses')
+    else:
+        values = request.data.get('analyses') or []
+        values = [values] if isinstance(values, str) else values
+    analyses = [name.strip() for value in values for name in str(value).split(',') if name.strip()]
+    unknown = sorted(set(analyses) - set(COMBINED_ANALYSES))
+    if unknown:
+        raise ValueError(f"Unsupported analyses: {', '.join(unknown)}. "
+                         f"Choose from {', '.join(COMBINED_ANALYSES)}.")
+    return [name for name in COMBINED_ANALYSES if name in analyses] or list(COMBINED_ANALYSES)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def analyze_audio_combined(request):
+    """Run several analyses on one audio file, decoding and storing it once"""
+    if 'audio_file' not in request.FILES:
+        return Response({'error': 'Audio file required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    audio_file = request.FILES['audio_file']
+    error = _validate_audio_upload(audio_file)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        analyses = _requested_analyses(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        calibration_offset = _calibration_offset(request)
+    except ValueError:
+        return Response({'error': 'calibration_offset must be a finite number'}, status=status.HTTP_400_BAD_REQUEST)
+    language = request.data.get('language', 'en')
+    
+    start_time = time.perf_counter()
+    try:
+        clip, results, errors = run_analyses(audio_file, analyses, language, calibration_offset)
+    except Exception as e:
+        logger.error(f"Error decoding audio for combined analysis: {str(e)}")
+        return Response({'error': f'Audio decoding failed: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+    if not results:
+        return Response({'error': 'All analyses failed', 'errors': errors},
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    rows = save_results(request.user, audio_file, results)
+    return Response({
+        'audio_file': next(iter(rows.values())).audio_file.url,
+        'duration': round(clip.duration, 3),
+        'analyses': analyses,
+        'results': {
+            analysis_type: COMBINED_SERIALIZERS[analysis_type](row).data
+            for analysis_type, row in rows.items()
+        },
+        'errors': errors,
+        'processing_time': time.perf_counter() - start_time,
+    }, status=status.HTTP_201_CREATED)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def hearing_assist_stats(request):
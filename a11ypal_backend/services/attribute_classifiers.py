@@ -0,0 +1,264 @@
+"""
+Second-stage attribute classifiers for detected objects.
+
+Narration needs finer attributes than the detector gives (traffic-light
+state, door open/closed, whether a person faces the camera). Instead of a
+second full-frame model, crops of the relevant detections are cut from the
+frame and batched across requests into small CPU classifiers and color
+heuristics. Each result is attached to its detection as 'attributes'.
+"""
+import logging
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import TimeoutError
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .batching import MicroBatcher
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AttributeClassifier(ABC):
+    """Base class: classify a batch of equally sized BGR crops"""
+
+    name = 'base'
+    classes: Tuple[str, ...] = ()
+    input_size = (32, 32)  # (width, height) crops are resized to
+    min_size = 8  # Boxes smaller than this (pixels, either side) are skipped
+
+    @abstractmethod
+    def classify_batch(self, crops: List[np.ndarray]) -> List[Dict]:
+        """One attribute dict per crop, in order"""
+
+
+class TrafficLightClassifier(AttributeClassifier):
+    """Red / yellow / green state from saturated, bright hue pixels"""
+
+    name = 'traffic_light_state'
+    classes = ('traffic light',)
+    input_size = (24, 48)
+    min_size = 6
+
+    # OpenCV hue range is 0-179
+    HUE_RANGES = {
+        'red': ((0, 10), (160, 180)),
+        'yellow': ((15, 35),),
+        'green': ((40, 95),),
+    }
+    MIN_LIT_FRACTION = 0.03
+
+    def classify_batch(self, crops: List[np.ndarray]) -> List[Dict]:
+        # Stack the batch vertically so one cvtColor call converts every crop
+        batch = np.stack(crops)
+        count, height, width = batch.shape[:3]
+        hsv = cv2.cvtColor(batch.reshape(count * height, width, 3), cv2.COLOR_BGR2HSV)
+        hsv = hsv.reshape(count, height, width, 3)
+
+        hue = hsv[..., 0]
+        lit = (hsv[..., 1] > 90) & (hsv[..., 2] > 120)
+        fractions = {}
+        for state, ranges in self.HUE_RANGES.items():
+            in_range = np.zeros_like(lit)
+            for low, high in ranges:
+                in_range |= (hue >= low) & (hue < high)
+            fractions[state] = (lit & in_range).mean(axis=(1, 2))
+
+        states = list(fractions)
+        scores = np.stack([fractions[state] for state in states], axis=1)
+        best = scores.argmax(axis=1)
+
+        results = []
+        for i in range(count):
+            top = float(scores[i, best[i]])
+            if top < self.MIN_LIT_FRACTION:
+                results.append({'state': 'unknown', 'confidence': 0.0})
+            else:
+                results.append({
+                    'state': states[best[i]],
+                    'confidence': round(top / float(scores[i].sum()), 3),
+                })
+        return results
+
+
+class DoorStateClassifier(AttributeClassifier):
+    """
+    Open / closed from texture inside the door frame
+
+    A closed door is a mostly flat panel; an open doorway shows the scene
+    behind it, so the inner region carries far more edges. COCO has no door
+    class, so this only fires with weights that provide one.
+    """
+
+    name = 'door_state'
+    classes = ('door',)
+    input_size = (48, 96)
+    min_size = 24
+    EDGE_THRESHOLD = 0.08
+
+    def classify_batch(self, crops: List[np.ndarray]) -> List[Dict]:
+        batch = np.stack(crops)
+        count, height, width = batch.shape[:3]
+        gray = cv2.cvtColor(batch.reshape(count * height, width, 3), cv2.COLOR_BGR2GRAY)
+        gray = gray.reshape(count, height, width).astype(np.float32)
+
+        # Inner 60% of the box, away from the frame and handle
+        inner = gray[:, int(height * 0.2):int(height * 0.8), int(width * 0.2):int(width * 0.8)]
+        grad_y = np.abs(np.diff(inner, axis=1))
+        grad_x = np.abs(np.diff(inner, axis=2))
+        edge_density = ((grad_y > 20).mean(axis=(1, 2)) + (grad_x > 20).mean(axis=(1, 2))) / 2
+
+        results = []
+        for density in edge_density:
+            is_open = density > self.EDGE_THRESHOLD
+            margin = abs(float(density) - self.EDGE_THRESHOLD) / self.EDGE_THRESHOLD
+            results.append({
+                'state': 'open' if is_open else 'closed',
+                'confidence': round(min(0.5 + margin / 2, 0.95), 3),
+            })
+        return results
+
+
+class PersonFacingClassifier(AttributeClassifier):
+    """Toward / away from a frontal-face cascade on the upper part of the person"""
+
+    name = 'person_facing'
+    classes = ('person',)
+    input_size = (96, 192)
+    min_size = 48
+
+    def __init__(self):
+        self._cascade = None
+
+    def _get_cascade(self):
+        if self._cascade is None:
+            # Haar cascades moved out of the main OpenCV package in 5.x
+            if not hasattr(cv2, 'CascadeClassifier'):
+                logger.warning("OpenCV build has no CascadeClassifier; person facing is unavailable")
+                self._cascade = False
+            else:
+                path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+                self._cascade = cv2.CascadeClassifier(path)
+        return self._cascade
+
+    def classify_batch(self, crops: List[np.ndarray]) -> List[Dict]:
+        cascade = self._get_cascade()
+        if not cascade:
+            return [{'facing': 'unknown', 'confidence': 0.0} for _ in crops]
+
+        head_height = int(self.input_size[1] * 0.4)
+
+        results = []
+        for crop in crops:
+            head = cv2.cvtColor(crop[:head_height], cv2.COLOR_BGR2GRAY)
+            faces = cascade.detectMultiScale(head, scaleFactor=1.15, minNeighbors=3, minSize=(16, 16))
+            if len(faces):
+                results.append({'facing': 'toward', 'confidence': 0.8})
+            else:
+                results.append({'facing': 'away', 'confidence': 0.6})
+        return results
+
+
+class AttributeCascade:
+    """
+    Run the second stage for one frame's detections within a latency budget
+
+    Crops are submitted to one MicroBatcher per classifier so crops from
+    concurrent requests share a batch. Detections whose attributes are not
+    ready by the deadline are returned without them.
+    """
+
+    def __init__(self, classifiers: List[AttributeClassifier], timeout: float = 0.05,
+                 max_batch_size: int = 32, max_wait: float = 0.005, enabled: bool = True):
+        self.timeout = timeout
+        self.enabled = enabled
+        self._by_class: Dict[str, AttributeClassifier] = {}
+        self._batchers: Dict[str, MicroBatcher] = {}
+        for classifier in classifiers:
+            for class_name in classifier.classes:
+                self._by_class[class_name] = classifier
+            self._batchers[classifier.name] = MicroBatcher(
+                lambda key, crops, classifier=classifier: classifier.classify_batch(crops),
+                max_batch_size=max_batch_size,
+                max_wait=max_wait,
+                name=f'detection.attributes.{classifier.name}',
+            )
+
+    @classmethod
+    def from_settings(cls) -> 'AttributeCascade':
+        config = getattr(settings, 'DETECTION_ATTRIBUTES', {})
+        return cls(
+            [TrafficLightClassifier(), DoorStateClassifier(), PersonFacingClassifier()],
+            timeout=config.get('TIMEOUT', 0.05),
+            max_batch_size=config.get('BATCH_SIZE', 32),
+            max_wait=config.get('BATCH_WAIT', 0.005),
+            enabled=config.get('ENABLED', True),
+        )
+
+    def annotate(self, image: np.ndarray, detections: List[Dict]) -> Dict:
+        """
+        Attach 'attributes' to the detections of selected classes in place
+
+        Args:
+            image: Frame the detections came from (BGR format)
+            detections: Detection dicts with pixel 'bounds' (x1, y1, x2, y2)
+
+        Returns:
+            Dict with the second-stage 'attribute_time' and crop counts
+        """
+        start_time = time.perf_counter()
+        height, width = image.shape[:2]
+
+        pending = []
+        for detection in detections if self.enabled else []:
+            classifier = self._by_class.get(detection['name'])
+            if classifier is None:
+                continue
+
+            bounds = detection['bounds']
+            x1, y1 = max(0, bounds['x1']), max(0, bounds['y1'])
+            x2, y2 = min(width, bounds['x2']), min(height, bounds['y2'])
+            if x2 - x1 < classifier.min_size or y2 - y1 < classifier.min_size:
+                continue
+
+            crop = cv2.resize(image[y1:y2, x1:x2], classifier.input_size, interpolation=cv2.INTER_AREA)
+            pending.append((detection, self._batchers[classifier.name].submit(crop)))
+
+        deadline = start_time + self.timeout
+        timed_out = 0
+        for detection, future in pending:
+            try:
+                detection['attributes'] = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            except TimeoutError:
+                timed_out += 1
+            except Exception as e:
+                logger.error(f"Attribute classification failed: {str(e)}")
+
+        attribute_time = time.perf_counter() - start_time
+        if pending:
+            metrics.observe('detection.attributes.seconds', attribute_time)
+            metrics.increment('detection.attributes.crops', len(pending))
+            metrics.increment('detection.attributes.timeouts', timed_out)
+
+        return {
+            'attribute_time': attribute_time,
+            'crops': len(pending),
+            'timed_out': timed_out,
+        }
+
+
+# Global cascade instance
+_attribute_cascade = None
+
+def get_attribute_cascade() -> AttributeCascade:
+    """Get or create the global attribute cascade"""
+    global _attribute_cascade
+
+    if _attribute_cascade is None:
+        _attribute_cascade = AttributeCascade.from_settings()
+
+    return _attribute_cascade
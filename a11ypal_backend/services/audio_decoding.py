@@ -0,0 +1,192 @@
+"""
+Decoding helpers for uploaded audio.
+
+For recognition an upload is decoded once from its bytes into a float32
+buffer; resampling, normalization, metadata and the PCM handed to speech
+recognizers are all derived from that buffer, without temporary files.
+
+Level and spectrum analyses instead read the upload in fixed-size blocks
+(AudioBlockStream), so memory does not grow with the length of the recording.
+"""
+import io
+from typing import Iterator, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from .resampling import resample
+from .uploads import read_upload
+
+STT_SAMPLE_RATE = 16000  # Rate most STT engines expect
+
+
+def decode_audio(data: bytes) -> Tuple[np.ndarray, int]:
+    """
+    Decode encoded audio bytes
+
+    WAV, FLAC, OGG and (with libsndfile >= 1.1) MP3 are read by soundfile;
+    anything else goes through pydub, which needs ffmpeg.
+
+    Args:
+        data: Encoded audio bytes
+
+    Returns:
+        (samples as float32 array of shape (frames, channels), sample rate)
+    """
+    try:
+        samples, sample_rate = sf.read(io.BytesIO(data), dtype='float32', always_2d=True)
+        return samples, sample_rate
+    except RuntimeError:
+        # soundfile.LibsndfileError: format not supported by libsndfile
+        pass
+
+    from pydub import AudioSegment
+
+    try:
+        segment = AudioSegment.from_file(io.BytesIO(data))
+    except Exception as e:
+        raise ValueError(f"Could not decode audio: {str(e)}")
+    samples = np.array(segment.get_array_of_samples(), dtype=np.float32)
+    samples = samples.reshape(-1, segment.channels) / float(1 << (8 * segment.sample_width - 1))
+    return samples, segment.frame_rate
+
+
+class AudioClip:
+    """
+    One decoded upload, downmixed to mono
+
+    Args:
+        samples: float32 array of shape (frames, channels) or (frames,)
+        sample_rate: Sample rate of samples
+    """
+
+    def __init__(self, samples: np.ndarray, sample_rate: int):
+        self.channels = 1 if samples.ndim == 1 else samples.shape[1]
+        self.original_sample_rate = sample_rate
+        self.samples = samples if samples.ndim == 1 else samples.mean(axis=1, dtype=np.float32)
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'AudioClip':
+        return cls(*decode_audio(data))
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / float(self.sample_rate) if self.sample_rate else 0.0
+
+    def copy(self) -> 'AudioClip':
+        """Independent copy, for in-place processing of a shared clip"""
+        clip = AudioClip(self.samples.copy(), self.sample_rate)
+        clip.channels = self.channels
+        clip.original_sample_rate = self.original_sample_rate
+        return clip
+
+    def resample(self, target_rate: int = STT_SAMPLE_RATE) -> 'AudioClip':
+        """Resample in place (no-op when already at target_rate)"""
+        if self.sample_rate != target_rate and len(self.samples):
+            self.samples = resample(self.samples, self.sample_rate, target_rate)
+        self.sample_rate = target_rate
+        return self
+
+    def normalize(self) -> 'AudioClip':
+        """Scale to peak amplitude 1.0 in place"""
+        peak = float(np.abs(self.samples).max()) if len(self.samples) else 0.0
+        if peak > 0:
+            self.samples *= np.float32(1.0 / peak)
+        return self
+
+    def to_pcm16(self) -> bytes:
+        """Little-endian 16-bit PCM, as speech_recognition.AudioData expects"""
+        return (np.clip(self.samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+
+def sniff_audio(audio_file) -> bool:
+    """Whether libsndfile recognizes an upload's contents (leaves it rewound)"""
+    audio_file.seek(0)
+    try:
+        sf.info(audio_file)
+        return True
+    except RuntimeError:
+        return False
+    finally:
+        audio_file.seek(0)
+
+
+class AudioBlockStream:
+    """
+    An upload read as mono float32 blocks
+
+    Formats libsndfile reads (WAV, FLAC, OGG, MP3) are streamed from the file
+    with soundfile; anything else is decoded whole by decode_audio() and then
+    sliced.
+
+    Args:
+        audio_file: Open, seekable file (e.g. a Django UploadedFile)
+        block_seconds: Length of each block
+    """
+
+    def __init__(self, audio_file, block_seconds: float = 1.0):
+        self.audio_file = audio_file
+        self.block_seconds = block_seconds
+        self._decoded = None
+        audio_file.seek(0)
+        try:
+            info = sf.info(audio_file)
+            self.sample_rate, self.channels, self.frames = info.samplerate, info.channels, info.frames
+        except RuntimeError:
+            # Not readable by libsndfile: fall back to a full decode
+            samples, self.sample_rate = decode_audio(read_upload(audio_file))
+            self.channels = samples.shape[1]
+            self._decoded = samples.mean(axis=1, dtype=np.float32)
+            self.frames = len(self._decoded)
+        audio_file.seek(0)
+
+    @property
+    def duration(self) -> float:
+        return self.frames / float(self.sample_rate) if self.sample_rate else 0.0
+
+    @property
+    def block_frames(self) -> int:
+        return max(1, int(self.block_seconds * self.sample_rate))
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        if self._decoded is not None:
+            for start in range(0, len(self._decoded), self.block_frames):
+                yield self._decoded[start:start + self.block_frames]
+            return
+
+        self.audio_file.seek(0)
+        try:
+            for block in sf.blocks(self.audio_file, blocksize=self.block_frames, dtype='float32', always_2d=True):
+                yield block.mean(axis=1, dtype=np.float32) if self.channels > 1 else block[:, 0]
+        finally:
+            # Leave the upload rewound so it can still be saved
+            self.audio_file.seek(0)
+
+
+class Framer:
+    """
+    Regroup blocks of any length into fixed-length frames
+
+    Args:
+        frame_length: Samples per frame
+        hop: Samples between frame starts (default: frame_length, no overlap)
+    """
+
+    def __init__(self, frame_length: int, hop: int = None):
+        self.frame_length = frame_length
+        self.hop = hop or frame_length
+        self._remainder = np.zeros(0, dtype=np.float32)
+
+    def push(self, block: np.ndarray) -> np.ndarray:
+        """Add samples; returns the completed frames as an array of shape (n, frame_length)"""
+        samples = np.concatenate((self._remainder, block)) if len(self._remainder) else block
+        count = (len(samples) - self.frame_length) // self.hop + 1 if len(samples) >= self.frame_length else 0
+        self._remainder = samples[count * self.hop:].copy()
+        if self.hop == self.frame_length or not count:
+            return samples[:count * self.frame_length].reshape(count, self.frame_length)
+        return np.lib.stride_tricks.sliding_window_view(samples, self.frame_length)[::self.hop][:count]
+
+    def remainder(self) -> np.ndarray:
+        """Samples not yet returned at end of stream (shorter than a frame)"""
+        return self._remainder
@@ -0,0 +1,97 @@
+"""
+Cross-request micro-batching.
+
+Requests submit single items and get a Future back; a background thread
+groups pending items by key and hands them to a batch function once a batch
+is full or its oldest item has waited long enough.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collect items from concurrent callers into batches
+
+    Args:
+        process_batch: Called as process_batch(key, items) on the worker
+            thread; must return one result per item, in order
+        max_batch_size: Flush a group as soon as it holds this many items
+        max_wait: Flush a group once its oldest item is this many seconds old
+        name: Metric prefix; queue wait and compute time are reported separately
+    """
+
+    def __init__(self, process_batch: Callable[[Hashable, List[Any]], List[Any]],
+                 max_batch_size: int = 16, max_wait: float = 0.005, name: str = 'batcher'):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+
+        self._pending: Dict[Hashable, List[Tuple[Any, Future, float]]] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, item: Any, key: Hashable = None) -> Future:
+        """Queue an item for the next batch of its key"""
+        future = Future()
+        with self._condition:
+            self._ensure_worker()
+            self._pending.setdefault(key, []).append((item, future, time.perf_counter()))
+            self._condition.notify()
+        return future
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-worker', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self) -> Tuple[Hashable, List[Tuple[Any, Future, float]]]:
+        """Block until some group is full or has waited max_wait, then pop it"""
+        with self._condition:
+            while True:
+                now = time.perf_counter()
+                wait = None
+                for key, entries in self._pending.items():
+                    deadline = entries[0][2] + self.max_wait
+                    if len(entries) >= self.max_batch_size or deadline <= now:
+                        batch = entries[:self.max_batch_size]
+                        remaining = entries[self.max_batch_size:]
+                        if remaining:
+                            self._pending[key] = remaining
+                        else:
+                            del self._pending[key]
+                        return key, batch
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self._condition.wait(wait)
+
+    def _run(self):
+        while True:
+            key, batch = self._next_batch()
+            start_time = time.perf_counter()
+            for _, _, queued_at in batch:
+                metrics.observe(f'{self.name}.queue_wait_seconds', start_time - queued_at)
+
+            items = [item for item, _, _ in batch]
+            try:
+                results = list(self.process_batch(key, items))
+                if len(results) != len(items):
+                    # zip() would leave the unmatched callers waiting forever
+                    raise ValueError(f"Batch function returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                logger.error(f"{self.name} batch failed: {str(e)}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            metrics.observe(f'{self.name}.compute_seconds', time.perf_counter() - start_time)
+            metrics.observe(f'{self.name}.batch_size', len(batch))
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
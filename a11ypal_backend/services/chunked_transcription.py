@@ -0,0 +1,190 @@
+"""
+Parallel transcription of long recordings.
+
+A long clip is cut into chunks of about CHUNK_SECONDS at silences found by
+voice activity detection; only when a stretch of speech runs past
+MAX_CHUNK_SECONDS without a pause is it cut hard, with OVERLAP_SECONDS of
+shared audio on both sides. Chunks are transcribed in worker processes and
+stitched back together: word times are shifted by the chunk offset, and in an
+overlap only the words whose midpoint lies on a chunk's own side of the cut
+are kept. Results without word timings (the web recognizer) are stitched as
+text: at a hard cut, the words at the start of a chunk that repeat the end of
+the previous chunk's text are dropped.
+"""
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on speech rate, for how many words an overlap can repeat
+MAX_WORDS_PER_SECOND = 4
+
+
+class Chunk:
+    """
+    One piece of a long clip
+
+    Args:
+        start: First sample sent to the recognizer
+        end: Sample after the last one sent
+        own_start: Start of the span this chunk's words are kept for
+        own_end: End of that span (differs from start/end only at hard cuts)
+    """
+
+    def __init__(self, start: int, end: int, own_start: int, own_end: int):
+        self.start = start
+        self.end = end
+        self.own_start = own_start
+        self.own_end = own_end
+
+    def __repr__(self):
+        return f'Chunk({self.start}, {self.end}, own={self.own_start}-{self.own_end})'
+
+
+def plan_chunks(regions: List[Tuple[int, int]], total: int, sample_rate: int = 16000,
+                chunk_seconds: float = 30.0, max_chunk_seconds: float = 45.0,
+                overlap_seconds: float = 1.0) -> List[Chunk]:
+    """
+    Choose chunk boundaries for a clip
+
+    Args:
+        regions: Speech (start, end) sample ranges from voice activity detection
+        total: Length of the clip in samples
+        sample_rate: Sample rate of the clip
+        chunk_seconds: Preferred chunk length
+        max_chunk_seconds: Longest chunk before a hard cut
+        overlap_seconds: Audio shared by both sides of a hard cut
+
+    Returns:
+        Chunks covering the clip in order; chunks without speech are left out
+    """
+    target = int(chunk_seconds * sample_rate)
+    longest = int(max_chunk_seconds * sample_rate)
+    overlap = int(overlap_seconds * sample_rate)
+
+    # Cut candidates: the middle of every pause between speech regions
+    pauses = [(end + next_start) // 2 for (_, end), (next_start, _) in zip(regions[:-1], regions[1:])]
+
+    spans = []
+    start = 0
+    while total - start > longest:
+        candidates = [cut for cut in pauses if start + target // 2 <= cut <= start + longest]
+        if candidates:
+            cut = min(candidates, key=lambda c: abs(c - start - target))
+            spans.append((start, cut, False))
+        else:
+            cut = start + target
+            spans.append((start, cut, True))
+        start = cut
+    spans.append((start, total, False))
+
+    chunks = []
+    for i, (own_start, own_end, hard_end) in enumerate(spans):
+        hard_start = i > 0 and spans[i - 1][2]
+        chunk = Chunk(
+            max(0, own_start - overlap) if hard_start else own_start,
+            min(total, own_end + overlap) if hard_end else own_end,
+            own_start,
+            own_end,
+        )
+        if any(start < chunk.end and end > chunk.start for start, end in regions):
+            chunks.append(chunk)
+    return chunks
+
+
+def _normalize_word(word: str) -> str:
+    return word.lower().strip('.,!?;:"\'')
+
+
+def drop_repeated_words(previous: str, text: str, max_words: int) -> str:
+    """
+    Remove from the start of text the longest run of words (at most
+    max_words) that also ends previous
+    """
+    before = [_normalize_word(word) for word in previous.split()]
+    after = text.split()
+    normalized = [_normalize_word(word) for word in after]
+    for count in range(min(max_words, len(before), len(after)), 0, -1):
+        if before[-count:] == normalized[:count]:
+            return ' '.join(after[count:])
+    return text
+
+
+def stitch_chunks(chunks: List[Chunk], results: List[Dict], sample_rate: int = 16000) -> Dict:
+    """
+    Merge per-chunk results onto the clip timeline
+
+    Args:
+        chunks: The planned chunks
+        results: Transcription result per chunk (None for chunks that failed)
+        sample_rate: Sample rate of the clip
+
+    Returns:
+        Dict with 'text', 'confidence' (weighted by chunk length), 'timestamps'
+        and 'speaker_count'
+    """
+    texts = []
+    words = []
+    confidences = []
+    weights = []
+    speaker_count = 1
+    for chunk, result in zip(chunks, results):
+        if not result:
+            continue
+        offset = chunk.start / sample_rate
+        own_start, own_end = chunk.own_start / sample_rate, chunk.own_end / sample_rate
+        speaker_count = max(speaker_count, result.get('speaker_count', 1))
+        confidences.append(result['confidence'])
+        weights.append(chunk.own_end - chunk.own_start)
+
+        if not result.get('aligned'):
+            # No real word timings (web recognizer): keep the chunk text, less
+            # the words the previous chunk already heard in the shared audio
+            text = result['text']
+            if chunk.start < chunk.own_start and texts:
+                shared_seconds = (chunk.own_start - chunk.start) * 2 / sample_rate
+                text = drop_repeated_words(texts[-1], text, int(np.ceil(shared_seconds * MAX_WORDS_PER_SECOND)))
+            texts.append(text)
+            continue
+
+        kept = []
+        for word in result['timestamps']:
+            start, end = word['start'] + offset, word['end'] + offset
+            if own_start <= (start + end) / 2 < own_end:
+                kept.append(dict(word, start=round(start, 3), end=round(end, 3)))
+        words.extend(kept)
+        texts.append(' '.join(word['word'] for word in kept))
+
+    return {
+        'text': ' '.join(text for text in texts if text),
+        'confidence': float(np.average(confidences, weights=weights)) if confidences else 0.0,
+        'timestamps': words,
+        'speaker_count': speaker_count,
+    }
+
+
+def _init_worker():
+    # Workers are spawned, not forked: set up Django so settings and the
+    # engine proxy load in this process (once per worker)
+    import django
+
+    django.setup()
+
+
+def transcribe_chunk(samples: np.ndarray, sample_rate: int, language: str) -> Dict:
+    """Transcribe one chunk in a worker process; None when it has no recognizable speech"""
+    from .audio_decoding import AudioClip
+    from .speech_to_text_service import speech_to_text_service
+
+    try:
+        result = speech_to_text_service._transcribe_audio(AudioClip(samples, sample_rate), language)
+    except Exception as e:
+        logger.warning(f"Chunk transcription failed: {str(e)}")
+        return None
+    if result.get('engine') == 'none':
+        # Every recognizer failed: the placeholder text must not reach the transcript
+        logger.warning("Chunk transcription failed: no recognizer produced text")
+        return None
+    return result
@@ -0,0 +1,193 @@
+"""
+Color analysis for accessibility.
+
+Dominant colors are found with OpenCV k-means on a bounded pixel sample of
+the image, so a 12 MP photo costs about the same as a thumbnail. Contrast
+between the dominant background and foreground clusters is scored with the
+WCAG 2.x contrast ratio. Results are cached by image content hash.
+"""
+import hashlib
+import time
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .image_decoding import decode_image
+
+COLOR_CACHE_TIMEOUT = 24 * 60 * 60  # Seconds
+MIN_DOMINANT_PERCENT = 5.0  # Smaller clusters are left out of dominant_colors
+
+
+def image_content_hash(data: bytes) -> str:
+    """Stable hash of encoded image bytes, used as a cache key"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def relative_luminance(rgb: np.ndarray) -> np.ndarray:
+    """WCAG relative luminance of sRGB colors in 0-255 (last axis is RGB)"""
+    channel = rgb.astype(np.float64) / 255.0
+    linear = np.where(channel <= 0.03928, channel / 12.92, ((channel + 0.055) / 1.055) ** 2.4)
+    return linear @ np.array([0.2126, 0.7152, 0.0722])
+
+
+def contrast_ratio(rgb_a: np.ndarray, rgb_b: np.ndarray) -> float:
+    """WCAG contrast ratio between two colors, from 1 (none) to 21 (black on white)"""
+    lum_a, lum_b = relative_luminance(np.asarray(rgb_a)), relative_luminance(np.asarray(rgb_b))
+    lighter, darker = max(lum_a, lum_b), min(lum_a, lum_b)
+    return float((lighter + 0.05) / (darker + 0.05))
+
+
+def accessibility_rating(ratio: float) -> str:
+    """Map a contrast ratio onto the ColorAnalysis rating choices (WCAG AA/AAA thresholds)"""
+    if ratio >= 7.0:
+        return 'excellent'
+    if ratio >= 4.5:
+        return 'good'
+    if ratio >= 3.0:
+        return 'fair'
+    return 'poor'
+
+
+def _hex(rgb) -> str:
+    return '#{:02X}{:02X}{:02X}'.format(*(int(round(c)) for c in rgb))
+
+
+def _initial_labels(pixels: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """k-means++ seeding; returns each pixel's nearest seed as (N, 1) int32 labels"""
+    seeds = [pixels[rng.integers(len(pixels))]]
+    distances = ((pixels - seeds[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        total = distances.sum()
+        index = rng.choice(len(pixels), p=distances / total) if total > 0 else rng.integers(len(pixels))
+        seeds.append(pixels[index])
+        distances = np.minimum(distances, ((pixels - pixels[index]) ** 2).sum(axis=1))
+    seeds = np.array(seeds)
+    nearest = ((pixels[:, None, :] - seeds[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    return nearest.astype(np.int32).reshape(-1, 1)
+
+
+class ColorAnalysisService:
+    """Vectorized dominant-color and contrast analysis"""
+
+    def __init__(self, clusters: int = 5, palette_size: int = 10, max_pixels: int = 16384):
+        self.clusters = clusters
+        self.palette_size = palette_size
+        self.max_pixels = max_pixels
+
+    @classmethod
+    def from_settings(cls) -> 'ColorAnalysisService':
+        config = getattr(settings, 'COLOR_ANALYSIS', {})
+        return cls(
+            clusters=config.get('CLUSTERS', 5),
+            palette_size=config.get('PALETTE_SIZE', 10),
+            max_pixels=config.get('MAX_PIXELS', 16384),
+        )
+
+    def _sample_pixels(self, image: np.ndarray) -> np.ndarray:
+        """Area-downsample to at most max_pixels and return them as (N, 3) float32 BGR"""
+        height, width = image.shape[:2]
+        scale = min(1.0, (self.max_pixels / float(height * width)) ** 0.5)
+        if scale < 1.0:
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return image.reshape(-1, 3).astype(np.float32)
+
+    def _kmeans(self, pixels: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Cluster centers (k, 3) and their pixel counts, most common first"""
+        k = max(1, min(k, len(pixels)))
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1.0)
+        # Seeded k-means++ start from a local generator: the same image always
+        # yields the same palette, and OpenCV's shared RNG is never touched
+        labels = _initial_labels(pixels, k, np.random.default_rng(0))
+        _, labels, centers = cv2.kmeans(pixels, k, labels, criteria, 1, cv2.KMEANS_USE_INITIAL_LABELS)
+        counts = np.bincount(labels.ravel(), minlength=k)
+        order = np.argsort(counts)[::-1]
+        return centers[order], counts[order]
+
+    def analyze(self, image: np.ndarray) -> Dict:
+        """
+        Analyze the colors of an image
+
+        Args:
+            image: Input image as numpy array (BGR format)
+
+        Returns:
+            Dict with 'dominant_colors', 'color_palette', 'contrast_ratio',
+            'accessibility_rating' and 'processing_time'
+        """
+        start_time = time.time()
+        pixels = self._sample_pixels(image)
+
+        centers, counts = self._kmeans(pixels, self.clusters)
+        centers_rgb = centers[:, ::-1]
+        percentages = counts / counts.sum() * 100
+
+        dominant_colors = [
+            {'color': _hex(rgb), 'percentage': round(float(percentage), 1)}
+            for rgb, percentage in zip(centers_rgb, percentages)
+            if percentage >= MIN_DOMINANT_PERCENT
+        ]
+
+        # Finer clustering for the palette; its largest clusters come first
+        palette_centers, _ = self._kmeans(pixels, self.palette_size)
+        color_palette = list(dict.fromkeys(_hex(rgb) for rgb in palette_centers[:, ::-1]))
+
+        # Background is the most common cluster, foreground the next one
+        if len(centers_rgb) > 1:
+            ratio = contrast_ratio(centers_rgb[0], centers_rgb[1])
+            foreground = _hex(centers_rgb[1])
+        else:
+            ratio = 1.0
+            foreground = _hex(centers_rgb[0])
+
+        return {
+            'dominant_colors': dominant_colors,
+            'color_palette': color_palette,
+            'background_color': _hex(centers_rgb[0]),
+            'foreground_color': foreground,
+            'contrast_ratio': round(ratio, 2),
+            'accessibility_rating': accessibility_rating(ratio),
+            'processing_time': time.time() - start_time,
+        }
+
+    def analyze_cached(self, data: bytes, image: np.ndarray = None) -> Dict:
+        """
+        Analyze encoded image bytes, reusing a cached result for identical content
+
+        Args:
+            data: Encoded image bytes
+            image: Optional already decoded image (BGR format), or a
+                zero-argument callable returning it, called only on a cache miss
+
+        Returns:
+            Same dictionary as analyze(), plus 'image_hash' and 'cached'
+        """
+        image_hash = image_content_hash(data)
+        cache_key = f'colors:{image_hash}'
+        result = cache.get(cache_key)
+        if result is not None:
+            return {**result, 'image_hash': image_hash, 'cached': True}
+
+        if image is None:
+            image = decode_image(data)
+        elif callable(image):
+            image = image()
+        result = self.analyze(image)
+        cache.set(cache_key, result, COLOR_CACHE_TIMEOUT)
+        return {**result, 'image_hash': image_hash, 'cached': False}
+
+
+# Global service instance
+_color_analysis_service = None
+
+def get_color_analysis_service() -> ColorAnalysisService:
+    """Get or create the global color analysis service"""
+    global _color_analysis_service
+
+    if _color_analysis_service is None:
+        _color_analysis_service = ColorAnalysisService.from_settings()
+
+    return _color_analysis_service
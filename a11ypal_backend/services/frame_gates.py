@@ -0,0 +1,219 @@
+"""
+Cheap pre-inference gates for camera frames.
+
+Frames from walking users are often motion-blurred or nearly black, and a
+phone held still keeps sending the same scene. These gates look at a heavily
+downscaled grayscale thumbnail and decide whether a frame is worth a full
+detector pass; when it is not, the last good detections for the session are
+answered instead.
+"""
+import time
+from typing import Dict, Iterable, List, Optional
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .image_decoding import downscale_gray
+from .metrics import metrics
+
+LAST_DETECTIONS_TIMEOUT = 10 * 60  # Seconds
+IMAGE_DETECTIONS_TIMEOUT = 24 * 60 * 60  # Seconds
+
+metrics.register_ratio(
+    'detection.quality_gate.skip_rate',
+    'detection.quality_gate.skipped',
+    'detection.quality_gate.checked',
+)
+metrics.register_ratio(
+    'detection.motion_gate.inference_avoided_rate',
+    'detection.motion_gate.reused',
+    'detection.motion_gate.checked',
+)
+
+
+class FrameQualityGate:
+    """Reject blurred or too-dark frames using Laplacian variance and mean luminance"""
+
+    def __init__(self, blur_threshold: float = 20.0, min_brightness: float = 25.0,
+                 thumbnail_size: int = 160, enabled: bool = True):
+        self.blur_threshold = blur_threshold
+        self.min_brightness = min_brightness
+        self.thumbnail_size = thumbnail_size
+        self.enabled = enabled
+
+    @classmethod
+    def from_settings(cls) -> 'FrameQualityGate':
+        config = getattr(settings, 'DETECTION_QUALITY_GATE', {})
+        return cls(
+            blur_threshold=config.get('BLUR_THRESHOLD', 20.0),
+            min_brightness=config.get('MIN_BRIGHTNESS', 25.0),
+            thumbnail_size=config.get('THUMBNAIL_SIZE', 160),
+            enabled=config.get('ENABLED', True),
+        )
+
+    def check(self, thumbnail: np.ndarray) -> Dict:
+        """
+        Score a grayscale thumbnail
+
+        Args:
+            thumbnail: Downscaled grayscale uint8 frame
+
+        Returns:
+            Dict with 'passed', 'reason', 'sharpness' and 'brightness'
+        """
+        brightness = float(thumbnail.mean())
+        sharpness = float(cv2.Laplacian(thumbnail, cv2.CV_32F).var())
+
+        reason = None
+        if self.enabled:
+            if brightness < self.min_brightness:
+                reason = 'too_dark'
+            elif sharpness < self.blur_threshold:
+                reason = 'blurry'
+
+        metrics.increment('detection.quality_gate.checked')
+        if reason:
+            metrics.increment('detection.quality_gate.skipped')
+            metrics.increment(f'detection.quality_gate.skipped.{reason}')
+
+        return {
+            'passed': reason is None,
+            'reason': reason,
+            'sharpness': sharpness,
+            'brightness': brightness,
+        }
+
+
+class MotionGate:
+    """
+    Reuse the previous detections when a session's scene has not changed
+
+    Keeps a tiny grayscale thumbnail of the last frame that went through the
+    detector and compares new frames against it with a normalized mean
+    absolute difference (0 = identical, 1 = inverted). The reference is only
+    replaced when inference actually runs, so slow drift still accumulates
+    into a detectable change.
+    """
+
+    def __init__(self, threshold: float = 0.02, thumbnail_size: int = 32,
+                 max_reuse: int = 30, enabled: bool = True):
+        self.threshold = threshold
+        self.thumbnail_size = thumbnail_size
+        self.max_reuse = max_reuse
+        self.enabled = enabled
+
+    @classmethod
+    def from_settings(cls) -> 'MotionGate':
+        config = getattr(settings, 'DETECTION_MOTION_GATE', {})
+        return cls(
+            threshold=config.get('THRESHOLD', 0.02),
+            thumbnail_size=config.get('THUMBNAIL_SIZE', 32),
+            max_reuse=config.get('MAX_REUSE', 30),
+            enabled=config.get('ENABLED', True),
+        )
+
+    def _state_key(self, session_key: str) -> str:
+        return f'detections:motion:{session_key}'
+
+    def check(self, session_key: str, gray: np.ndarray, can_reuse: bool = True) -> Dict:
+        """
+        Compare a frame against the session's reference thumbnail
+
+        Args:
+            session_key: Camera session identifier
+            gray: Grayscale frame, typically the quality-gate thumbnail
+            can_reuse: Whether previous detections are available to reuse
+
+        Returns:
+            Dict with 'reuse' (skip inference), 'score' and the 'thumbnail'
+            to pass to update() if inference runs
+        """
+        start_time = time.perf_counter()
+        thumbnail = downscale_gray(gray, self.thumbnail_size)
+
+        score = None
+        reuse = False
+        state = cache.get(self._state_key(session_key)) if self.enabled and can_reuse else None
+        if state is not None and state['thumbnail'].shape == thumbnail.shape:
+            score = float(cv2.absdiff(thumbnail, state['thumbnail']).mean()) / 255.0
+            reuse = score < self.threshold and state['reuse_count'] < self.max_reuse
+
+        if reuse:
+            state['reuse_count'] += 1
+            cache.set(self._state_key(session_key), state, LAST_DETECTIONS_TIMEOUT)
+
+        metrics.increment('detection.motion_gate.checked')
+        if reuse:
+            metrics.increment('detection.motion_gate.reused')
+        metrics.observe('detection.motion_gate.seconds', time.perf_counter() - start_time)
+
+        return {'reuse': reuse, 'score': score, 'thumbnail': thumbnail}
+
+    def unchanged(self, session_key: str, gray: np.ndarray) -> bool:
+        """
+        Whether a frame matches the session's reference, read-only
+
+        For requests outside the camera stream (e.g. describe-scene): the
+        reuse budget and the reference stay as the stream left them.
+
+        Args:
+            session_key: Camera session identifier
+            gray: Grayscale frame, derived like the stream's (quality-gate thumbnail)
+        """
+        if not self.enabled:
+            return False
+        state = cache.get(self._state_key(session_key))
+        thumbnail = downscale_gray(gray, self.thumbnail_size)
+        if state is None or state['thumbnail'].shape != thumbnail.shape:
+            return False
+        score = float(cv2.absdiff(thumbnail, state['thumbnail']).mean()) / 255.0
+        return score < self.threshold and state['reuse_count'] < self.max_reuse
+
+    def update(self, session_key: str, thumbnail: np.ndarray):
+        """Make thumbnail the session's reference after a real inference"""
+        if self.enabled:
+            cache.set(self._state_key(session_key), {'thumbnail': thumbnail, 'reuse_count': 0},
+                      LAST_DETECTIONS_TIMEOUT)
+
+
+def frame_session_key(request) -> str:
+    """
+    Identify the camera session a frame belongs to
+
+    The client's optional session_id only tells apart sessions of the same
+    caller (the user, or the client address for anonymous requests), so one
+    caller can never read or overwrite another's session state.
+    """
+    if request.user.is_authenticated:
+        owner = f'user:{request.user.id}'
+    else:
+        owner = f"ip:{request.META.get('REMOTE_ADDR', 'unknown')}"
+    session_id = str(request.data.get('session_id') or '')[:100]
+    return f'{owner}:session:{session_id}' if session_id else owner
+
+
+def get_last_detections(session_key: str) -> Optional[List[Dict]]:
+    """Last good detections answered for a session, if any"""
+    return cache.get(f'detections:last:{session_key}')
+
+
+def store_last_detections(session_key: str, detections: List[Dict]):
+    """Remember the detections of a frame that passed the gates"""
+    cache.set(f'detections:last:{session_key}', detections, LAST_DETECTIONS_TIMEOUT)
+
+
+def get_image_detections(image_hash: str) -> Optional[Dict]:
+    """Detection result previously computed for identical image content, if any"""
+    return cache.get(f'detections:image:{image_hash}')
+
+
+def store_image_detections(image_hash: str, detection_result: Dict):
+    """Remember a detection result by image content hash"""
+    cache.set(f'detections:image:{image_hash}', detection_result, IMAGE_DETECTIONS_TIMEOUT)
+
+
+def forget_image_detections(image_hashes: Iterable[str]):
+    """Drop remembered detection results, e.g. after they were recomputed"""
+    cache.delete_many([f'detections:image:{image_hash}' for image_hash in image_hashes])
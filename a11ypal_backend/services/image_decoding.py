@@ -0,0 +1,75 @@
+"""
+Decoding helpers for uploaded images.
+
+Uploads are read into memory once; the raw bytes can then be decoded at
+full resolution or, much more cheaply, as a reduced grayscale thumbnail
+(JPEG decoders scale down in the DCT domain) for pre-inference gating.
+"""
+import io
+from typing import Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Match PIL's behaviour of ignoring EXIF orientation so box coordinates line up
+# with what the client sent.
+_COLOR_FLAGS = cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+_REDUCED_GRAY_FLAGS = cv2.IMREAD_REDUCED_GRAYSCALE_8 | cv2.IMREAD_IGNORE_ORIENTATION
+
+
+def decode_image(data: bytes) -> np.ndarray:
+    """
+    Decode image bytes at full resolution
+
+    Args:
+        data: Encoded image bytes
+
+    Returns:
+        Image as numpy array (BGR format)
+    """
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), _COLOR_FLAGS)
+    if image is None:
+        raise ValueError("Could not decode image")
+    return image
+
+
+def image_shape(data: bytes) -> Tuple[int, int, int]:
+    """
+    Shape decode_image would return, from the header alone
+
+    Raises:
+        ValueError: If the bytes are not an image
+    """
+    try:
+        width, height = Image.open(io.BytesIO(data)).size
+    except Exception:
+        raise ValueError("Could not decode image")
+    return height, width, 3
+
+
+def decode_thumbnail(data: bytes, max_side: int = 160) -> np.ndarray:
+    """
+    Decode image bytes into a small grayscale thumbnail
+
+    Args:
+        data: Encoded image bytes
+        max_side: Longest side of the returned thumbnail in pixels
+
+    Returns:
+        Grayscale uint8 thumbnail
+    """
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), _REDUCED_GRAY_FLAGS)
+    if gray is None:
+        raise ValueError("Could not decode image")
+    return downscale_gray(gray, max_side)
+
+
+def downscale_gray(gray: np.ndarray, max_side: int) -> np.ndarray:
+    """Area-downscale a grayscale image so its longest side is at most max_side"""
+    height, width = gray.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1.0:
+        return gray
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
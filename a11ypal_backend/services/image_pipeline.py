@@ -0,0 +1,252 @@
+"""
+Multi-analysis pipeline over one decoded image.
+
+An upload is decoded once into a DecodedImage, which lazily derives and
+caches the shared preprocessing (grayscale, a downscale pyramid, content
+hash). Analyses are registered as stages with dependencies and run as a
+small DAG: stages whose dependencies are done run concurrently on a shared
+thread pool, and later stages can read earlier results.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .attribute_classifiers import get_attribute_cascade
+from .code_scanner import get_code_scanner
+from .color_analysis_service import get_color_analysis_service, image_content_hash
+from .image_decoding import decode_image, downscale_gray, image_shape
+from .metrics import metrics
+from .object_detection_service import get_object_detection_service
+from .frame_gates import get_image_detections, store_image_detections
+from .ocr_service import get_ocr_service
+from .scene_description import describe_detections
+
+logger = logging.getLogger(__name__)
+
+# Shared pool for analyses that run concurrently on one decoded image
+analysis_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='visual-analysis')
+
+
+class DecodedImage:
+    """
+    One upload plus lazily computed, thread-safe decoded views
+
+    The full decode also happens on first use, so requests answered from
+    content-hash caches never pay for it.
+
+    Args:
+        data: Encoded image bytes
+        image: Optional already decoded image (BGR format)
+    """
+
+    def __init__(self, data: bytes, image: Optional[np.ndarray] = None):
+        self.data = data
+        self._image = image
+        self._lock = threading.Lock()
+        self._hash = None
+        self._shape = None
+        self._gray = None
+        self._levels: Dict[int, np.ndarray] = {}
+
+    @property
+    def image(self) -> np.ndarray:
+        """Full-resolution BGR image; raises ValueError if the bytes do not decode"""
+        with self._lock:
+            if self._image is None:
+                self._image = decode_image(self.data)
+            return self._image
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """(height, width, 3); read from the header until the image is decoded"""
+        with self._lock:
+            if self._image is not None:
+                return self._image.shape
+            if self._shape is None:
+                self._shape = image_shape(self.data)
+            return self._shape
+
+    @property
+    def content_hash(self) -> str:
+        """Hash of the encoded bytes (same scheme as the color cache)"""
+        if self._hash is None:
+            self._hash = image_content_hash(self.data)
+        return self._hash
+
+    @property
+    def gray(self) -> np.ndarray:
+        """Full-resolution grayscale, converted once"""
+        image = self.image
+        with self._lock:
+            if self._gray is None:
+                self._gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            return self._gray
+
+    def gray_at(self, max_side: int) -> np.ndarray:
+        """
+        Grayscale downscaled so its longest side is at most max_side
+
+        Levels are cached and each new one is derived from the smallest
+        cached level that is still large enough, so a pyramid of sizes
+        costs little more than the first one.
+        """
+        gray = self.gray
+        with self._lock:
+            level = self._levels.get(max_side)
+            if level is None:
+                larger = [side for side in self._levels if side > max_side]
+                source = self._levels[min(larger)] if larger else gray
+                level = self._levels[max_side] = downscale_gray(source, max_side)
+            return level
+
+
+class Stage:
+    """
+    One analysis in the pipeline
+
+    Args:
+        name: Name clients request the analysis by
+        func: Called as func(decoded, results, options); results holds the
+            outputs of the stage's dependencies
+        deps: Names of stages that must finish first
+    """
+
+    def __init__(self, name: str, func: Callable[[DecodedImage, Dict, Dict], Dict], deps: Iterable[str] = ()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+
+STAGES: Dict[str, Stage] = {}
+
+
+def register_stage(name: str, deps: Iterable[str] = ()):
+    """Decorator registering a stage function under name"""
+    def decorator(func):
+        STAGES[name] = Stage(name, func, deps)
+        return func
+    return decorator
+
+
+def resolve_stages(names: Iterable[str]) -> List[str]:
+    """Requested stage names plus everything they depend on, dependencies first"""
+    ordered = []
+
+    def visit(name):
+        if name in ordered:
+            return
+        if name not in STAGES:
+            raise ValueError(f"Unknown analysis: {name}")
+        for dep in STAGES[name].deps:
+            visit(dep)
+        ordered.append(name)
+
+    for name in names:
+        visit(name)
+    return ordered
+
+
+def run_analyses(decoded: DecodedImage, names: Iterable[str], options: Optional[Dict] = None,
+                 executor: Optional[ThreadPoolExecutor] = None) -> Dict:
+    """
+    Run the requested analyses (and their dependencies) over one image
+
+    Args:
+        decoded: The decoded upload
+        names: Stage names to run
+        options: Per-request options passed to every stage (e.g. 'language')
+        executor: Pool to run stages on (defaults to analysis_executor)
+
+    Returns:
+        Dict with per-stage 'results', 'errors' and 'timings' (seconds)
+    """
+    options = options or {}
+    executor = executor or analysis_executor
+    pending = resolve_stages(names)
+
+    results: Dict[str, Dict] = {}
+    errors: Dict[str, str] = {}
+    timings: Dict[str, float] = {}
+    running = {}
+
+    def timed(stage, inputs):
+        start_time = time.perf_counter()
+        try:
+            return stage.func(decoded, inputs, options)
+        finally:
+            timings[stage.name] = time.perf_counter() - start_time
+
+    while pending or running:
+        for name in list(pending):
+            stage = STAGES[name]
+            failed = [dep for dep in stage.deps if dep in errors]
+            if failed:
+                errors[name] = f"Skipped, {failed[0]} failed"
+                pending.remove(name)
+            elif all(dep in results for dep in stage.deps):
+                inputs = {dep: results[dep] for dep in stage.deps}
+                running[executor.submit(timed, stage, inputs)] = name
+                pending.remove(name)
+
+        if not running:
+            continue
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = running.pop(future)
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error(f"Analysis stage {name} failed: {str(e)}")
+                errors[name] = str(e)
+
+    for name, seconds in timings.items():
+        metrics.observe(f'visual.pipeline.{name}.seconds', seconds)
+
+    return {'results': results, 'errors': errors, 'timings': timings}
+
+
+@register_stage('objects')
+def _objects_stage(decoded: DecodedImage, results: Dict, options: Dict) -> Dict:
+    # Identical content was already run through the detector
+    detection_result = get_image_detections(decoded.content_hash)
+    if detection_result is not None:
+        return {**detection_result, 'cached': True}
+
+    detection_result = get_object_detection_service().detect_objects(decoded.image)
+    if detection_result.get('error'):
+        # The detector reports failures in its result; never cache those
+        raise RuntimeError(detection_result['error'])
+    get_attribute_cascade().annotate(decoded.image, detection_result['detections'])
+    store_image_detections(decoded.content_hash, detection_result)
+    return {**detection_result, 'cached': False}
+
+
+@register_stage('text')
+def _text_stage(decoded: DecodedImage, results: Dict, options: Dict) -> Dict:
+    service = get_ocr_service()
+    return service.extract_text(
+        decoded.gray,
+        options.get('language', 'en'),
+        small_gray=decoded.gray_at(service.detect_size),
+    )
+
+
+@register_stage('colors')
+def _colors_stage(decoded: DecodedImage, results: Dict, options: Dict) -> Dict:
+    return get_color_analysis_service().analyze_cached(decoded.data, lambda: decoded.image)
+
+
+@register_stage('codes')
+def _codes_stage(decoded: DecodedImage, results: Dict, options: Dict) -> Dict:
+    scanner = get_code_scanner()
+    return scanner.scan(decoded.image, small_gray=decoded.gray_at(scanner.detect_size))
+
+
+@register_stage('scene', deps=('objects', 'colors'))
+def _scene_stage(decoded: DecodedImage, results: Dict, options: Dict) -> Dict:
+    return describe_detections(results['objects']['detections'], results['colors'])
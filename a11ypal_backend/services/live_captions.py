@@ -0,0 +1,207 @@
+"""
+Live captioning over a stream of audio frames.
+
+Incoming 16 kHz mono PCM (or Opus packets decoded to it) is cut into 30 ms
+frames and run through webrtcvad. A speech segment opens when most frames in
+a short padding window are voiced and closes when most of them are silent;
+while it is open a partial caption is requested every PARTIAL_INTERVAL
+seconds, and a final one when it closes or reaches MAX_SEGMENT_SECONDS.
+
+The segmenter is plain synchronous code; the WebSocket consumer in
+hearing_assist.consumers owns the connection and runs the recognizer off the
+event loop. Every per-connection buffer has a fixed upper bound.
+"""
+import collections
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import webrtcvad
+from django.conf import settings
+
+from .metrics import metrics
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * 2  # 16-bit mono
+
+metrics.register_ratio('hearing.live.dropped_partial_rate', 'hearing.live.partials_dropped', 'hearing.live.partials')
+
+
+class OpusDecoder:
+    """Opus packets -> 16 kHz mono PCM (needs opuslib and libopus)"""
+
+    # Longest Opus frame (120 ms) at 16 kHz
+    MAX_FRAME_SAMPLES = 1920
+
+    def __init__(self):
+        try:
+            import opuslib
+        except ImportError:
+            raise Exception("Opus input not available - opuslib not installed")
+        self._decoder = opuslib.Decoder(SAMPLE_RATE, 1)
+
+    def decode(self, packet: bytes) -> bytes:
+        return self._decoder.decode(packet, self.MAX_FRAME_SAMPLES)
+
+
+class Segment:
+    """Audio of one (possibly still open) speech segment"""
+
+    def __init__(self, pcm: bytes, final: bool, started_at: float, last_audio_at: float, index: int):
+        self.pcm = pcm
+        self.final = final
+        self.started_at = started_at  # Stream time (seconds) of the first frame
+        self.last_audio_at = last_audio_at  # Wall clock when the newest frame arrived
+        self.index = index
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / 2 / SAMPLE_RATE
+
+    def samples(self) -> np.ndarray:
+        """float32 samples in [-1, 1]"""
+        return np.frombuffer(self.pcm, dtype='<i2').astype(np.float32) / 32768.0
+
+
+class CaptionSegmenter:
+    """
+    VAD segmentation of a live PCM stream
+
+    Args:
+        vad_mode: webrtcvad aggressiveness, 0 (least) to 3 (most)
+        padding_ms: Window used to decide segment start and end
+        trigger_ratio: Fraction of voiced (or unvoiced) frames in the window
+            that opens (or closes) a segment
+        partial_interval: Seconds of new speech between partial captions
+        max_segment_seconds: Open segments are finalized at this length
+        max_pending_bytes: Cap on received audio not yet framed
+    """
+
+    def __init__(self, vad_mode: int = 2, padding_ms: int = 300, trigger_ratio: float = 0.8,
+                 partial_interval: float = 1.0, max_segment_seconds: float = 10.0,
+                 max_pending_bytes: int = SAMPLE_RATE * 2 * 2):
+        self.vad = webrtcvad.Vad(vad_mode)
+        self.trigger_ratio = trigger_ratio
+        self.partial_interval = partial_interval
+        self.max_segment_bytes = int(max_segment_seconds * SAMPLE_RATE) * 2
+        self.max_pending_bytes = max_pending_bytes
+
+        self._window = collections.deque(maxlen=max(1, padding_ms // FRAME_MS))
+        self._pending = bytearray()
+        self._voiced = bytearray()
+        self._triggered = False
+        self._frames_seen = 0
+        self._segment_start = 0.0
+        self._last_partial_bytes = 0
+        self._segments = 0
+        self.dropped_bytes = 0
+
+    @classmethod
+    def from_settings(cls) -> 'CaptionSegmenter':
+        config = getattr(settings, 'LIVE_CAPTIONS', {})
+        return cls(
+            vad_mode=config.get('VAD_MODE', 2),
+            padding_ms=config.get('PADDING_MS', 300),
+            trigger_ratio=config.get('TRIGGER_RATIO', 0.8),
+            partial_interval=config.get('PARTIAL_INTERVAL', 1.0),
+            max_segment_seconds=config.get('MAX_SEGMENT_SECONDS', 10.0),
+            max_pending_bytes=int(config.get('MAX_PENDING_SECONDS', 2.0) * SAMPLE_RATE) * 2,
+        )
+
+    @property
+    def stream_time(self) -> float:
+        """Seconds of audio framed so far"""
+        return self._frames_seen * FRAME_MS / 1000.0
+
+    def feed(self, pcm: bytes, received_at: Optional[float] = None) -> List[Segment]:
+        """
+        Add 16-bit mono PCM and return segments ready for recognition
+
+        Returns:
+            Partial segments (final=False) and closed ones (final=True), in order
+        """
+        received_at = received_at or time.time()
+        self._pending.extend(pcm)
+        overflow = len(self._pending) - self.max_pending_bytes
+        if overflow > 0:
+            # Keep whole frames, drop the oldest audio
+            overflow += -overflow % FRAME_BYTES
+            del self._pending[:overflow]
+            self.dropped_bytes += overflow
+
+        segments = []
+        while len(self._pending) >= FRAME_BYTES:
+            frame = bytes(self._pending[:FRAME_BYTES])
+            del self._pending[:FRAME_BYTES]
+            segment = self._process_frame(frame, received_at)
+            if segment is not None:
+                segments.append(segment)
+        return segments
+
+    def flush(self, received_at: Optional[float] = None) -> List[Segment]:
+        """Close the open segment at end of stream"""
+        if not self._triggered or not self._voiced:
+            return []
+        return [self._close(received_at or time.time())]
+
+    def _process_frame(self, frame: bytes, received_at: float) -> Optional[Segment]:
+        is_speech = self.vad.is_speech(frame, SAMPLE_RATE)
+        self._frames_seen += 1
+
+        if not self._triggered:
+            self._window.append((frame, is_speech))
+            voiced = sum(1 for _, speech in self._window if speech)
+            if voiced >= self.trigger_ratio * self._window.maxlen:
+                # Keep the padding window so the first syllable is not clipped
+                self._triggered = True
+                self._segment_start = self.stream_time - len(self._window) * FRAME_MS / 1000.0
+                self._voiced.extend(b''.join(f for f, _ in self._window))
+                self._window.clear()
+                self._last_partial_bytes = 0
+            return None
+
+        self._voiced.extend(frame)
+        self._window.append((frame, is_speech))
+        unvoiced = sum(1 for _, speech in self._window if not speech)
+        if unvoiced >= self.trigger_ratio * self._window.maxlen or len(self._voiced) >= self.max_segment_bytes:
+            return self._close(received_at)
+
+        if len(self._voiced) - self._last_partial_bytes >= self.partial_interval * SAMPLE_RATE * 2:
+            self._last_partial_bytes = len(self._voiced)
+            return Segment(bytes(self._voiced), False, self._segment_start, received_at, self._segments)
+        return None
+
+    def _close(self, received_at: float) -> Segment:
+        segment = Segment(bytes(self._voiced), True, self._segment_start, received_at, self._segments)
+        self._segments += 1
+        self._triggered = False
+        self._voiced = bytearray()
+        self._window.clear()
+        return segment
+
+
+def record_caption_metrics(segment: Segment, recognition_time: float, target_rtf: float):
+    """Caption delay (newest audio in -> caption out) and real-time factor"""
+    delay = time.time() - segment.last_audio_at
+    kind = 'final' if segment.final else 'partial'
+    metrics.observe(f'hearing.live.{kind}_delay_seconds', delay)
+    if segment.duration > 0:
+        rtf = recognition_time / segment.duration
+        metrics.observe('hearing.live.rtf', rtf)
+        if rtf > target_rtf:
+            metrics.increment('hearing.live.rtf_over_target')
+    return delay
+
+
+def caption_message(segment: Segment, result: Dict, delay: float) -> Dict:
+    """Message pushed to the client for one recognized segment"""
+    return {
+        'type': 'final' if segment.final else 'partial',
+        'segment': segment.index,
+        'text': result.get('text', ''),
+        'confidence': result.get('confidence', 0.0),
+        'start': round(segment.started_at, 3),
+        'end': round(segment.started_at + segment.duration, 3),
+        'delay': round(delay, 3),
+    }
@@ -0,0 +1,91 @@
+"""
+Lightweight in-process metrics for the AI services.
+
+Counters, derived ratios and timing summaries are kept per worker process
+and exposed as JSON through the health endpoints.
+"""
+import threading
+from collections import deque
+from typing import Dict, Tuple
+
+import numpy as np
+
+# Number of recent observations kept per timing for percentile estimates
+TIMING_WINDOW = 1024
+
+
+class _Timing:
+    """Running summary of one timing metric"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=TIMING_WINDOW)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def summary(self) -> Dict:
+        recent = np.fromiter(self.recent, dtype=np.float64, count=len(self.recent))
+        p50, p95 = np.percentile(recent, [50, 95]) if len(recent) else (0.0, 0.0)
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': float(p50),
+            'p95': float(p95),
+            'max': self.max,
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters, ratios and timings"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, _Timing] = {}
+        self._ratios: Dict[str, Tuple[str, str]] = {}
+
+    def increment(self, name: str, value: float = 1):
+        """Add value to a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """Record one observation (usually seconds) for a timing"""
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = _Timing()
+            timing.observe(value)
+
+    def register_ratio(self, name: str, numerator: str, denominator: str):
+        """Report counter numerator / counter denominator as name in snapshots"""
+        with self._lock:
+            self._ratios[name] = (numerator, denominator)
+
+    def snapshot(self) -> Dict:
+        """Current values of every metric"""
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {name: timing.summary() for name, timing in self._timings.items()}
+            ratios = {}
+            for name, (numerator, denominator) in self._ratios.items():
+                total = counters.get(denominator, 0)
+                ratios[name] = counters.get(numerator, 0) / total if total else 0.0
+
+        return {'counters': counters, 'ratios': ratios, 'timings': timings}
+
+    def reset(self):
+        """Clear all recorded values (registered ratios are kept)"""
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+
+# Global registry
+metrics = MetricsRegistry()
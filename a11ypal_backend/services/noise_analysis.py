@@ -0,0 +1,262 @@
+"""
+Environmental noise level and noise type.
+
+Audio is consumed block by block (NoiseAnalyzer.feed), so a recording is never
+held in memory whole. Every FRAME_SECONDS frame ('fast' time weighting) gets an
+RMS level in dBFS; the equivalent continuous level (LEQ) is the energy mean
+over the whole recording. A calibration offset turns dBFS into an estimate of
+dB SPL: the default assumes a typical phone MEMS microphone, which reads
+94 dB SPL at -26 dBFS.
+
+The noise type comes from a few spectral and temporal features (band energy
+shares, tonality, level spread, spectral flux, impulsiveness), computed with
+one FFT over each batch of frames and matched to hand-set class prototypes.
+"""
+import time
+from functools import lru_cache
+from typing import Dict, List
+
+import numpy as np
+from django.conf import settings
+from scipy.ndimage import uniform_filter1d
+
+from .audio_decoding import Framer
+
+EPSILON = 1e-12
+DEFAULT_CALIBRATION_OFFSET = 120.0  # dB SPL at 0 dBFS
+
+# Band edges in Hz for the energy shares: low (engines, rumble), mid, high
+LOW_BAND_HZ = 300
+HIGH_BAND_HZ = 2000
+# Spectral features only look at 50 Hz - 8 kHz, in FLUX_BANDS log-spaced bands
+# for the frame-to-frame spectral change
+SPECTRUM_RANGE_HZ = (50, 8000)
+FLUX_BANDS = 16
+# Bins above TONAL_PEAK_RATIO times the average of the TONALITY_SMOOTHING_BINS
+# around them count as tonal
+TONALITY_SMOOTHING_BINS = 31
+TONAL_PEAK_RATIO = 5.0
+
+FEATURE_NAMES = ('low_share', 'high_share', 'tonality', 'level_spread', 'spectral_flux', 'impulsiveness')
+
+# Typical feature values per noise type. level_spread is the standard
+# deviation of frame levels and spectral_flux the mean band level change
+# between frames, both in units of 10 dB and capped at MAX_SPREAD
+NOISE_PROTOTYPES = {
+    'traffic': (0.80, 0.03, 0.05, 0.20, 0.20, 0.00),
+    'construction': (0.10, 0.50, 0.05, 1.20, 0.80, 0.40),
+    'crowd': (0.25, 0.05, 0.12, 0.15, 0.20, 0.00),
+    'music': (0.35, 0.05, 0.45, 0.30, 0.20, 0.00),
+    'speech': (0.25, 0.05, 0.35, 1.00, 1.00, 0.02),
+}
+MAX_SPREAD = 1.5
+FEATURE_WEIGHTS = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 2.0])
+MAX_PROTOTYPE_DISTANCE = 0.6  # Farther from every prototype is 'other'
+
+
+@lru_cache(maxsize=16)
+def spectral_masks(sample_rate: int, frame_length: int) -> Dict[str, np.ndarray]:
+    """
+    FFT bin masks for a frame length at a sample rate
+
+    Returns:
+        Dict with 'range' (bins analysed), 'low' and 'high' (within range) and
+        'flux' (band matrix of shape (FLUX_BANDS, bins in range))
+    """
+    freqs = np.fft.rfftfreq(frame_length, 1.0 / sample_rate)
+    low, high = SPECTRUM_RANGE_HZ[0], min(SPECTRUM_RANGE_HZ[1], sample_rate / 2)
+    in_range = (freqs >= low) & (freqs < high)
+    freqs = freqs[in_range]
+    edges = np.geomspace(low, high, FLUX_BANDS + 1)
+    flux = np.array([(freqs >= a) & (freqs < b) for a, b in zip(edges[:-1], edges[1:])], dtype=np.float64)
+    masks = {
+        'range': in_range,
+        'low': freqs < LOW_BAND_HZ,
+        'high': freqs >= HIGH_BAND_HZ,
+        'flux': flux[flux.any(axis=1)],
+    }
+    for mask in masks.values():
+        mask.setflags(write=False)
+    return masks
+
+
+def classify_noise(features: Dict[str, float]) -> str:
+    """Nearest noise type prototype for a feature dict, or 'other'"""
+    vector = np.array([features[name] for name in FEATURE_NAMES])
+    prototypes = np.array(list(NOISE_PROTOTYPES.values()))
+    distances = np.sqrt((((prototypes - vector) ** 2) * FEATURE_WEIGHTS).sum(axis=1))
+    best = int(np.argmin(distances))
+    return list(NOISE_PROTOTYPES)[best] if distances[best] <= MAX_PROTOTYPE_DISTANCE else 'other'
+
+
+def noise_recommendations(level: float, noise_type: str) -> str:
+    """Advice for a calibrated noise level (dB SPL estimate) and type"""
+    if level >= 85:
+        advice = ("Noise is above 85 dB, where long exposure can damage hearing. "
+                  "Use hearing protection or limit the time spent here.")
+    elif level >= 70:
+        advice = ("This is a loud environment. Noise-canceling headphones or moving to a quieter "
+                  "location will improve audio clarity.")
+    elif level >= 55:
+        advice = "Background noise is moderate. A hearing aid noise-reduction program may help."
+    else:
+        return "Noise levels are low."
+    if noise_type in ('speech', 'crowd'):
+        advice += " A directional microphone setting helps pick out one talker."
+    return advice
+
+
+def downsample_levels(levels: np.ndarray, frame_seconds: float, points: int) -> List[Dict[str, float]]:
+    """Energy-average frame levels into at most `points` timeline entries"""
+    if not len(levels):
+        return []
+    per_point = int(np.ceil(len(levels) / points))
+    padded = np.full(per_point * int(np.ceil(len(levels) / per_point)), np.nan)
+    padded[:len(levels)] = 10 ** (levels / 10)
+    energy = np.nanmean(padded.reshape(-1, per_point), axis=1)
+    return [
+        {'time': round(i * per_point * frame_seconds, 2), 'level': round(float(10 * np.log10(e + EPSILON)), 1)}
+        for i, e in enumerate(energy)
+    ]
+
+
+class NoiseAnalyzer:
+    """
+    Streaming noise level and type analysis
+
+    Args:
+        sample_rate: Sample rate of the blocks fed in
+        calibration_offset: dB SPL that corresponds to 0 dBFS
+        frame_seconds: Level frame length
+        timeline_points: Maximum entries in the stored level timeline
+    """
+
+    def __init__(self, sample_rate: int, calibration_offset: float = DEFAULT_CALIBRATION_OFFSET,
+                 frame_seconds: float = 0.125, timeline_points: int = 120):
+        self.sample_rate = sample_rate
+        self.calibration_offset = calibration_offset
+        self.frame_seconds = frame_seconds
+        self.timeline_points = timeline_points
+        self.framer = Framer(max(1, int(frame_seconds * sample_rate)))
+        self.masks = spectral_masks(sample_rate, self.framer.frame_length)
+        self.window = np.hanning(self.framer.frame_length).astype(np.float32)
+
+        self._start_time = time.time()
+        self._sum_squares = 0.0
+        self._samples = 0
+        self._levels = []
+        self._low_energy = self._high_energy = self._total_energy = 0.0
+        self._tonality_sum = self._flux_sum = 0.0
+        self._spectral_frames = self._flux_frames = 0
+        self._last_bands = None
+
+    @classmethod
+    def from_settings(cls, sample_rate: int, calibration_offset: float = None) -> 'NoiseAnalyzer':
+        config = getattr(settings, 'AUDIO_ANALYSIS', {})
+        if calibration_offset is None:
+            calibration_offset = config.get('CALIBRATION_OFFSET_DB', DEFAULT_CALIBRATION_OFFSET)
+        return cls(
+            sample_rate,
+            calibration_offset=calibration_offset,
+            frame_seconds=config.get('FRAME_SECONDS', 0.125),
+            timeline_points=config.get('TIMELINE_POINTS', 120),
+        )
+
+    def feed(self, block: np.ndarray):
+        """Add a block of mono float samples"""
+        self._sum_squares += float(np.dot(block, block))
+        self._samples += len(block)
+        frames = self.framer.push(block)
+        if not len(frames):
+            return
+
+        mean_squares = np.einsum('ij,ij->i', frames, frames) / frames.shape[1]
+        self._levels.append(10 * np.log10(mean_squares + EPSILON))
+
+        # Spectral features of the frames that are not silent
+        loud = mean_squares > 1e-8
+        if not loud.any():
+            return
+        spectrum = np.fft.rfft(frames[loud] * self.window, axis=1)[:, self.masks['range']]
+        power = spectrum.real ** 2 + spectrum.imag ** 2 + EPSILON
+        self._low_energy += float(power[:, self.masks['low']].sum())
+        self._high_energy += float(power[:, self.masks['high']].sum())
+        self._total_energy += float(power.sum())
+
+        # Tonality: share of the energy in bins standing well above the local
+        # spectral average (a few percent for noise, most of it for harmonics)
+        peaks = power > TONAL_PEAK_RATIO * uniform_filter1d(power, TONALITY_SMOOTHING_BINS, axis=1)
+        self._tonality_sum += float(((power * peaks).sum(axis=1) / power.sum(axis=1)).sum())
+        self._spectral_frames += len(power)
+
+        # Spectral flux: change of spectral shape (band levels relative to the
+        # frame's mean) between consecutive loud frames
+        bands = 10 * np.log10(power @ self.masks['flux'].T)
+        bands -= bands.mean(axis=1, keepdims=True)
+        if self._last_bands is not None:
+            bands = np.vstack((self._last_bands, bands))
+        changes = np.abs(np.diff(bands, axis=0)).mean(axis=1)
+        self._flux_sum += float(changes.sum())
+        self._flux_frames += len(changes)
+        self._last_bands = bands[-1]
+
+    def features(self, levels: np.ndarray) -> Dict[str, float]:
+        """Classifier features from everything fed so far, given the frame levels"""
+        if len(levels) > 1:
+            # Ignore digital silence and fades far below the loudest frame
+            loud_levels = levels[levels > levels.max() - 60]
+            spread = min(float(loud_levels.std()) / 10, MAX_SPREAD)
+            impulsiveness = float((loud_levels > np.median(loud_levels) + 10).mean())
+        else:
+            spread = impulsiveness = 0.0
+        total = max(self._total_energy, EPSILON)
+        return {
+            'low_share': self._low_energy / total,
+            'high_share': self._high_energy / total,
+            'tonality': self._tonality_sum / max(self._spectral_frames, 1),
+            'level_spread': spread,
+            'spectral_flux': min(self._flux_sum / max(self._flux_frames, 1) / 10, MAX_SPREAD),
+            'impulsiveness': impulsiveness,
+        }
+
+    def result(self) -> Dict:
+        """
+        Summary after the last block
+
+        Returns:
+            Dict with 'noise_level' (calibrated LEQ), 'noise_type',
+            'recommendations', 'statistics' and 'level_timeline'
+        """
+        levels = np.concatenate(self._levels) if self._levels else np.zeros(0)
+        leq_dbfs = 10 * np.log10(self._sum_squares / max(self._samples, 1) + EPSILON)
+        offset = self.calibration_offset
+        features = self.features(levels)
+        noise_type = classify_noise(features) if self._spectral_frames else 'other'
+        noise_level = round(float(leq_dbfs + offset), 1)
+
+        statistics = {
+            'leq_dbfs': round(float(leq_dbfs), 2),
+            'calibration_offset': offset,
+            'duration': round(self._samples / float(self.sample_rate), 3),
+            'sample_rate': self.sample_rate,
+            'features': {name: round(value, 4) for name, value in features.items()},
+            'processing_time': time.time() - self._start_time,
+        }
+        if len(levels):
+            # Percentile levels: L10 is exceeded 10% of the time (peaks), L90 is the background
+            l10, l50, l90 = np.percentile(levels, [90, 50, 10])
+            statistics.update({
+                'min_level': round(float(levels.min() + offset), 1),
+                'max_level': round(float(levels.max() + offset), 1),
+                'l10': round(float(l10 + offset), 1),
+                'l50': round(float(l50 + offset), 1),
+                'l90': round(float(l90 + offset), 1),
+            })
+
+        return {
+            'noise_level': noise_level,
+            'noise_type': noise_type,
+            'recommendations': noise_recommendations(noise_level, noise_type),
+            'statistics': statistics,
+            'level_timeline': downsample_levels(levels + offset, self.frame_seconds, self.timeline_points),
+        }
@@ -5,9 +5,11 @@ import numpy as np
 import cv2
 from typing import List, Dict, Tuple
 from django.conf import settings
+from .tensor_pool import TensorPool
 
 # Import YOLOv5
 try:
+    import torch
     from ultralytics import YOLO
     YOLO_AVAILABLE = True
 except ImportError as e:
@@ -23,6 +25,8 @@ class YOLOv5Service:
     def __init__(self):
         """Initialize the YOLOv5 service"""
         self.yolov5_model = None
+        self.input_size = getattr(settings, 'OBJECT_DETECTION_INPUT_SIZE', 640)
+        self.tensor_pool = TensorPool()
         self._initialize_services()
     
     def _initialize_services(self):
@@ -74,6 +78,49 @@ class YOLOv5Service:
             'classes': list(self.yolov5_model.names.values())[:10] + ['...'] if len(self.yolov5_model.names) > 10 else list(self.yolov5_model.names.values())
         }
     
+    def _format_detections(self, boxes: np.ndarray, confidences: np.ndarray,
+                           class_ids: np.ndarray, image_shape: Tuple[int, ...]) -> List[Dict]:
+        """
+        Convert detector output arrays into the API detection format
+        
+        Args:
+            boxes: (N, 4) xyxy boxes in original image coordinates
+            confidences: (N,) confidence scores
+            class_ids: (N,) class indices
+            image_shape: Shape of the original image
+            
+        Returns:
+            List of detection dictionaries
+        """
+        height, width = image_shape[:2]
+        detections = []
+        for i, (box, confidence, class_id) in enumerate(zip(boxes, confidences, class_ids)):
+            x1, y1, x2, y2 = box
+            
+            # Convert to our format
+            detections.append({
+                'id': f'yolov5_{i}',
+                'class_id': int(class_id),
+                'name': self.yolov5_model.names[int(class_id)],
+                'confidence': float(confidence),
+                'bounds': {
+                    'x': float(x1 / width),  # Normalized x position
+                    'y': float(y1 / height),  # Normalized y position
+                    'width': float((x2 - x1) / width),  # Normalized width
+                    'height': float((y2 - y1) / height),  # Normalized height
+                    'x1': int(x1),
+                    'y1': int(y1),
+                    'x2': int(x2),
+                    'y2': int(y2)
+                },
+                'center': {
+                    'x': float((x1 + x2) / 2),
+                    'y': float((y1 + y2) / 2)
+                }
+            })
+        
+        return detections
+    
     def detect_objects(self, image: np.ndarray) -> Dict:
         """
         Detect objects in an image using YOLOv5 ONLY
@@ -92,76 +139,36 @@ class YOLOv5Service:
         
         try:
             print(f"🔍 YOLOv5: Starting inference on image shape: {image.shape}")
-            print(f"🔍 YOLOv5: Image dtype: {image.dtype}")
-            print(f"🔍 YOLOv5: Image min/max: {image.min()}/{image.max()}")
             
-            # Run YOLOv5 inference with lower confidence threshold
-            print(f"🔍 YOLOv5: Calling model inference...")
-            results = self.yolov5_model(image, conf=0.25, iou=0.45, verbose=False)
-            print(f"🔍 YOLOv5: Inference completed, results type: {type(results)}")
-            print(f"🔍 YOLOv5: Results length: {len(results) if results else 'None'}")
-            
-            detections = []
-            if results and len(results) > 0:
-                result = results[0]  # Get first (and only) result
-                print(f"🔍 YOLOv5: Processing result, boxes: {result.boxes is not None}")
+            with self.tensor_pool.acquire((self.input_size, self.input_size)) as buffers:
+                # Letterbox into the pooled tensor; torch.from_numpy shares its memory
+                tensor = buffers.letterbox_into(image)
+                results = self.yolov5_model(torch.from_numpy(tensor), conf=0.25, iou=0.45, verbose=False)
                 
-                if result.boxes is not None and len(result.boxes) > 0:
-                    print(f"🔍 YOLOv5: Found {len(result.boxes)} detections")
-                    boxes = result.boxes.xyxy.cpu().numpy()  # Get bounding boxes
-                    confidences = result.boxes.conf.cpu().numpy()  # Get confidences
-                    class_ids = result.boxes.cls.cpu().numpy().astype(int)  # Get class IDs
-                    print(f"🔍 YOLOv5: Boxes shape: {boxes.shape}, Confidences shape: {confidences.shape}, Class IDs shape: {class_ids.shape}")
+                detections = []
+                if results and len(results) > 0 and results[0].boxes is not None and len(results[0].boxes) > 0:
+                    boxes = results[0].boxes
+                    count = min(len(boxes), len(buffers.boxes))
+                    print(f"🔍 YOLOv5: Found {count} detections")
+                    
+                    # Copy outputs into the pooled arrays and map back to image coordinates
+                    xyxy = buffers.unletterbox_boxes(boxes.xyxy[:count].cpu().numpy(), image.shape)
+                    confidences = buffers.confidences[:count]
+                    class_ids = buffers.class_ids[:count]
+                    np.copyto(confidences, boxes.conf[:count].cpu().numpy())
+                    np.copyto(class_ids, boxes.cls[:count].cpu().numpy(), casting='unsafe')
+                    
+                    detections = self._format_detections(xyxy, confidences, class_ids, image.shape)
                 else:
                     print(f"🔍 YOLOv5: No detections found")
-            else:
-                print(f"🔍 YOLOv5: No results returned")
             
-            # Process each detection
-            if results and len(results) > 0 and result.boxes is not None and len(result.boxes) > 0:
-                for i, (box, confidence, class_id) in enumerate(zip(boxes, confidences, class_ids)):
-                    x1, y1, x2, y2 = box
-                    
-                    # Get class name
-                    class_name = self.yolov5_model.names[class_id]
-                    
-                    # Convert to our format
-                    detection = {
-                        'id': f'yolov5_{i}',
-                        'class_id': int(class_id),
-                        'name': class_name,
-                        'confidence': float(confidence),
-                        'bounds': {
-                            'x': float(x1 / image.shape[1]),  # Normalized x position
-                            'y': float(y1 / image.shape[0]),  # Normalized y position
-                            'width': float((x2 - x1) / image.shape[1]),  # Normalized width
-                            'height': float((y2 - y1) / image.shape[0]),  # Normalized height
-                            'x1': int(x1),
-                            'y1': int(y1),
-                            'x2': int(x2),
-                            'y2': int(y2)
-                        },
-                        'center': {
-                            'x': float((x1 + x2) / 2),
-                            'y': float((y1 + y2) / 2)
-                        }
-                    }
-                    
-                    detections.append(detection)            
             processing_time = time.time() - start_time
             
             return {
                 'detections': detections,
                 'num_detections': len(detections),
                 'processing_time': processing_time,
-                'model_info': {
-                    'model_name': 'YOLOv5',
-                    'model_path': 'yolov5n.pt',
-                    'device': str(self.yolov5_model.device),
-                    'confidence_threshold': 0.25,
-                    'nms_threshold': 0.45,
-                    'classes': list(self.yolov5_model.names.values())[:10] + ['...'] if len(self.yolov5_model.names) > 10 else list(self.yolov5_model.names.values())
-                }
+                'model_info': self.get_model_info()
             }
                     
         except Exception as e:
@@ -175,6 +182,67 @@ class YOLOv5Service:
                 'error': f'YOLOv5 detection failed: {str(e)}'
             }
 
+    
+    def detect_objects_batch(self, images: List[np.ndarray]) -> List[Dict]:
+        """
+        Detect objects in several images with one batched forward pass
+        
+        Args:
+            images: Input images as numpy arrays (BGR format)
+            
+        Returns:
+            One detection result dictionary per image, in order
+        """
+        start_time = time.time()
+        
+        if not self.yolov5_model:
+            raise Exception("YOLOv5 model not loaded!")
+        if not images:
+            return []
+        
+        # Ultralytics letterboxes a list of frames into a single batch tensor
+        results = self.yolov5_model(images, imgsz=self.input_size, conf=0.25, iou=0.45, verbose=False)
+        processing_time = (time.time() - start_time) / len(images)
+        
+        batch_results = []
+        for image, result in zip(images, results):
+            detections = []
+            if result.boxes is not None and len(result.boxes) > 0:
+                boxes = result.boxes
+                detections = self._format_detections(
+                    boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy(), image.shape
+                )
+            batch_results.append({
+                'detections': detections,
+                'num_detections': len(detections),
+                'processing_time': processing_time,
+            })
+        
+        return batch_results
+
+
+def format_detections(detections: List[Dict], image_shape: Tuple[int, ...]) -> List[Dict]:
+    """Convert detector output into the normalized format the mobile app expects"""
+    formatted_detections = []
+    for i, detection in enumerate(detections):
+        formatted_detections.append({
+            'id': f"{detection['class_id']}_{i}",
+            'name': detection['name'],
+            'confidence': detection['confidence'],
+            'bounds': {
+                'x': detection['bounds']['x'],  # Already normalized
+                'y': detection['bounds']['y'],  # Already normalized
+                'width': detection['bounds']['width'],  # Already normalized
+                'height': detection['bounds']['height']  # Already normalized
+            },
+            'center': {
+                'x': detection['center']['x'] / image_shape[1],  # Normalize to 0-1
+                'y': detection['center']['y'] / image_shape[0]   # Normalize to 0-1
+            },
+            'attributes': detection.get('attributes', {})
+        })
+    return formatted_detections
+
 
 # Global service instance
 _object_detection_service = None
@@ -0,0 +1,349 @@
+"""
+Offline OCR with a text-region prefilter.
+
+Candidate text regions are found on a downscaled grayscale frame with a
+morphological gradient + horizontal closing pass. Only those crops, taken
+from the full-resolution image, are sent to the OCR engine, in parallel
+across a process pool, which is replaced if a worker dies (e.g. an engine
+crash). The engine itself is pluggable via settings.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .image_decoding import downscale_gray
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# API language codes -> Tesseract traineddata names
+TESSERACT_LANGUAGES = {
+    'en': 'eng', 'es': 'spa', 'fr': 'fra', 'de': 'deu', 'it': 'ita',
+    'pt': 'por', 'hi': 'hin', 'ar': 'ara', 'zh': 'chi_sim', 'ja': 'jpn',
+}
+
+
+class OCRBackend(ABC):
+    """
+    Base class for OCR engines
+
+    recognize() gets a grayscale image and returns words as dicts with
+    'text', 'confidence' (0-1) and 'x', 'y', 'width', 'height' in pixels of
+    that image.
+    """
+
+    name = 'base'
+
+    @abstractmethod
+    def recognize(self, gray: np.ndarray, language: str = 'en', single_block: bool = False) -> List[Dict]:
+        """Words found in gray"""
+
+
+class TesseractBackend(OCRBackend):
+    """Tesseract through pytesseract (needs the tesseract binary installed)"""
+
+    name = 'tesseract'
+
+    def __init__(self):
+        try:
+            import pytesseract
+        except ImportError:
+            raise Exception("Tesseract OCR not available - pytesseract not installed")
+        self._pytesseract = pytesseract
+
+    def recognize(self, gray: np.ndarray, language: str = 'en', single_block: bool = False) -> List[Dict]:
+        # Region crops hold one block of text; full frames need page segmentation
+        config = '--psm 6' if single_block else '--psm 3'
+        data = self._pytesseract.image_to_data(
+            gray,
+            lang=TESSERACT_LANGUAGES.get(language, language),
+            config=config,
+            output_type=self._pytesseract.Output.DICT,
+        )
+
+        words = []
+        for i, text in enumerate(data['text']):
+            confidence = float(data['conf'][i])
+            if not text.strip() or confidence < 0:
+                continue
+            words.append({
+                'text': text,
+                'confidence': confidence / 100.0,
+                'x': int(data['left'][i]),
+                'y': int(data['top'][i]),
+                'width': int(data['width'][i]),
+                'height': int(data['height'][i]),
+            })
+        return words
+
+
+class EasyOCRBackend(OCRBackend):
+    """EasyOCR on CPU; its line results are split into words by character share"""
+
+    name = 'easyocr'
+
+    def __init__(self):
+        try:
+            import easyocr
+        except ImportError:
+            raise Exception("EasyOCR not available - easyocr not installed")
+        self._easyocr = easyocr
+        self._readers = {}
+
+    def recognize(self, gray: np.ndarray, language: str = 'en', single_block: bool = False) -> List[Dict]:
+        reader = self._readers.get(language)
+        if reader is None:
+            reader = self._readers[language] = self._easyocr.Reader([language], gpu=False, verbose=False)
+
+        words = []
+        for corners, text, confidence in reader.readtext(gray):
+            corners = np.asarray(corners, dtype=np.float32)
+            x1, y1 = corners.min(axis=0)
+            x2, y2 = corners.max(axis=0)
+            total = max(1, len(text))
+            offset = 0
+            for word in text.split():
+                start = text.index(word, offset)
+                offset = start + len(word)
+                words.append({
+                    'text': word,
+                    'confidence': float(confidence),
+                    'x': int(x1 + (x2 - x1) * start / total),
+                    'y': int(y1),
+                    'width': int((x2 - x1) * len(word) / total),
+                    'height': int(y2 - y1),
+                })
+        return words
+
+
+OCR_BACKENDS = {
+    TesseractBackend.name: TesseractBackend,
+    EasyOCRBackend.name: EasyOCRBackend,
+}
+
+
+def load_backend(name: str) -> OCRBackend:
+    """Instantiate a registered backend by name, or any OCRBackend by dotted path"""
+    backend_class = OCR_BACKENDS.get(name) or import_string(name)
+    return backend_class()
+
+
+# Per-process backend used by pool workers
+_worker_backend = None
+
+def _init_worker(backend_name: str):
+    global _worker_backend
+    # Workers are spawned, not forked from the threaded server: set up Django
+    # so settings and dotted-path backends load in this process
+    import django
+
+    django.setup()
+    # One OpenCV thread per worker; parallelism comes from the pool
+    cv2.setNumThreads(1)
+    _worker_backend = load_backend(backend_name)
+
+
+def _recognize_crop(crop: np.ndarray, language: str) -> List[Dict]:
+    return _worker_backend.recognize(crop, language, single_block=True)
+
+
+def merge_into_lines(boxes: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """
+    Merge word boxes into line boxes so the engine sees fewer, larger crops
+
+    Boxes are joined when they overlap vertically by more than half the
+    smaller height and the horizontal gap is under 1.5x that height.
+
+    Returns:
+        Line boxes in reading order (top to bottom, then left to right)
+    """
+    lines = []
+    for x1, y1, x2, y2 in sorted(boxes, key=lambda box: box[0]):
+        for i, (lx1, ly1, lx2, ly2) in enumerate(lines):
+            height = min(y2 - y1, ly2 - ly1)
+            overlap = min(y2, ly2) - max(y1, ly1)
+            gap = x1 - lx2
+            if overlap > height * 0.5 and gap < height * 1.5:
+                lines[i] = (min(x1, lx1), min(y1, ly1), max(x2, lx2), max(y2, ly2))
+                break
+        else:
+            lines.append((x1, y1, x2, y2))
+
+    lines.sort(key=lambda box: (box[1], box[0]))
+    return lines
+
+
+class OCRService:
+    """Region-gated OCR over a pluggable backend"""
+
+    def __init__(self, backend_name: str = 'tesseract', workers: int = 2,
+                 detect_size: int = 1024, region_padding: int = 6):
+        self.backend_name = backend_name
+        self.workers = workers
+        self.detect_size = detect_size
+        self.region_padding = region_padding
+        self._backend = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'OCRService':
+        config = getattr(settings, 'OCR', {})
+        return cls(
+            backend_name=config.get('BACKEND', 'tesseract'),
+            workers=config.get('WORKERS', 2),
+            detect_size=config.get('DETECT_SIZE', 1024),
+            region_padding=config.get('REGION_PADDING', 6),
+        )
+
+    @property
+    def backend(self) -> OCRBackend:
+        if self._backend is None:
+            self._backend = load_backend(self.backend_name)
+        return self._backend
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.backend_name,),
+                )
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        """Drop a broken pool so the next call starts a new one"""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def _recognize_crops(self, crops: List[np.ndarray], language: str) -> List[List[Dict]]:
+        """OCR crops on the process pool, retrying once on a new pool if a worker died"""
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                return list(pool.map(_recognize_crop, crops, [language] * len(crops)))
+            except BrokenProcessPool:
+                logger.warning("OCR worker process died; starting a new pool")
+                metrics.increment('visual.ocr.pool_restarts')
+                self._discard_pool(pool)
+                if attempt:
+                    raise
+
+    def detect_text_regions(self, gray: np.ndarray, small: Optional[np.ndarray] = None) -> List[Tuple[int, int, int, int]]:
+        """
+        Find candidate text regions
+
+        Args:
+            gray: Full-resolution grayscale image
+            small: Optional precomputed downscaled copy of gray
+
+        Returns:
+            List of (x1, y1, x2, y2) boxes in full-resolution pixels
+        """
+        if small is None:
+            small = downscale_gray(gray, self.detect_size)
+        to_full = gray.shape[1] / small.shape[1]
+
+        # Text strokes give strong local gradients; closing horizontally joins
+        # characters into word/line blobs.
+        gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+        _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+        contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        height, width = gray.shape[:2]
+        pad = self.region_padding
+        regions = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if w < 8 or h < 6 or h > small.shape[0] * 0.5:
+                continue
+            fill = cv2.countNonZero(closed[y:y + h, x:x + w]) / float(w * h)
+            if fill < 0.35 or w < h * 0.8:
+                continue
+            regions.append((
+                max(0, int(x * to_full) - pad),
+                max(0, int(y * to_full) - pad),
+                min(width, int((x + w) * to_full) + pad),
+                min(height, int((y + h) * to_full) + pad),
+            ))
+
+        return merge_into_lines(regions)
+
+    def extract_text(self, image: np.ndarray, language: str = 'en', use_regions: bool = True,
+                     small_gray: Optional[np.ndarray] = None) -> Dict:
+        """
+        Run OCR on an image
+
+        Args:
+            image: Input image as numpy array (BGR or grayscale)
+            language: Language code for recognition
+            use_regions: Only OCR detected text regions (False = whole frame)
+            small_gray: Optional precomputed downscaled grayscale copy for region detection
+
+        Returns:
+            Dict with 'text', 'confidence', word-level 'bounding_boxes',
+            'num_regions' and 'processing_time'
+        """
+        start_time = time.time()
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+        if not use_regions:
+            regions = [(0, 0, gray.shape[1], gray.shape[0])]
+            word_groups = [self.backend.recognize(gray, language)]
+        else:
+            regions = self.detect_text_regions(gray, small_gray)
+            crops = [np.ascontiguousarray(gray[y1:y2, x1:x2]) for x1, y1, x2, y2 in regions]
+            if len(crops) > 1 and self.workers > 1:
+                word_groups = self._recognize_crops(crops, language)
+            else:
+                word_groups = [self.backend.recognize(crop, language, single_block=True) for crop in crops]
+
+        bounding_boxes = []
+        lines = []
+        for (x1, y1, _, _), words in zip(regions, word_groups):
+            if not words:
+                continue
+            lines.append(' '.join(word['text'] for word in words))
+            for word in words:
+                bounding_boxes.append({**word, 'x': word['x'] + x1, 'y': word['y'] + y1})
+
+        confidence = float(np.mean([box['confidence'] for box in bounding_boxes])) if bounding_boxes else 0.0
+        processing_time = time.time() - start_time
+        metrics.observe('visual.ocr.seconds', processing_time)
+        metrics.increment('visual.ocr.regions', len(regions))
+
+        return {
+            'text': '\n'.join(lines),
+            'confidence': confidence,
+            'bounding_boxes': bounding_boxes,
+            'num_regions': len(regions),
+            'processing_time': processing_time,
+        }
+
+
+# Global service instance
+_ocr_service = None
+
+def get_ocr_service() -> OCRService:
+    """Get or create the global OCR service"""
+    global _ocr_service
+
+    if _ocr_service is None:
+        _ocr_service = OCRService.from_settings()
+
+    return _ocr_service
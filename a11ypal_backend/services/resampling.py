@@ -0,0 +1,191 @@
+"""
+Audio resampling without going through librosa.
+
+Two backends, chosen by RESAMPLING['BACKEND']:
+
+- 'soxr': libsoxr's HQ resampler (soxr is installed with librosa), one-shot
+  or through its streaming interface
+- 'polyphase': upsample by `up`, low-pass filter, downsample by `down`
+  (up/down = target_sr/orig_sr in lowest terms), evaluated by scipy's
+  polyphase upfirdn. The Kaiser-windowed sinc filter for each rate pair is
+  designed once per process and cached.
+
+'auto' uses soxr when it can be imported. Streaming resamplers produce the
+same output for audio that arrives in pieces as resample() does for the whole
+signal.
+"""
+import math
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+from django.conf import settings
+from scipy.signal import firwin, upfirdn
+
+# Filter half-length in zero crossings of the sinc, passband edge as a
+# fraction of the lower Nyquist frequency, and Kaiser window shape. Flat to
+# about 0.85 Nyquist, better than 60 dB down at Nyquist
+ZERO_CROSSINGS = 32
+ROLLOFF = 0.92
+KAISER_BETA = 9.0
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+
+def rate_ratio(orig_sr: int, target_sr: int) -> Tuple[int, int]:
+    """(up, down) with up / down == target_sr / orig_sr in lowest terms"""
+    divisor = math.gcd(int(orig_sr), int(target_sr))
+    return int(target_sr) // divisor, int(orig_sr) // divisor
+
+
+@lru_cache(maxsize=32)
+def polyphase_kernel(up: int, down: int) -> Tuple[np.ndarray, int]:
+    """
+    Low-pass filter for resampling by up / down
+
+    Returns:
+        (kernel, delay): float32 taps scaled by up and front-padded so its
+        centre falls on the output grid, and that centre in output samples
+    """
+    max_rate = max(up, down)
+    half_length = ZERO_CROSSINGS * max_rate
+    kernel = firwin(2 * half_length + 1, ROLLOFF / max_rate, window=('kaiser', KAISER_BETA)) * up
+
+    # Pad the front so the filter centre lands on a multiple of down
+    pre_pad = (-half_length) % down
+    kernel = np.concatenate((np.zeros(pre_pad), kernel)).astype(np.float32)
+    kernel.setflags(write=False)
+    return kernel, (half_length + pre_pad) // down
+
+
+class PolyphaseStreamingResampler:
+    """
+    Resample audio that arrives in chunks with the cached polyphase kernel
+
+    process() returns every output sample whose filter support has fully
+    arrived; flush() returns the rest at end of stream. Concatenated, they
+    equal resample() of the whole signal.
+
+    Args:
+        orig_sr: Input sample rate
+        target_sr: Output sample rate
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int):
+        self.up, self.down = rate_ratio(orig_sr, target_sr)
+        self.kernel, self.delay = polyphase_kernel(self.up, self.down)
+        # Input samples the filter reaches back; history starts at a multiple
+        # of down so local and global output grids coincide
+        reach = -(-len(self.kernel) // self.up)
+        self._history_length = -(-reach // self.down) * self.down
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0  # Global index of _buffer[0], a multiple of down
+        self._received = 0
+        self._emitted = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Add mono float samples; returns newly available output"""
+        self._buffer = np.concatenate((self._buffer, np.asarray(samples, dtype=np.float32)))
+        self._received += len(samples)
+        return self._emit(final=False)
+
+    def flush(self) -> np.ndarray:
+        """Remaining output at end of stream"""
+        self._buffer = np.concatenate((self._buffer, np.zeros(self._history_length, dtype=np.float32)))
+        return self._emit(final=True)
+
+    def _emit(self, final: bool) -> np.ndarray:
+        if self.up == self.down:
+            output, self._buffer = self._buffer[:self._received - self._emitted], self._buffer[:0]
+            self._emitted += len(output)
+            return output
+
+        total = -(-self._received * self.up // self.down)
+        if final:
+            last = total
+        else:
+            # Output m is ready once input (m + delay) * down / up has arrived
+            last = min(total, ((self._received - 1) * self.up) // self.down - self.delay + 1)
+        if last <= self._emitted or not len(self._buffer):
+            return np.zeros(0, dtype=np.float32)
+
+        # Local output k of this buffer is global output k + offset - delay
+        offset = self._buffer_start * self.up // self.down
+        filtered = upfirdn(self.kernel, self._buffer, self.up, self.down)
+        first_local = self._emitted + self.delay - offset
+        output = filtered[first_local:first_local + last - self._emitted].astype(np.float32)
+        self._emitted += len(output)
+
+        # Keep only the history the next outputs still need
+        next_input = ((self._emitted + self.delay) * self.down) // self.up - self._history_length
+        drop = max(0, (next_input - self._buffer_start) // self.down * self.down)
+        if drop:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start += drop
+        return output
+
+
+class SoxrStreamingResampler:
+    """
+    Resample audio that arrives in chunks with libsoxr
+
+    Args:
+        orig_sr: Input sample rate
+        target_sr: Output sample rate
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int):
+        self._stream = soxr.ResampleStream(orig_sr, target_sr, 1, dtype='float32', quality='HQ')
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Add mono float samples; returns newly available output"""
+        return self._stream.resample_chunk(np.asarray(samples, dtype=np.float32))
+
+    def flush(self) -> np.ndarray:
+        """Remaining output at end of stream"""
+        return self._stream.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def resampling_backend() -> str:
+    """Configured backend, with 'auto' resolved"""
+    backend = getattr(settings, 'RESAMPLING', {}).get('BACKEND', 'auto')
+    if backend == 'auto':
+        return 'soxr' if soxr is not None else 'polyphase'
+    return backend
+
+
+def streaming_resampler(orig_sr: int, target_sr: int, backend: str = None):
+    """
+    Resampler for audio that arrives in chunks
+
+    Returns:
+        Object with process(samples) -> output and flush() -> output
+    """
+    if (backend or resampling_backend()) == 'soxr':
+        return SoxrStreamingResampler(orig_sr, target_sr)
+    return PolyphaseStreamingResampler(orig_sr, target_sr)
+
+
+def resample(samples: np.ndarray, orig_sr: int, target_sr: int, backend: str = None) -> np.ndarray:
+    """
+    Resample mono float audio
+
+    Args:
+        samples: Mono samples
+        orig_sr: Sample rate of samples
+        target_sr: Wanted sample rate
+        backend: 'soxr' or 'polyphase' (default: settings.RESAMPLING)
+
+    Returns:
+        float32 samples at target_sr
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    if orig_sr == target_sr or not len(samples):
+        return samples
+    if (backend or resampling_backend()) == 'soxr':
+        return soxr.resample(samples, orig_sr, target_sr, quality='HQ')
+    resampler = PolyphaseStreamingResampler(orig_sr, target_sr)
+    return np.concatenate((resampler.process(samples), resampler.flush()))
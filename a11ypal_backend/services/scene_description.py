@@ -0,0 +1,173 @@
+"""
+Scene descriptions built from detector output.
+
+The description is assembled in plain Python from already computed
+detections (normalized boxes) and, optionally, a color analysis: object
+counts, where things are (left / ahead / right) and how close they look
+judging by box size, then a short color summary. No model runs here, so a
+description costs well under a millisecond once detections exist.
+"""
+import colorsys
+import time
+from typing import Dict, List, Optional
+
+# Irregular plurals among the COCO class names
+PLURALS = {
+    'person': 'people',
+    'bus': 'buses',
+    'bench': 'benches',
+    'couch': 'couches',
+    'knife': 'knives',
+    'mouse': 'mice',
+    'sheep': 'sheep',
+    'skis': 'skis',
+    'scissors': 'scissors',
+    'wine glass': 'wine glasses',
+    'toothbrush': 'toothbrushes',
+    'sandwich': 'sandwiches',
+}
+
+# Box area (fraction of the frame) above which an object reads as close,
+# and below which it reads as far away
+NEAR_AREA = 0.15
+FAR_AREA = 0.02
+
+
+def pluralize(name: str, count: int) -> str:
+    """'a car', 'an umbrella', '3 people'"""
+    if count == 1:
+        article = 'an' if name[0] in 'aeiou' else 'a'
+        return f'{article} {name}'
+    return f'{count} {PLURALS.get(name, name + "s")}'
+
+
+def color_name(hex_color: str) -> str:
+    """Basic color name for a '#RRGGBB' string, by hue, saturation and value"""
+    hue, saturation, value = colorsys.rgb_to_hsv(
+        int(hex_color[1:3], 16) / 255.0, int(hex_color[3:5], 16) / 255.0, int(hex_color[5:7], 16) / 255.0
+    )
+    hue *= 360
+
+    if value < 0.2:
+        return 'black'
+    if saturation < 0.15:
+        return 'white' if value > 0.85 else 'gray'
+    if hue < 15 or hue >= 345:
+        return 'pink' if saturation < 0.45 and value > 0.7 else 'red'
+    if hue < 45:
+        if value < 0.6:
+            return 'brown'
+        return 'beige' if saturation < 0.4 else 'orange'
+    if hue < 70:
+        return 'beige' if saturation < 0.4 else 'yellow'
+    if hue < 170:
+        return 'green'
+    if hue < 260:
+        return 'blue'
+    if hue < 290:
+        return 'purple'
+    return 'pink'
+
+
+def _join(items: List[str]) -> str:
+    if len(items) == 1:
+        return items[0]
+    return ', '.join(items[:-1]) + ' and ' + items[-1]
+
+
+def locate(bounds: Dict) -> Dict:
+    """Horizontal position and rough distance of one normalized box"""
+    center_x = bounds['x'] + bounds['width'] / 2
+    area = bounds['width'] * bounds['height']
+
+    if center_x < 1 / 3:
+        position = 'left'
+    elif center_x > 2 / 3:
+        position = 'right'
+    else:
+        position = 'center'
+
+    if area >= NEAR_AREA or bounds['height'] >= 0.6:
+        distance = 'near'
+    elif area < FAR_AREA:
+        distance = 'far'
+    else:
+        distance = 'mid'
+
+    return {'position': position, 'distance': distance, 'area': area}
+
+
+def describe_detections(detections: List[Dict], colors: Optional[Dict] = None, max_groups: int = 5) -> Dict:
+    """
+    Describe a scene from its detections
+
+    Args:
+        detections: Detection dicts with 'name', 'confidence' and normalized
+            'bounds' (x, y, width, height); raw or formatted detector output
+        colors: Optional color analysis result ('dominant_colors', 'accessibility_rating')
+        max_groups: Most prominent object groups to place in the description
+
+    Returns:
+        Dict with 'description', 'tags', 'confidence', 'object_counts',
+        'layout' and 'generation_time'
+    """
+    start_time = time.perf_counter()
+
+    counts: Dict[str, int] = {}
+    groups: Dict[tuple, Dict] = {}
+    layout = []
+    for detection in detections:
+        name = detection['name']
+        counts[name] = counts.get(name, 0) + 1
+
+        place = locate(detection['bounds'])
+        layout.append({'name': name, 'position': place['position'], 'distance': place['distance'],
+                       'confidence': detection['confidence']})
+
+        key = (name, place['position'], place['distance'])
+        group = groups.setdefault(key, {'count': 0, 'area': 0.0})
+        group['count'] += 1
+        group['area'] = max(group['area'], place['area'])
+
+    sentences = []
+    if counts:
+        ordered = sorted(counts.items(), key=lambda item: -item[1])
+        sentences.append('I can see ' + _join([pluralize(name, count) for name, count in ordered]) + '.')
+
+        # Biggest boxes first: they are the closest and most relevant
+        prominent = sorted(groups.items(), key=lambda item: -item[1]['area'])[:max_groups]
+        for (name, position, distance), group in prominent:
+            subject = pluralize(name, group['count'])
+            verb = 'is' if group['count'] == 1 else 'are'
+            where = 'ahead' if position == 'center' else f'on your {position}'
+            if distance == 'near':
+                where = f'close {where}'
+            elif distance == 'far':
+                where = f'far away {where}'
+            sentences.append(f'{subject[0].upper()}{subject[1:]} {verb} {where}.')
+    else:
+        sentences.append('No objects detected.')
+
+    color_names = []
+    if colors and colors.get('dominant_colors'):
+        for entry in colors['dominant_colors'][:3]:
+            name = color_name(entry['color'])
+            if name not in color_names:
+                color_names.append(name)
+        sentences.append(f'The scene is mostly {_join(color_names[:2])}.')
+        if colors.get('accessibility_rating') == 'poor':
+            sentences.append('Contrast is low.')
+
+    confidence = (
+        sum(detection['confidence'] for detection in detections) / len(detections)
+        if detections else 0.0
+    )
+
+    return {
+        'description': ' '.join(sentences),
+        'tags': list(counts) + [name for name in color_names if name not in counts],
+        'confidence': confidence,
+        'object_counts': counts,
+        'layout': layout,
+        'generation_time': time.perf_counter() - start_time,
+    }
@@ -0,0 +1,170 @@
+"""
+Frequency spectrum of a recording in audiometric octave bands.
+
+The power spectral density is estimated with Welch's method over streamed
+blocks (SpectrumAnalyzer.feed): Hann-windowed segments with 50% overlap, whose
+periodograms are summed as they arrive, so only one segment of audio is kept
+between blocks. The PSD is then aggregated into the octave bands audiograms
+use (250 Hz - 8 kHz).
+
+Everything that depends only on the sample rate and segment length (window,
+PSD scaling, band aggregation matrix) is computed once and cached; scipy.fft
+reuses its FFT plans for repeated segment lengths.
+"""
+import time
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+import scipy.fft
+from scipy.signal import find_peaks, get_window
+
+from .audio_decoding import Framer
+
+EPSILON = 1e-20
+OCTAVE_BAND_CENTERS = (250, 500, 1000, 2000, 4000, 8000)  # Hz
+FREQUENCY_RESOLUTION_HZ = 10.0  # Segment length is the power of two at least this fine
+DOMINANT_FREQUENCIES = 5
+DOMINANT_MIN_HZ = 50.0
+
+
+def segment_length(sample_rate: int) -> int:
+    """Welch segment length for a sample rate"""
+    return int(2 ** np.ceil(np.log2(sample_rate / FREQUENCY_RESOLUTION_HZ)))
+
+
+def band_label(center: int) -> str:
+    return f'{center}Hz'
+
+
+@lru_cache(maxsize=16)
+def welch_plan(sample_rate: int, nperseg: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Tuple[int, ...]]:
+    """
+    Precomputed pieces of the PSD estimate
+
+    Returns:
+        (window, per-bin scale turning |FFT|^2 into one-sided PSD,
+        band matrix of shape (bands, bins) whose rows sum PSD bins times the
+        bin width into band power, centres of the bands that fit below Nyquist)
+    """
+    window = get_window('hann', nperseg)
+    scale = np.full(nperseg // 2 + 1, 2.0 / (sample_rate * float(np.sum(window ** 2))))
+    scale[0] /= 2
+    if nperseg % 2 == 0:
+        scale[-1] /= 2
+
+    freqs = np.fft.rfftfreq(nperseg, 1.0 / sample_rate)
+    bin_width = sample_rate / nperseg
+    centers = tuple(c for c in OCTAVE_BAND_CENTERS if c * np.sqrt(2) <= sample_rate / 2)
+    bands = np.array([
+        ((freqs >= c / np.sqrt(2)) & (freqs < c * np.sqrt(2))) * bin_width for c in centers
+    ]).reshape(len(centers), len(freqs))
+
+    for array in (window, scale, bands):
+        array.setflags(write=False)
+    return window, scale, bands, centers
+
+
+def frequency_recommendations(levels: Dict[str, float]) -> str:
+    """Hearing aid advice from octave band levels (dB)"""
+    if not levels:
+        return "The recording is too short or too quiet for a frequency analysis."
+    strongest = max(levels, key=levels.get)
+    center = int(strongest[:-2])
+    if center <= 500:
+        advice = ("Most of the sound energy is below 1 kHz, where background noise such as engines and "
+                  "ventilation masks speech. A low-frequency noise reduction program may help.")
+    elif center <= 2000:
+        advice = "Most of the sound energy is in the main speech range (1-2 kHz)."
+    else:
+        advice = "High-frequency content is strong; lower high-frequency gain if it is uncomfortable."
+    speech = levels.get(band_label(1000))
+    treble = levels.get(band_label(4000))
+    if speech is not None and treble is not None and speech - treble > 30:
+        advice += " Little energy reaches 4 kHz, so consonants may be hard to hear; extra high-frequency gain helps."
+    return advice
+
+
+class SpectrumAnalyzer:
+    """
+    Streaming Welch PSD and octave band levels
+
+    Args:
+        sample_rate: Sample rate of the blocks fed in
+        nperseg: Welch segment length (default: segment_length(sample_rate))
+    """
+
+    def __init__(self, sample_rate: int, nperseg: int = None):
+        self.sample_rate = sample_rate
+        self.nperseg = nperseg or segment_length(sample_rate)
+        self.window, self.scale, self.bands, self.centers = welch_plan(sample_rate, self.nperseg)
+        self.framer = Framer(self.nperseg, hop=self.nperseg // 2)
+
+        self._start_time = time.time()
+        self._power_sum = np.zeros(self.nperseg // 2 + 1)
+        self._segments = 0
+        self._samples = 0
+
+    def feed(self, block: np.ndarray):
+        """Add a block of mono float samples"""
+        self._samples += len(block)
+        segments = self.framer.push(block)
+        if not len(segments):
+            return
+        # Welch uses mean-removed segments ('constant' detrend)
+        segments = segments - segments.mean(axis=1, keepdims=True)
+        spectrum = scipy.fft.rfft(segments * self.window, axis=1)
+        self._power_sum += (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=0)
+        self._segments += len(segments)
+
+    def psd(self) -> np.ndarray:
+        """Average one-sided PSD so far (power per Hz, per bin)"""
+        return self._power_sum * self.scale / max(self._segments, 1)
+
+    def dominant_frequencies(self, psd: np.ndarray) -> List[int]:
+        """Frequencies of the strongest PSD peaks, strongest first"""
+        freqs = np.fft.rfftfreq(self.nperseg, 1.0 / self.sample_rate)
+        peaks, _ = find_peaks(10 * np.log10(psd + EPSILON), prominence=6)
+        peaks = peaks[freqs[peaks] >= DOMINANT_MIN_HZ]
+        strongest = peaks[np.argsort(psd[peaks])[::-1][:DOMINANT_FREQUENCIES]]
+        return [int(round(freqs[i])) for i in strongest]
+
+    def result(self) -> Dict:
+        """
+        Summary after the last block
+
+        Returns:
+            Dict with 'dominant_frequencies', 'frequency_spectrum' and
+            'hearing_aid_recommendations'
+        """
+        if not self._segments and len(self.framer.remainder()):
+            # Shorter than one segment: analyse it zero-padded
+            padding = self.nperseg - len(self.framer.remainder())
+            self.feed(np.zeros(padding, dtype=np.float32))
+            self._samples -= padding
+
+        psd = self.psd()
+        levels = {}
+        relative = {}
+        if self._segments:
+            band_power = self.bands @ psd
+            levels = {band_label(c): round(float(10 * np.log10(p + EPSILON)), 1)
+                      for c, p in zip(self.centers, band_power)}
+            strongest = max(float(band_power.max()), EPSILON)
+            relative = {band_label(c): round(float(np.sqrt(p / strongest)), 3)
+                        for c, p in zip(self.centers, band_power)}
+
+        return {
+            'dominant_frequencies': self.dominant_frequencies(psd) if self._segments else [],
+            'frequency_spectrum': {
+                'bands': levels,
+                'relative': relative,
+                'unit': 'dBFS',
+                'sample_rate': self.sample_rate,
+                'segment_length': self.nperseg,
+                'segments': self._segments,
+                'duration': round(self._samples / float(self.sample_rate), 3),
+                'processing_time': time.time() - self._start_time,
+            },
+            'hearing_aid_recommendations': frequency_recommendations(levels),
+        }
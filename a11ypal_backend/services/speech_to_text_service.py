@@ -1,22 +1,38 @@
 """
 Speech-to-Text service using RealTimeSTT and other libraries
 """
-import os
-import io
-import tempfile
+import time
 import logging
-from typing import Dict, Any, Optional
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, Callable, Hashable, List, Optional
 import numpy as np
-import librosa
-import soundfile as sf
-from pydub import AudioSegment
-from pydub.utils import which
 import speech_recognition as sr
+from django.conf import settings
+
+from .audio_decoding import STT_SAMPLE_RATE, AudioClip
+from .batching import MicroBatcher
+from .chunked_transcription import _init_worker, plan_chunks, stitch_chunks, transcribe_chunk
+from .metrics import metrics
+from .stt_engines import get_stt_engine, is_local_engine
+from .transcription_cache import TranscriptionCache
+from .uploads import read_upload
+from .voice_activity import SpeechTrim, configured_speech_regions
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+metrics.register_ratio('hearing.stt.cache.hit_rate', 'hearing.stt.cache.hits', 'hearing.stt.cache.lookups')
+
+# PocketSphinx names its language packs by locale
+SPHINX_LOCALES = {'en': 'en-US', 'fr': 'fr-FR', 'zh': 'zh-CN'}
+
+
+def sphinx_language(language: str) -> str:
+    """PocketSphinx language pack name for a language code ('en' -> 'en-US')"""
+    return SPHINX_LOCALES.get(language, language)
+
 
 class SpeechToTextService:
     """Service for converting speech to text using multiple STT engines"""
@@ -29,118 +45,323 @@ class SpeechToTextService:
         self.recognizer.operation_timeout = None
         self.recognizer.phrase_threshold = 0.3
         self.recognizer.non_speaking_duration = 0.8
+        # Local engine selected by SPEECH_TO_TEXT['ENGINE']; loaded on first use
+        self.engine = get_stt_engine()
+        
+        # Clips from concurrent requests are decoded together, grouped by
+        # language and duration bucket so padding stays small
+        config = getattr(settings, 'SPEECH_TO_TEXT', {})
+        self.length_bucket = config.get('BATCH_LENGTH_BUCKET', 5.0)
+        self.trim_silence = config.get('TRIM_SILENCE', True)
+        self.min_trim_ratio = config.get('MIN_TRIM_RATIO', 0.05)
+        self.batcher = MicroBatcher(
+            self._transcribe_batch,
+            max_batch_size=config.get('BATCH_SIZE', 8),
+            max_wait=config.get('BATCH_WAIT', 0.05),
+            name='hearing.stt.batch',
+        )
+        
+        # Recordings longer than LONG_AUDIO_SECONDS are split at pauses and
+        # transcribed in CHUNK_WORKERS processes
+        self.long_audio_seconds = config.get('LONG_AUDIO_SECONDS', 60.0)
+        self.chunk_seconds = config.get('CHUNK_SECONDS', 30.0)
+        self.max_chunk_seconds = config.get('MAX_CHUNK_SECONDS', 45.0)
+        self.chunk_overlap_seconds = config.get('CHUNK_OVERLAP_SECONDS', 1.0)
+        self.chunk_workers = config.get('CHUNK_WORKERS', 2)
+        self._chunk_pool = None
         
-    def process_audio_file(self, audio_file, language: str = 'en') -> Dict[str, Any]:
+        # Results of earlier uploads with the same content, language and engine
+        self.result_cache = TranscriptionCache.from_settings()
+        
+    def process_audio_file(self, audio_file, language: str = 'en',
+                           on_progress: Optional[Callable[[int, int, str], None]] = None,
+                           decoded: Optional[AudioClip] = None) -> Dict[str, Any]:
         """
         Process uploaded audio file and return transcription results
         
         Args:
-            audio_file: Django UploadedFile object
+            audio_file: Django UploadedFile object (or any open file)
             language: Language code for transcription (default: 'en')
+            on_progress: Called as on_progress(chunks_done, chunks_total, partial_text)
+                whenever a chunk of a long recording finishes
+            decoded: The upload already decoded by the caller (left unchanged);
+                saves decoding it again
             
         Returns:
-            Dict containing transcription results and metadata
+            Dict containing transcription results and metadata ('cached' is
+            True when an earlier identical upload's result was reused)
         """
         try:
-            # Save uploaded file to temporary location
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-                # Read and write the file
-                for chunk in audio_file.chunks():
-                    temp_file.write(chunk)
-                temp_file_path = temp_file.name
+            data = read_upload(audio_file)
+            metrics.increment('hearing.stt.cache.lookups')
+            upload_key = self.result_cache.upload_key(data, language)
+            cached = self.result_cache.get(upload_key)
+            if cached is not None:
+                metrics.increment('hearing.stt.cache.hits')
+                return {**cached, 'cached': True}
             
-            try:
-                # Convert to proper format if needed
-                processed_audio_path = self._preprocess_audio(temp_file_path)
-                
-                # Perform transcription
-                transcription_result = self._transcribe_audio(processed_audio_path, language)
-                
-                # Get audio metadata
-                audio_metadata = self._get_audio_metadata(processed_audio_path)
-                
-                # Combine results
-                result = {
-                    'transcribed_text': transcription_result['text'],
-                    'confidence_score': transcription_result['confidence'],
-                    'language': language,
-                    'speaker_count': transcription_result.get('speaker_count', 1),
-                    'timestamps': transcription_result.get('timestamps', []),
-                    'duration': audio_metadata['duration'],
-                    'sample_rate': audio_metadata['sample_rate'],
-                    'channels': audio_metadata['channels'],
-                    'processing_time': transcription_result.get('processing_time', 0)
-                }
-                
-                return result
-                
-            finally:
-                # Clean up temporary files
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
-                if 'processed_audio_path' in locals() and os.path.exists(processed_audio_path):
-                    os.unlink(processed_audio_path)
+            # Decode once from memory; everything below works on this buffer
+            if decoded is not None:
+                clip = decoded.copy().normalize().resample(STT_SAMPLE_RATE)
+            else:
+                clip = self._preprocess_audio(data)
+            audio_key = self.result_cache.audio_key(clip.samples, language)
+            cached = self.result_cache.get(audio_key)
+            if cached is not None:
+                metrics.increment('hearing.stt.cache.hits')
+                self.result_cache.set([upload_key], cached)
+                return {**cached, 'cached': True}
+            
+            # Perform transcription
+            if self.chunk_workers and clip.duration > self.long_audio_seconds:
+                transcription_result = self._transcribe_chunked(clip, language, on_progress)
+            else:
+                transcription_result = self._transcribe_audio(clip, language)
+            
+            # Get audio metadata
+            audio_metadata = self._get_audio_metadata(clip)
+            
+            # Combine results
+            result = {
+                'transcribed_text': transcription_result['text'],
+                'confidence_score': transcription_result['confidence'],
+                'language': language,
+                'speaker_count': transcription_result.get('speaker_count', 1),
+                'timestamps': transcription_result.get('timestamps', []),
+                'duration': audio_metadata['duration'],
+                'speech_duration': transcription_result.get('speech_duration', audio_metadata['duration']),
+                'sample_rate': audio_metadata['sample_rate'],
+                'channels': audio_metadata['channels'],
+                'processing_time': transcription_result.get('processing_time', 0)
+            }
+            # Keyed by the engine that actually ran; fallback and failure
+            # results are not stored, so a retry reaches the real engine again
+            engine = transcription_result.get('engine')
+            if result['transcribed_text'] and self.result_cache.accepts(engine, result['confidence_score']):
+                self.result_cache.set([
+                    self.result_cache.upload_key(data, language, engine),
+                    self.result_cache.audio_key(clip.samples, language, engine),
+                ], result)
+            
+            return {**result, 'cached': False}
                     
         except Exception as e:
             logger.error(f"Error processing audio file: {str(e)}")
             raise Exception(f"Audio processing failed: {str(e)}")
     
-    def _preprocess_audio(self, audio_path: str) -> str:
+    def _preprocess_audio(self, data: bytes) -> AudioClip:
         """
-        Preprocess audio file to ensure compatibility
+        Decode and prepare audio for recognition
         
         Args:
-            audio_path: Path to the audio file
+            data: Encoded audio bytes
             
         Returns:
-            Path to the processed audio file
+            Mono, normalized AudioClip at 16kHz (optimal for most STT engines)
         """
         try:
-            # Load audio with librosa
-            audio_data, sample_rate = librosa.load(audio_path, sr=None)
+            return AudioClip.from_bytes(data).normalize().resample(STT_SAMPLE_RATE)
             
-            # Convert to mono if stereo
-            if len(audio_data.shape) > 1:
-                audio_data = librosa.to_mono(audio_data)
-            
-            # Normalize audio
-            audio_data = librosa.util.normalize(audio_data)
+        except Exception as e:
+            logger.error(f"Error preprocessing audio: {str(e)}")
+            raise
+    
+    def transcribe_samples(self, samples: np.ndarray, sample_rate: int = STT_SAMPLE_RATE,
+                           language: str = 'en') -> Dict[str, Any]:
+        """
+        Transcribe already decoded audio with the local engine (or Sphinx
+        when none is configured)
+        
+        Used for live captions, where a web round trip per segment is too slow.
+        
+        Args:
+            samples: Mono float32 samples in [-1, 1]
+            sample_rate: Sample rate of samples
+            language: Language code for transcription
             
-            # Resample to 16kHz if needed (optimal for most STT engines)
-            if sample_rate != 16000:
-                audio_data = librosa.resample(audio_data, orig_sr=sample_rate, target_sr=16000)
-                sample_rate = 16000
+        Returns:
+            Dict with 'text', 'confidence' and 'engine'
+        """
+        clip = AudioClip(samples, sample_rate).resample(STT_SAMPLE_RATE)
+        if is_local_engine(self.engine.name):
+            result = self._local_transcribe(clip.samples, language)
+            return {'text': result['text'], 'confidence': result['confidence'], 'engine': self.engine.name}
+        try:
+            text = self.recognizer.recognize_sphinx(self._to_audio_data(clip), language=sphinx_language(language))
+        except sr.UnknownValueError:
+            # Nothing recognizable (e.g. a cough or background noise): an empty caption
+            return {'text': '', 'confidence': 0.0, 'engine': 'sphinx'}
+        return {'text': text, 'confidence': 0.6, 'engine': 'sphinx'}
+    
+    def _local_transcribe(self, samples: np.ndarray, language: str) -> Dict[str, Any]:
+        """Run the local engine, batched with other requests' clips when enabled"""
+        if self.batcher.max_batch_size <= 1:
+            return self.engine.transcribe(samples, language)
+        bucket = int(len(samples) / STT_SAMPLE_RATE // self.length_bucket)
+        return self.batcher.submit(samples, key=(language, bucket)).result()
+    
+    def _transcribe_batch(self, key: Hashable, clips: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """MicroBatcher callback: one padded engine batch per (language, bucket)"""
+        language, _ = key
+        return self.engine.transcribe_batch(clips, language)
+    
+    def _to_audio_data(self, clip: AudioClip) -> sr.AudioData:
+        """Wrap a clip's PCM for speech_recognition without going through a file"""
+        return sr.AudioData(clip.to_pcm16(), clip.sample_rate, 2)
+    
+    def _transcribe_audio(self, clip: AudioClip, language: str = 'en') -> Dict[str, Any]:
+        """
+        Transcribe audio, recognizing only the parts that contain speech
+        
+        Silence and background beyond a padding margin are cut out first;
+        word timestamps are mapped back onto the original recording.
+        
+        Args:
+            clip: Preprocessed audio
+            language: Language code for transcription
             
-            # Save processed audio
-            processed_path = audio_path.replace('.wav', '_processed.wav')
-            sf.write(processed_path, audio_data, sample_rate)
+        Returns:
+            Dict containing transcription results
+        """
+        trim = self._trim_silence(clip)
+        if trim is None:
+            return self._recognize(clip, language)
+        
+        result = self._recognize(AudioClip(trim.samples, clip.sample_rate), language)
+        result['timestamps'] = trim.map_words(result['timestamps'])
+        result['speech_duration'] = trim.speech_duration
+        
+        # Recognizer time grows with audio length, so the share of audio
+        # removed is (roughly) the share of recognizer time saved
+        metrics.observe('hearing.stt.vad.removed_ratio', trim.removed_ratio)
+        if trim.speech_duration > 0:
+            saved = result['processing_time'] * (clip.duration - trim.speech_duration) / trim.speech_duration
+            metrics.observe('hearing.stt.vad.recognizer_seconds_saved', saved)
+        return result
+    
+    def _get_chunk_pool(self) -> ProcessPoolExecutor:
+        if self._chunk_pool is None:
+            # Spawned so workers never inherit a loaded model or live threads
+            self._chunk_pool = ProcessPoolExecutor(
+                max_workers=self.chunk_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return self._chunk_pool
+    
+    def _transcribe_chunked(self, clip: AudioClip, language: str = 'en',
+                            on_progress: Optional[Callable[[int, int, str], None]] = None) -> Dict[str, Any]:
+        """
+        Transcribe a long recording as chunks in parallel worker processes
+        
+        Args:
+            clip: Preprocessed 16 kHz audio
+            language: Language code for transcription
+            on_progress: Called after each chunk with the text of the
+                finished chunks at the start of the recording
             
-            return processed_path
+        Returns:
+            Dict containing transcription results on the recording's timeline
+        """
+        start_time = time.time()
+        total = len(clip.samples)
+        # Without detected speech every cut is a hard cut with overlap
+        regions = configured_speech_regions(clip.samples, clip.sample_rate) or [(0, total)]
+        chunks = plan_chunks(
+            regions,
+            total,
+            clip.sample_rate,
+            chunk_seconds=self.chunk_seconds,
+            max_chunk_seconds=self.max_chunk_seconds,
+            overlap_seconds=self.chunk_overlap_seconds,
+        )
+        
+        pool = self._get_chunk_pool()
+        futures = {
+            pool.submit(transcribe_chunk, clip.samples[chunk.start:chunk.end], clip.sample_rate, language): i
+            for i, chunk in enumerate(chunks)
+        }
+        results = [None] * len(chunks)
+        finished = [False] * len(chunks)
+        for done, future in enumerate(as_completed(futures), 1):
+            index = futures[future]
+            results[index] = future.result()
+            finished[index] = True
+            if on_progress is not None:
+                # Partial text only grows at the end: stop at the first unfinished chunk
+                prefix = finished.index(False) if False in finished else len(chunks)
+                partial = stitch_chunks(chunks[:prefix], results[:prefix], clip.sample_rate)['text']
+                on_progress(done, len(chunks), partial)
+        transcribed = [result for result in results if result]
+        if not transcribed:
+            raise Exception("Transcription failed: Could not understand the audio")
+        
+        result = stitch_chunks(chunks, results, clip.sample_rate)
+        engines = {r['engine'] for r in transcribed}
+        result.update({
+            # Chunks that fell back to another recognizer make the whole result a fallback
+            'engine': engines.pop() if len(engines) == 1 else 'mixed',
+            'speech_duration': sum(
+                r.get('speech_duration', (chunk.end - chunk.start) / clip.sample_rate)
+                for chunk, r in zip(chunks, results) if r
+            ),
+            'chunks': len(chunks),
+            'processing_time': time.time() - start_time,
+        })
+        metrics.observe('hearing.stt.chunked.seconds', result['processing_time'])
+        metrics.observe('hearing.stt.chunked.chunks', len(chunks))
+        logger.info(f"Transcribed {clip.duration:.1f}s of audio as {len(chunks)} chunks")
+        return result
+    
+    def _trim_silence(self, clip: AudioClip) -> Optional[SpeechTrim]:
+        """
+        Cut non-speech out of a clip with webrtcvad
+        
+        Args:
+            clip: Preprocessed 16 kHz audio
             
-        except Exception as e:
-            logger.error(f"Error preprocessing audio: {str(e)}")
-            raise
+        Returns:
+            The trimmed audio with its offset map, or None when trimming is
+            disabled, no speech was found or too little would be removed
+        """
+        if not self.trim_silence:
+            return None
+        
+        start_time = time.time()
+        trim = SpeechTrim.from_settings(clip.samples, clip.sample_rate)
+        metrics.observe('hearing.stt.vad.seconds', time.time() - start_time)
+        if not trim.regions or trim.removed_ratio < self.min_trim_ratio:
+            return None
+        return trim
     
-    def _transcribe_audio(self, audio_path: str, language: str = 'en') -> Dict[str, Any]:
+    def _recognize(self, clip: AudioClip, language: str = 'en') -> Dict[str, Any]:
         """
         Transcribe audio using multiple STT engines
         
+        The configured local engine is tried first; if it cannot be loaded or
+        fails, the web recognizer (with the Sphinx fallback) is used.
+        
         Args:
-            audio_path: Path to the processed audio file
+            clip: Audio to recognize
             language: Language code for transcription
             
         Returns:
             Dict containing transcription results
         """
-        import time
         start_time = time.time()
+        audio_data = self._to_audio_data(clip)
+        
+        if is_local_engine(self.engine.name):
+            try:
+                local_result = self._local_transcribe(clip.samples, language)
+            except Exception as e:
+                logger.warning(f"Local STT engine '{self.engine.name}' failed: {str(e)}")
+            else:
+                return self._local_transcription(local_result, clip, audio_data, start_time)
         
         try:
             # Try Google Speech Recognition first (most reliable)
             try:
-                with sr.AudioFile(audio_path) as source:
-                    audio_data = self.recognizer.record(source)
-                
                 # Use Google Speech Recognition
                 text = self.recognizer.recognize_google(audio_data, language=language)
                 confidence = 0.9  # Google doesn't provide confidence scores
@@ -163,18 +384,50 @@ class SpeechToTextService:
             except sr.RequestError as e:
                 logger.warning(f"Google Speech Recognition service error: {e}")
                 # Fallback to offline recognition
-                return self._fallback_transcription(audio_path, language, start_time)
+                return self._fallback_transcription(audio_data, language, start_time)
                 
         except Exception as e:
             logger.error(f"Error in transcription: {str(e)}")
             raise Exception(f"Transcription failed: {str(e)}")
     
-    def _fallback_transcription(self, audio_path: str, language: str, start_time: float) -> Dict[str, Any]:
+    def _local_transcription(self, local_result: Dict[str, Any], clip: AudioClip,
+                             audio_data: sr.AudioData, start_time: float) -> Dict[str, Any]:
+        """
+        Build the transcription result from a local engine's output
+        
+        Args:
+            local_result: Output of STTEngine.transcribe
+            clip: Transcribed audio
+            audio_data: PCM audio for speaker estimation
+            start_time: Start time for processing time calculation
+            
+        Returns:
+            Dict containing transcription results, with the engine's word timings
+        """
+        if not local_result['text']:
+            raise Exception("Transcription failed: Could not understand the audio")
+        
+        processing_time = time.time() - start_time
+        if clip.duration > 0:
+            metrics.observe('hearing.stt.rtf', processing_time / clip.duration)
+        
+        logger.info(f"Successfully transcribed using local engine '{self.engine.name}'")
+        return {
+            'text': local_result['text'],
+            'confidence': local_result['confidence'],
+            'engine': self.engine.name,
+            'speaker_count': self._estimate_speaker_count(audio_data),
+            'timestamps': local_result['words'],
+            'aligned': True,  # Real word timings
+            'processing_time': processing_time
+        }
+    
+    def _fallback_transcription(self, audio_data: sr.AudioData, language: str, start_time: float) -> Dict[str, Any]:
         """
         Fallback transcription method using offline recognition
         
         Args:
-            audio_path: Path to the audio file
+            audio_data: PCM audio for the recognizer
             language: Language code
             start_time: Start time for processing time calculation
             
@@ -182,11 +435,8 @@ class SpeechToTextService:
             Dict containing transcription results
         """
         try:
-            with sr.AudioFile(audio_path) as source:
-                audio_data = self.recognizer.record(source)
-            
             # Try Sphinx offline recognition as fallback
-            text = self.recognizer.recognize_sphinx(audio_data)
+            text = self.recognizer.recognize_sphinx(audio_data, language=sphinx_language(language))
             confidence = 0.6  # Sphinx typically has lower confidence
             
             result = {
@@ -245,6 +495,9 @@ class SpeechToTextService:
         """
         Generate word-level timestamps (placeholder implementation)
         
+        Only used for the web recognizer, which returns no timings; local
+        engines report real ones.
+        
         Args:
             text: Transcribed text
             
@@ -265,39 +518,22 @@ class SpeechToTextService:
         
         return timestamps
     
-    def _get_audio_metadata(self, audio_path: str) -> Dict[str, Any]:
+    def _get_audio_metadata(self, clip: AudioClip) -> Dict[str, Any]:
         """
-        Get metadata about the audio file
+        Get metadata about the processed audio
         
         Args:
-            audio_path: Path to the audio file
+            clip: Preprocessed audio
             
         Returns:
             Dict containing audio metadata
         """
-        try:
-            # Load audio with librosa to get metadata
-            audio_data, sample_rate = librosa.load(audio_path, sr=None)
-            duration = len(audio_data) / sample_rate
-            
-            # Get number of channels
-            channels = 1 if len(audio_data.shape) == 1 else audio_data.shape[0]
-            
-            return {
-                'duration': duration,
-                'sample_rate': sample_rate,
-                'channels': channels,
-                'samples': len(audio_data)
-            }
-            
-        except Exception as e:
-            logger.error(f"Error getting audio metadata: {str(e)}")
-            return {
-                'duration': 0,
-                'sample_rate': 16000,
-                'channels': 1,
-                'samples': 0
-            }
+        return {
+            'duration': clip.duration,
+            'sample_rate': clip.sample_rate,
+            'channels': 1,  # Downmixed to mono during preprocessing
+            'samples': len(clip.samples)
+        }
 
 
 # Global instance
@@ -0,0 +1,279 @@
+"""
+Local (offline) speech-to-text engines.
+
+Engines take mono float32 audio at 16 kHz and return the text together with
+real word timings. The engine in use is chosen by SPEECH_TO_TEXT['ENGINE'];
+models are large, so the process-wide engine sits behind LazySTTEngine and is
+only loaded on first use.
+"""
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class STTEngine(ABC):
+    """
+    Base class for local STT engines
+
+    transcribe() gets mono float32 samples at 16 kHz and returns a dict with
+    'text', 'confidence' (0-1) and 'words', a list of dicts with 'word',
+    'start', 'end' (seconds) and 'confidence'.
+    """
+
+    name = 'base'
+
+    def __init__(self, config: Dict):
+        self.config = config
+
+    @abstractmethod
+    def transcribe(self, samples: np.ndarray, language: str = 'en') -> Dict:
+        """Transcript of one clip"""
+
+    def transcribe_batch(self, clips: List[np.ndarray], language: str = 'en') -> List[Dict]:
+        """Transcribe several clips of one language; engines that can batch override this"""
+        return [self.transcribe(samples, language) for samples in clips]
+
+
+class FasterWhisperEngine(STTEngine):
+    """Whisper through CTranslate2 (faster-whisper), INT8 on CPU by default"""
+
+    name = 'faster_whisper'
+
+    # Whisper decodes fixed 30 s windows; shorter clips are padded to one
+    WINDOW_SAMPLES = 30 * 16000
+    FRAMES_PER_SECOND = 50  # Decoder time steps (two mel frames each)
+
+    def __init__(self, config: Dict):
+        super().__init__(config)
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise Exception("Whisper engine not available - faster-whisper not installed")
+        self._model = WhisperModel(
+            config.get('MODEL', 'base'),
+            device='cpu',
+            compute_type=config.get('COMPUTE_TYPE', 'int8'),
+            cpu_threads=config.get('CPU_THREADS', 0),
+        )
+
+    def transcribe(self, samples: np.ndarray, language: str = 'en') -> Dict:
+        segments, _ = self._model.transcribe(
+            samples,
+            language=language.split('-')[0] if language else None,
+            beam_size=self.config.get('BEAM_SIZE', 1),
+            word_timestamps=True,
+        )
+
+        words = []
+        texts = []
+        for segment in segments:
+            texts.append(segment.text.strip())
+            for word in segment.words or []:
+                words.append({
+                    'word': word.word.strip(),
+                    'start': round(word.start, 3),
+                    'end': round(word.end, 3),
+                    'confidence': round(float(word.probability), 3),
+                })
+
+        return {
+            'text': ' '.join(text for text in texts if text),
+            'confidence': float(np.mean([w['confidence'] for w in words])) if words else 0.0,
+            'words': words,
+        }
+
+    def transcribe_batch(self, clips: List[np.ndarray], language: str = 'en') -> List[Dict]:
+        """
+        Decode clips that fit one window as a single padded CTranslate2 batch
+
+        Longer clips are transcribed one by one. Word timings come from the
+        cross-attention alignment of each clip's tokens. The batch path uses
+        faster-whisper internals; if they do not match the installed version,
+        the batch is transcribed clip by clip instead.
+        """
+        short = [i for i, samples in enumerate(clips) if len(samples) <= self.WINDOW_SAMPLES]
+        results = [None if i in short else self.transcribe(samples, language) for i, samples in enumerate(clips)]
+        if not short:
+            return results
+
+        try:
+            batched = self._transcribe_window_batch([clips[i] for i in short], language)
+        except (ImportError, AttributeError, TypeError) as e:
+            logger.warning(f"Whisper batch decoding unavailable ({type(e).__name__}: {str(e)}); "
+                           f"transcribing clip by clip")
+            batched = super().transcribe_batch([clips[i] for i in short], language)
+        for i, result in zip(short, batched):
+            results[i] = result
+        return results
+
+    def _transcribe_window_batch(self, clips: List[np.ndarray], language: str) -> List[Dict]:
+        """One padded CTranslate2 batch for clips of at most one window each"""
+        import ctranslate2
+        from faster_whisper.tokenizer import Tokenizer
+
+        model = self._model.model
+        tokenizer = Tokenizer(
+            self._model.hf_tokenizer, model.is_multilingual, task='transcribe',
+            language=language.split('-')[0] if model.is_multilingual else None,
+        )
+
+        features = []
+        for samples in clips:
+            padded = np.zeros(self.WINDOW_SAMPLES, dtype=np.float32)
+            padded[:len(samples)] = samples
+            features.append(self._model.feature_extractor(padded)[:, :self.WINDOW_SAMPLES // 160])
+        encoder_output = model.encode(ctranslate2.StorageView.from_array(np.ascontiguousarray(np.stack(features))))
+
+        prompt = list(tokenizer.sot_sequence) + [tokenizer.no_timestamps]
+        generated = model.generate(
+            encoder_output, [prompt] * len(clips), beam_size=self.config.get('BEAM_SIZE', 1)
+        )
+        text_tokens = [[t for t in g.sequences_ids[0] if t < tokenizer.eot] for g in generated]
+        num_frames = [int(np.ceil(len(samples) / 160)) for samples in clips]
+        alignments = model.align(encoder_output, tokenizer.sot_sequence, text_tokens, num_frames)
+
+        results = []
+        for tokens, alignment in zip(text_tokens, alignments):
+            words = self._align_words(tokenizer, tokens, alignment) if tokens else []
+            results.append({
+                'text': tokenizer.decode(tokens).strip(),
+                'confidence': float(np.mean([w['confidence'] for w in words])) if words else 0.0,
+                'words': words,
+            })
+        return results
+
+    def _align_words(self, tokenizer, tokens: List[int], alignment) -> List[Dict]:
+        """Word start/end times from token-to-frame alignment"""
+        words, word_tokens = tokenizer.split_to_word_tokens(tokens + [tokenizer.eot])
+        text_indices = np.array([pair[0] for pair in alignment.alignments])
+        time_indices = np.array([pair[1] for pair in alignment.alignments])
+        probabilities = np.asarray(alignment.text_token_probs)
+
+        # Time at which the alignment path moves on to each token
+        jumps = np.pad(np.diff(text_indices), (1, 0), constant_values=1).astype(bool)
+        jump_times = time_indices[jumps] / self.FRAMES_PER_SECOND
+        boundaries = np.pad(np.cumsum([len(t) for t in word_tokens[:-1]]), (1, 0))
+
+        aligned = []
+        for word, start, end in zip(words[:-1], boundaries[:-1], boundaries[1:]):
+            if not word.strip() or end > len(jump_times):
+                continue
+            aligned.append({
+                'word': word.strip(),
+                'start': round(float(jump_times[start]), 3),
+                'end': round(float(jump_times[min(end, len(jump_times) - 1)]), 3),
+                'confidence': round(float(np.mean(probabilities[start:end])), 3),
+            })
+        return aligned
+
+
+class VoskEngine(STTEngine):
+    """Kaldi models through Vosk; MODEL is the path of an unpacked model directory"""
+
+    name = 'vosk'
+
+    def __init__(self, config: Dict):
+        super().__init__(config)
+        try:
+            import vosk
+        except ImportError:
+            raise Exception("Vosk engine not available - vosk not installed")
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        # A Vosk model covers one language; the request language is not used
+        self._model = vosk.Model(config['MODEL'])
+
+    def transcribe(self, samples: np.ndarray, language: str = 'en') -> Dict:
+        # Recognizers are cheap and not thread-safe; the model is shared
+        recognizer = self._vosk.KaldiRecognizer(self._model, 16000)
+        recognizer.SetWords(True)
+        recognizer.AcceptWaveform((np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes())
+        result = json.loads(recognizer.FinalResult())
+
+        words = [{
+            'word': word['word'],
+            'start': round(word['start'], 3),
+            'end': round(word['end'], 3),
+            'confidence': round(float(word.get('conf', 1.0)), 3),
+        } for word in result.get('result', [])]
+
+        return {
+            'text': result.get('text', ''),
+            'confidence': float(np.mean([w['confidence'] for w in words])) if words else 0.0,
+            'words': words,
+        }
+
+
+STT_ENGINES = {
+    FasterWhisperEngine.name: FasterWhisperEngine,
+    VoskEngine.name: VoskEngine,
+}
+
+
+def load_engine(name: str, config: Optional[Dict] = None) -> STTEngine:
+    """Instantiate a registered engine by name, or any STTEngine by dotted path"""
+    engine_class = STT_ENGINES.get(name) or import_string(name)
+    return engine_class(config if config is not None else getattr(settings, 'SPEECH_TO_TEXT', {}))
+
+
+class LazySTTEngine:
+    """
+    Proxy that loads the configured engine on first use, once per process
+
+    Args:
+        name: Registered engine name or dotted path
+        config: Engine options (SPEECH_TO_TEXT block)
+    """
+
+    def __init__(self, name: str, config: Dict):
+        self.name = name
+        self.config = config
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'LazySTTEngine':
+        config = getattr(settings, 'SPEECH_TO_TEXT', {})
+        return cls(config.get('ENGINE', 'google'), config)
+
+    @property
+    def loaded(self) -> bool:
+        return self._engine is not None
+
+    def _load(self) -> STTEngine:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    logger.info(f"Loading local STT engine '{self.name}'")
+                    self._engine = load_engine(self.name, self.config)
+        return self._engine
+
+    def __getattr__(self, attr):
+        # Only reached for attributes the proxy itself does not define
+        return getattr(self._load(), attr)
+
+
+def is_local_engine(name: str) -> bool:
+    """Whether name selects a local engine rather than the web recognizer"""
+    return name != 'google'
+
+
+# Global engine proxy
+_stt_engine = None
+
+def get_stt_engine() -> LazySTTEngine:
+    """Get or create the global (lazily loaded) local STT engine"""
+    global _stt_engine
+
+    if _stt_engine is None:
+        _stt_engine = LazySTTEngine.from_settings()
+
+    return _stt_engine
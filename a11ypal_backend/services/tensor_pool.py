@@ -0,0 +1,139 @@
+"""
+Reusable preallocated buffers for the object detector.
+
+Every inference needs a letterboxed uint8 frame, a normalized float32 NCHW
+tensor and a few output arrays. Allocating them per request churns the
+allocator and causes latency jitter under sustained load, so the detection
+service keeps a small pool of buffer sets per model input shape and
+resizes/letterboxes straight into them.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+# Same grey padding value Ultralytics uses for its own letterbox
+LETTERBOX_FILL = 114
+MAX_DETECTIONS = 300
+
+_INV_255 = np.float32(1.0 / 255.0)
+
+
+class DetectionBuffers:
+    """One set of preallocated input and output buffers for a single input shape"""
+
+    def __init__(self, input_shape: Tuple[int, int], max_detections: int = MAX_DETECTIONS):
+        height, width = input_shape
+        self.input_shape = (height, width)
+        self.letterbox = np.full((height, width, 3), LETTERBOX_FILL, dtype=np.uint8)
+        self.tensor = np.empty((1, 3, height, width), dtype=np.float32)
+        self.boxes = np.empty((max_detections, 4), dtype=np.float32)
+        self.confidences = np.empty(max_detections, dtype=np.float32)
+        self.class_ids = np.empty(max_detections, dtype=np.int64)
+
+        # Geometry of the most recent letterbox, used to map boxes back
+        self.scale = 1.0
+        self.pad = (0, 0)
+        self._content_rect = None
+
+    def letterbox_into(self, image: np.ndarray) -> np.ndarray:
+        """
+        Resize and letterbox a BGR image into the pooled buffers in place
+
+        Args:
+            image: Input image as numpy array (BGR format)
+
+        Returns:
+            The pooled NCHW float32 RGB tensor, normalized to 0-1
+        """
+        target_h, target_w = self.input_shape
+        src_h, src_w = image.shape[:2]
+
+        scale = min(target_h / src_h, target_w / src_w)
+        new_w = max(1, int(round(src_w * scale)))
+        new_h = max(1, int(round(src_h * scale)))
+        left = (target_w - new_w) // 2
+        top = (target_h - new_h) // 2
+
+        # Only repaint the padding when the content area moves; consecutive
+        # frames from the same camera keep the same geometry.
+        content_rect = (top, left, new_h, new_w)
+        if content_rect != self._content_rect:
+            self.letterbox.fill(LETTERBOX_FILL)
+            self._content_rect = content_rect
+
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+        content = self.letterbox[top:top + new_h, left:left + new_w]
+        cv2.resize(image, (new_w, new_h), dst=content, interpolation=interpolation)
+
+        # BGR HWC uint8 -> RGB CHW float32 in [0, 1], written into the pooled tensor
+        np.multiply(self.letterbox[:, :, ::-1].transpose(2, 0, 1), _INV_255, out=self.tensor[0])
+
+        self.scale = scale
+        self.pad = (left, top)
+        return self.tensor
+
+    def unletterbox_boxes(self, boxes_xyxy: np.ndarray, image_shape: Tuple[int, ...]) -> np.ndarray:
+        """
+        Map boxes from letterbox coordinates back onto the original image
+
+        Args:
+            boxes_xyxy: (N, 4) boxes in model input coordinates
+            image_shape: Shape of the original image
+
+        Returns:
+            View into the pooled box buffer holding the rescaled, clipped boxes
+        """
+        count = min(len(boxes_xyxy), len(self.boxes))
+        out = self.boxes[:count]
+        np.copyto(out, boxes_xyxy[:count], casting='unsafe')
+
+        pad_x, pad_y = self.pad
+        out[:, 0::2] -= pad_x
+        out[:, 1::2] -= pad_y
+        out /= self.scale
+
+        np.clip(out[:, 0::2], 0, image_shape[1], out=out[:, 0::2])
+        np.clip(out[:, 1::2], 0, image_shape[0], out=out[:, 1::2])
+        return out
+
+
+class TensorPool:
+    """
+    Thread-safe pool of DetectionBuffers keyed by model input shape
+
+    Buffers are checked out for the duration of one inference and returned
+    afterwards, so concurrent requests never share a buffer set.
+    """
+
+    def __init__(self, max_per_shape: int = 4, max_detections: int = MAX_DETECTIONS):
+        self.max_per_shape = max_per_shape
+        self.max_detections = max_detections
+        self._free: Dict[Tuple[int, int], List[DetectionBuffers]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, input_shape: Tuple[int, int]):
+        """Check out a buffer set for the given (height, width) input shape"""
+        key = (int(input_shape[0]), int(input_shape[1]))
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            buffers = free.pop() if free else None
+
+        if buffers is None:
+            buffers = DetectionBuffers(key, self.max_detections)
+
+        try:
+            yield buffers
+        finally:
+            with self._lock:
+                free = self._free.setdefault(key, [])
+                if len(free) < self.max_per_shape:
+                    free.append(buffers)
+
+    def stats(self) -> Dict:
+        """Number of idle buffer sets per input shape"""
+        with self._lock:
+            return {f'{h}x{w}': len(free) for (h, w), free in self._free.items()}
@@ -0,0 +1,100 @@
+"""
+Cache of transcription results for repeated uploads.
+
+Each result is stored under two keys, both including the language and the
+engine (and model) that produced it:
+
+- the hash of the uploaded bytes: a client retrying after a network error
+  sends the same file, and the hit skips decoding as well as recognition
+- the hash of the decoded 16 kHz PCM: the same recording exported again or in
+  another container decodes to the same samples and skips recognition
+
+Entries live in a Django cache alias (SPEECH_TO_TEXT['RESULT_CACHE']). The
+default is a FileBasedCache on local disk, shared by every worker process on
+the host, with a TTL and MAX_ENTRIES culling.
+"""
+import hashlib
+import logging
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionCache:
+    """
+    Transcription results keyed by audio content, language and engine
+
+    Only results of the configured engine are stored (see accepts): a
+    fallback recognizer's output, or the placeholder returned when every
+    recognizer failed, would otherwise be served to the retry that should
+    reach the real engine.
+
+    Args:
+        alias: Django cache alias; empty disables caching
+        engine: The configured engine (SPEECH_TO_TEXT['ENGINE'])
+        model: Its model; switching engine or model does not return stale results
+    """
+
+    def __init__(self, alias: str, engine: str, model: str = ''):
+        self.alias = alias
+        self.engine = engine
+        self.model = model
+
+    @classmethod
+    def from_settings(cls) -> 'TranscriptionCache':
+        config = getattr(settings, 'SPEECH_TO_TEXT', {})
+        return cls(config.get('RESULT_CACHE', 'transcriptions'), config.get('ENGINE', 'google'),
+                   config.get('MODEL', ''))
+
+    def accepts(self, engine: str, confidence: float) -> bool:
+        """Whether a result produced by engine should be stored"""
+        return engine == self.engine and confidence > 0
+
+    @property
+    def cache(self):
+        if not self.alias:
+            return None
+        try:
+            return caches[self.alias]
+        except InvalidCacheBackendError:
+            return None
+
+    def upload_key(self, data: bytes, language: str, engine: Optional[str] = None) -> str:
+        """Key for the encoded upload, for results of engine (default: the configured one)"""
+        return self._key('upload', hashlib.blake2b(data, digest_size=16).hexdigest(), language, engine)
+
+    def audio_key(self, samples: np.ndarray, language: str, engine: Optional[str] = None) -> str:
+        """Key for decoded, resampled PCM, for results of engine (default: the configured one)"""
+        digest = hashlib.blake2b(np.ascontiguousarray(samples).tobytes(), digest_size=16).hexdigest()
+        return self._key('pcm', digest, language, engine)
+
+    def _key(self, kind: str, digest: str, language: str, engine: Optional[str]) -> str:
+        engine = engine or self.engine
+        # The web recognizer has no model setting
+        engine_id = engine if engine == 'google' else f'{engine}:{self.model}'
+        return f'stt:{engine_id}:{language}:{kind}:{digest}'
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached result, or None"""
+        cache = self.cache
+        if cache is None:
+            return None
+        try:
+            return cache.get(key)
+        except Exception as e:
+            logger.warning(f"Transcription cache lookup failed: {str(e)}")
+            return None
+
+    def set(self, keys: Iterable[str], result: Dict):
+        """Store result under every key"""
+        cache = self.cache
+        if cache is None:
+            return
+        try:
+            cache.set_many({key: result for key in keys})
+        except Exception as e:
+            logger.warning(f"Transcription cache store failed: {str(e)}")
@@ -0,0 +1,11 @@
+"""
+Helpers for uploaded files, shared by the image and audio decoders.
+"""
+
+
+def read_upload(upload) -> bytes:
+    """Read an uploaded file into memory and rewind it so it can still be saved"""
+    upload.seek(0)
+    data = upload.read()
+    upload.seek(0)
+    return data
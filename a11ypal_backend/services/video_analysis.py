@@ -0,0 +1,342 @@
+"""
+Obstacle timelines from short video clips.
+
+The clip is decoded frame by frame with OpenCV on a background thread, so it
+is never held in memory as a whole. Frames are sampled at a fixed rate and a
+sampled frame becomes a keyframe when it differs enough from the previous
+keyframe (or too much time has passed). Keyframes are handed to the detector
+in batches through a bounded queue, so decoding the next batch overlaps
+inference on the current one and memory stays bounded by the queue size,
+whatever the clip length. Detections of the same object in nearby keyframes
+are merged into one timeline entry.
+"""
+import os
+import queue
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .metrics import metrics
+from .scene_description import locate
+
+# Marks the end of the keyframe stream
+_END = object()
+
+
+@contextmanager
+def upload_path(upload, suffix: str = '.mp4') -> Iterator[str]:
+    """
+    Path to an uploaded file on disk, for readers that need a filename
+
+    Large uploads already live in a temporary file; small in-memory ones are
+    written out in chunks and removed afterwards.
+    """
+    if hasattr(upload, 'temporary_file_path'):
+        yield upload.temporary_file_path()
+        return
+
+    handle = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        with handle:
+            for chunk in upload.chunks():
+                handle.write(chunk)
+        yield handle.name
+    finally:
+        os.unlink(handle.name)
+
+
+class VideoAnalyzer:
+    """
+    Streaming keyframe selection and batched detection for video clips
+
+    Args:
+        sample_fps: Frames per second considered for keyframes; others are only grabbed
+        scene_threshold: Normalized mean absolute thumbnail difference that makes a keyframe
+        min_gap: Minimum seconds between keyframes
+        max_gap: A keyframe is forced after this many seconds without one
+        batch_size: Keyframes per detector call
+        queue_batches: Decoded batches allowed to wait for the detector
+        max_side: Keyframes are downscaled to this longest side before queueing
+        max_duration: Seconds of video analyzed; the rest is ignored
+        merge_gap: Seconds within which repeated detections are one timeline entry
+        thumbnail_size: Longest side of the grayscale thumbnails used for scoring
+    """
+
+    def __init__(self, sample_fps: float = 5.0, scene_threshold: float = 0.12, min_gap: float = 0.4,
+                 max_gap: float = 2.0, batch_size: int = 4, queue_batches: int = 2, max_side: int = 1280,
+                 max_duration: float = 120.0, merge_gap: float = 2.0, thumbnail_size: int = 64):
+        self.sample_fps = sample_fps
+        self.scene_threshold = scene_threshold
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+        self.batch_size = batch_size
+        self.queue_batches = queue_batches
+        self.max_side = max_side
+        self.max_duration = max_duration
+        self.merge_gap = merge_gap
+        self.thumbnail_size = thumbnail_size
+
+    @classmethod
+    def from_settings(cls) -> 'VideoAnalyzer':
+        config = getattr(settings, 'VIDEO_ANALYSIS', {})
+        return cls(
+            sample_fps=config.get('SAMPLE_FPS', 5.0),
+            scene_threshold=config.get('SCENE_THRESHOLD', 0.12),
+            min_gap=config.get('MIN_GAP', 0.4),
+            max_gap=config.get('MAX_GAP', 2.0),
+            batch_size=config.get('BATCH_SIZE', 4),
+            queue_batches=config.get('QUEUE_BATCHES', 2),
+            max_side=config.get('MAX_SIDE', 1280),
+            max_duration=config.get('MAX_DURATION', 120.0),
+            merge_gap=config.get('MERGE_GAP', 2.0),
+            thumbnail_size=config.get('THUMBNAIL_SIZE', 64),
+        )
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        scale = self.thumbnail_size / max(height, width)
+        small = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _fit(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        scale = self.max_side / max(height, width)
+        if scale >= 1.0:
+            return frame
+        return cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    def iter_keyframes(self, path: str, stats: Dict) -> Iterator[Tuple[float, float, np.ndarray]]:
+        """
+        Decode a clip and yield its keyframes
+
+        Args:
+            path: Video file path
+            stats: Updated in place with 'fps', 'frames_read', 'frames_sampled'
+                and 'duration' (seconds decoded)
+
+        Yields:
+            (timestamp in seconds, scene-change score, BGR keyframe)
+        """
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError("Could not open video")
+
+        try:
+            fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+            step = max(1, int(round(fps / self.sample_fps)))
+            stats['fps'] = fps
+
+            index = 0
+            last_thumbnail = None
+            last_time = None
+            while True:
+                timestamp = index / fps
+                if timestamp > self.max_duration:
+                    break
+                # grab() skips the color conversion for frames we never look at
+                if not capture.grab():
+                    break
+                index += 1
+                stats['frames_read'] = index
+                stats['duration'] = timestamp
+                if (index - 1) % step:
+                    continue
+
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                stats['frames_sampled'] += 1
+
+                thumbnail = self._thumbnail(frame)
+                if last_thumbnail is None or thumbnail.shape != last_thumbnail.shape:
+                    score = 1.0
+                else:
+                    score = float(cv2.absdiff(thumbnail, last_thumbnail).mean()) / 255.0
+
+                elapsed = timestamp - last_time if last_time is not None else None
+                if elapsed is None or (elapsed >= self.min_gap and (
+                        score >= self.scene_threshold or elapsed >= self.max_gap)):
+                    last_thumbnail = thumbnail
+                    last_time = timestamp
+                    yield timestamp, score, self._fit(frame)
+        finally:
+            capture.release()
+
+    def _produce(self, path: str, batches: queue.Queue, stop: threading.Event, stats: Dict):
+        """Decode on a background thread, putting keyframe batches on a bounded queue"""
+
+        def put(item):
+            # Blocks while the detector is behind; gives up if the consumer stopped
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        keyframes = self.iter_keyframes(path, stats)
+        try:
+            batch = []
+            for keyframe in keyframes:
+                batch.append(keyframe)
+                if len(batch) == self.batch_size:
+                    if not put(batch):
+                        return
+                    batch = []
+            if batch and not put(batch):
+                return
+            put(_END)
+        except Exception as e:
+            put(e)
+        finally:
+            # Releases the capture when the consumer stopped early
+            keyframes.close()
+
+    def analyze(self, path: str, detect_batch: Callable[[List[np.ndarray]], List[Dict]]) -> Dict:
+        """
+        Build an object timeline for a clip
+
+        Args:
+            path: Video file path
+            detect_batch: Detector called with a list of BGR keyframes,
+                returning one result dict with 'detections' per frame
+
+        Returns:
+            Dict with the deduplicated 'timeline', 'object_counts', per-keyframe
+            summaries and decode/inference statistics
+        """
+        start_time = time.time()
+        stats = {'fps': 0.0, 'frames_read': 0, 'frames_sampled': 0, 'duration': 0.0}
+        batches = queue.Queue(maxsize=self.queue_batches)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(path, batches, stop, stats),
+                                    name='video-decode', daemon=True)
+        producer.start()
+
+        timeline = _Timeline(self.merge_gap)
+        keyframes = []
+        inference_time = 0.0
+        try:
+            while True:
+                item = batches.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                inference_start = time.time()
+                results = detect_batch([frame for _, _, frame in item])
+                inference_time += time.time() - inference_start
+
+                for (timestamp, score, _), result in zip(item, results):
+                    timeline.add(timestamp, result['detections'])
+                    keyframes.append({
+                        'time': round(timestamp, 3),
+                        'scene_score': round(score, 4),
+                        'num_detections': len(result['detections']),
+                    })
+        finally:
+            stop.set()
+            producer.join()
+
+        processing_time = time.time() - start_time
+        metrics.observe('visual.video.seconds', processing_time)
+        metrics.observe('visual.video.keyframes', len(keyframes))
+
+        entries = timeline.entries()
+        object_counts: Dict[str, int] = {}
+        for entry in entries:
+            object_counts[entry['name']] = object_counts.get(entry['name'], 0) + 1
+
+        return {
+            'timeline': entries,
+            'object_counts': object_counts,
+            'keyframes': keyframes,
+            'num_keyframes': len(keyframes),
+            'duration': round(stats['duration'], 3),
+            'fps': stats['fps'],
+            'frames_decoded': stats['frames_read'],
+            'frames_sampled': stats['frames_sampled'],
+            'inference_time': inference_time,
+            'processing_time': processing_time,
+        }
+
+
+class _Timeline:
+    """Merge per-keyframe detections into one entry per object sighting"""
+
+    # Max normalized distance between box centers for the same object in consecutive keyframes
+    MATCH_DISTANCE = 0.25
+
+    def __init__(self, merge_gap: float):
+        self.merge_gap = merge_gap
+        self._entries: List[Dict] = []
+
+    def add(self, timestamp: float, detections: List[Dict]):
+        matched = set()
+        for detection in sorted(detections, key=lambda d: -d['confidence']):
+            bounds = detection['bounds']
+            center = (bounds['x'] + bounds['width'] / 2, bounds['y'] + bounds['height'] / 2)
+
+            best, best_distance = None, self.MATCH_DISTANCE
+            for i, entry in enumerate(self._entries):
+                if (i in matched or entry['name'] != detection['name']
+                        or timestamp - entry['last_seen'] > self.merge_gap):
+                    continue
+                distance = ((entry['_center'][0] - center[0]) ** 2 + (entry['_center'][1] - center[1]) ** 2) ** 0.5
+                if distance <= best_distance:
+                    best, best_distance = i, distance
+
+            place = locate(bounds)
+            if best is None:
+                best = len(self._entries)
+                self._entries.append({
+                    'name': detection['name'],
+                    'first_seen': timestamp,
+                    'last_seen': timestamp,
+                    'confidence': detection['confidence'],
+                    'sightings': 0,
+                    'closest': place['distance'],
+                })
+            entry = self._entries[best]
+            matched.add(best)
+
+            entry['last_seen'] = timestamp
+            entry['sightings'] += 1
+            entry['confidence'] = max(entry['confidence'], detection['confidence'])
+            entry['position'] = place['position']
+            entry['distance'] = place['distance']
+            if place['distance'] == 'near' or (place['distance'] == 'mid' and entry['closest'] == 'far'):
+                entry['closest'] = place['distance']
+            entry['_center'] = center
+
+    def entries(self) -> List[Dict]:
+        return [
+            {
+                **{key: value for key, value in entry.items() if not key.startswith('_')},
+                'first_seen': round(entry['first_seen'], 3),
+                'last_seen': round(entry['last_seen'], 3),
+            }
+            for entry in sorted(self._entries, key=lambda entry: entry['first_seen'])
+        ]
+
+
+# Global analyzer instance
+_video_analyzer = None
+
+def get_video_analyzer() -> VideoAnalyzer:
+    """Get or create the global video analyzer"""
+    global _video_analyzer
+
+    if _video_analyzer is None:
+        _video_analyzer = VideoAnalyzer.from_settings()
+
+    return _video_analyzer
@@ -0,0 +1,153 @@
+"""
+Voice activity detection over decoded audio buffers.
+
+webrtcvad classifies 30 ms frames of the 16 kHz buffer; speech frames are
+widened by a padding margin and merged into regions. SpeechTrim keeps only
+those regions for the recognizer and maps times in the trimmed audio back to
+the original recording, so word timestamps still line up.
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+import webrtcvad
+from django.conf import settings
+
+FRAME_MS = 30
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end (exclusive) indexes of the True runs in mask"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return edges[0::2], edges[1::2]
+
+
+def speech_regions(samples: np.ndarray, sample_rate: int = 16000, vad_mode: int = 2,
+                   padding_ms: int = 300, min_gap_ms: int = 300,
+                   min_speech_ms: int = 150) -> List[Tuple[int, int]]:
+    """
+    Find speech in mono float32 audio
+
+    Args:
+        samples: Mono float32 samples in [-1, 1]
+        sample_rate: 8, 16, 32 or 48 kHz (webrtcvad rates)
+        vad_mode: webrtcvad aggressiveness, 0 (least) to 3 (most)
+        padding_ms: Audio kept on both sides of detected speech
+        min_gap_ms: Silences shorter than this are kept inside a region
+        min_speech_ms: Shorter bursts of voiced frames are ignored
+
+    Returns:
+        (start, end) sample ranges of speech, sorted and non-overlapping
+    """
+    frame_length = sample_rate * FRAME_MS // 1000
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return []
+
+    vad = webrtcvad.Vad(vad_mode)
+    pcm = (np.clip(samples[:frame_count * frame_length], -1.0, 1.0) * 32767).astype('<i2').tobytes()
+    frame_bytes = frame_length * 2
+    voiced = np.fromiter(
+        (vad.is_speech(pcm[i * frame_bytes:(i + 1) * frame_bytes], sample_rate) for i in range(frame_count)),
+        dtype=bool, count=frame_count,
+    )
+
+    # Drop clicks (and webrtcvad's first frames while it adapts)
+    min_speech = max(1, min_speech_ms // FRAME_MS)
+    for start, end in zip(*_runs(voiced)):
+        if end - start < min_speech:
+            voiced[start:end] = False
+    if not voiced.any():
+        return []
+
+    # Widen speech by the padding margin, then close short gaps
+    pad = padding_ms // FRAME_MS
+    if pad:
+        voiced = np.convolve(voiced, np.ones(2 * pad + 1), mode='same') > 0
+    starts, ends = _runs(voiced)
+
+    regions = []
+    min_gap = min_gap_ms // FRAME_MS
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    last = len(samples)
+    return [(int(start) * frame_length, min(last, int(end) * frame_length)) for start, end in regions]
+
+
+def configured_speech_regions(samples: np.ndarray, sample_rate: int = 16000) -> List[Tuple[int, int]]:
+    """speech_regions() with the VAD options from SPEECH_TO_TEXT"""
+    config = getattr(settings, 'SPEECH_TO_TEXT', {})
+    return speech_regions(
+        samples,
+        sample_rate,
+        vad_mode=config.get('VAD_MODE', 2),
+        padding_ms=config.get('VAD_PADDING_MS', 300),
+        min_gap_ms=config.get('VAD_MIN_GAP_MS', 300),
+        min_speech_ms=config.get('VAD_MIN_SPEECH_MS', 150),
+    )
+
+
+class SpeechTrim:
+    """
+    Audio with non-speech removed, plus the offset map back to the original
+
+    Args:
+        samples: Original mono samples
+        regions: Speech (start, end) sample ranges to keep
+        sample_rate: Sample rate of samples
+    """
+
+    def __init__(self, samples: np.ndarray, regions: List[Tuple[int, int]], sample_rate: int):
+        self.sample_rate = sample_rate
+        self.original_duration = len(samples) / float(sample_rate)
+        self.regions = regions
+        self.samples = np.concatenate([samples[start:end] for start, end in regions]) if regions else samples[:0]
+
+        # Region i starts at trimmed_starts[i] in the trimmed audio and at
+        # regions[i][0] in the original
+        lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+        self._trimmed_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if regions else np.zeros(0, np.int64)
+        self._original_starts = np.array([start for start, _ in regions], dtype=np.int64)
+
+    @classmethod
+    def from_settings(cls, samples: np.ndarray, sample_rate: int = 16000) -> 'SpeechTrim':
+        return cls(samples, configured_speech_regions(samples, sample_rate), sample_rate)
+
+    @property
+    def speech_duration(self) -> float:
+        return len(self.samples) / float(self.sample_rate)
+
+    @property
+    def removed_ratio(self) -> float:
+        """Fraction of the original audio that was dropped"""
+        if not self.original_duration:
+            return 0.0
+        return 1.0 - self.speech_duration / self.original_duration
+
+    def to_original(self, seconds: float, is_end: bool = False) -> float:
+        """
+        Map a time in the trimmed audio to the original recording
+
+        A time exactly on a region boundary maps to the end of the earlier
+        region when is_end is set, else to the start of the later one.
+        """
+        if not self.regions:
+            return seconds
+        position = int(round(seconds * self.sample_rate))
+        side = 'left' if is_end else 'right'
+        index = max(0, int(np.searchsorted(self._trimmed_starts, position, side=side)) - 1)
+        return float(self._original_starts[index] + position - self._trimmed_starts[index]) / self.sample_rate
+
+    def map_words(self, words: List[Dict]) -> List[Dict]:
+        """Copy of word timestamps shifted onto the original timeline"""
+        return [
+            dict(
+                word,
+                start=round(self.to_original(word['start']), 3),
+                end=round(self.to_original(word['end'], is_end=True), 3),
+            )
+            for word in words
+        ]
@@ -0,0 +1,204 @@
+"""
+Volume level, peak and consistency of a recording.
+
+One streaming pass over the audio blocks (VolumeAnalyzer.feed) measures:
+
+- the average level: energy mean over the whole recording (LEQ)
+- the true peak: sample peak of the signal oversampled 4x with a short cached
+  interpolation filter (as in ITU-R BS.1770), which catches inter-sample
+  peaks that clip after conversion
+- consistency: the standard deviation of FRAME_SECONDS frame levels in rolling
+  CONSISTENCY_WINDOW windows, averaged; frames below GATE_DBFS (pauses) are
+  left out
+
+Memory stays constant: only sums and the last window of frame levels are kept.
+Levels are in dBFS internally and calibrated to an estimated dB SPL like the
+noise analysis.
+"""
+import time
+from functools import lru_cache
+from typing import Dict
+
+import numpy as np
+from django.conf import settings
+from scipy.signal import firwin, upfirdn
+
+from .audio_decoding import Framer
+from .noise_analysis import DEFAULT_CALIBRATION_OFFSET, EPSILON
+
+TRUE_PEAK_OVERSAMPLING = 4
+TRUE_PEAK_TAPS = 48  # 12 per phase, as in BS.1770
+TRUE_PEAK_MAX_RATE = 96000  # Sample peaks are close enough above this rate
+CONSISTENCY_WINDOW_SECONDS = 3.0
+GATE_DBFS = -60.0
+
+# Mean rolling standard deviation (dB) up to which a recording gets each rating
+CONSISTENCY_LIMITS = (
+    (2.0, 'very_consistent'),
+    (4.0, 'consistent'),
+    (8.0, 'variable'),
+)
+
+
+@lru_cache(maxsize=4)
+def true_peak_kernel(factor: int) -> np.ndarray:
+    """Interpolation filter for oversampling by factor"""
+    kernel = (firwin(TRUE_PEAK_TAPS, 0.9 / factor) * factor).astype(np.float32)
+    kernel.setflags(write=False)
+    return kernel
+
+
+class TruePeakMeter:
+    """
+    Peak of a stream oversampled by factor
+
+    Args:
+        factor: Oversampling factor
+    """
+
+    def __init__(self, factor: int = TRUE_PEAK_OVERSAMPLING):
+        self.factor = factor
+        self.kernel = true_peak_kernel(factor)
+        # Input samples the filter reaches back
+        self._history_length = -(-(len(self.kernel) - 1) // factor)
+        self._history = np.zeros(0, dtype=np.float32)
+        self.peak = 0.0
+
+    def feed(self, block: np.ndarray):
+        samples = np.concatenate((self._history, block))
+        # Only outputs whose filter support lies fully inside samples; with
+        # the history carried over, consecutive blocks tile the stream
+        output = upfirdn(self.kernel, samples, self.factor)[len(self.kernel) - 1:len(samples) * self.factor]
+        if len(output):
+            self.peak = max(self.peak, float(np.abs(output).max()))
+        self._history = samples[-self._history_length:]
+
+
+def classify_consistency(rolling_std: float) -> str:
+    for limit, rating in CONSISTENCY_LIMITS:
+        if rolling_std <= limit:
+            return rating
+    return 'inconsistent'
+
+
+def volume_recommendations(average: float, true_peak_dbtp: float, consistency: str) -> str:
+    """Advice for a calibrated average level, the true peak in dBTP and the consistency rating"""
+    advice = []
+    if true_peak_dbtp > -1.0:
+        advice.append("The recording peaks at full scale and may be clipped; record with lower input gain.")
+    if average >= 85:
+        advice.append("Average volume is above 85 dB; long listening at this level can damage hearing.")
+    elif average < 40:
+        advice.append("Volume is very low; move the microphone closer to the source or raise the gain.")
+    if consistency in ('variable', 'inconsistent'):
+        advice.append("Volume varies a lot; a hearing aid or player compression setting will even it out.")
+    return " ".join(advice) or "Volume levels are within normal range."
+
+
+class VolumeAnalyzer:
+    """
+    Streaming average level, true peak and consistency
+
+    Args:
+        sample_rate: Sample rate of the blocks fed in
+        calibration_offset: dB SPL that corresponds to 0 dBFS
+        frame_seconds: Level frame length
+    """
+
+    def __init__(self, sample_rate: int, calibration_offset: float = DEFAULT_CALIBRATION_OFFSET,
+                 frame_seconds: float = 0.125):
+        self.sample_rate = sample_rate
+        self.calibration_offset = calibration_offset
+        self.framer = Framer(max(1, int(frame_seconds * sample_rate)))
+        self.window = max(2, int(round(CONSISTENCY_WINDOW_SECONDS / frame_seconds)))
+        self.true_peak = TruePeakMeter() if sample_rate < TRUE_PEAK_MAX_RATE else None
+
+        self._start_time = time.time()
+        self._sum_squares = 0.0
+        self._samples = 0
+        self._sample_peak = 0.0
+        self._max_level = -np.inf
+        self._active_frames = 0
+        self._level_tail = np.zeros(0)
+        self._std_sum = 0.0
+        self._windows = 0
+
+    @classmethod
+    def from_settings(cls, sample_rate: int, calibration_offset: float = None) -> 'VolumeAnalyzer':
+        config = getattr(settings, 'AUDIO_ANALYSIS', {})
+        if calibration_offset is None:
+            calibration_offset = config.get('CALIBRATION_OFFSET_DB', DEFAULT_CALIBRATION_OFFSET)
+        return cls(sample_rate, calibration_offset=calibration_offset,
+                   frame_seconds=config.get('FRAME_SECONDS', 0.125))
+
+    def feed(self, block: np.ndarray):
+        """Add a block of mono float samples"""
+        if not len(block):
+            return
+        self._sum_squares += float(np.dot(block, block))
+        self._samples += len(block)
+        self._sample_peak = max(self._sample_peak, float(np.abs(block).max()))
+        if self.true_peak is not None:
+            self.true_peak.feed(block)
+
+        frames = self.framer.push(block)
+        if not len(frames):
+            return
+        levels = 10 * np.log10(np.einsum('ij,ij->i', frames, frames) / frames.shape[1] + EPSILON)
+        self._max_level = max(self._max_level, float(levels.max()))
+        active = levels[levels > GATE_DBFS]
+        self._active_frames += len(active)
+
+        # Rolling standard deviation over every full window of active frames,
+        # continuing the windows that started in earlier blocks
+        levels = np.concatenate((self._level_tail, active))
+        if len(levels) >= self.window:
+            sums = np.concatenate(([0.0], np.cumsum(levels)))
+            squares = np.concatenate(([0.0], np.cumsum(levels ** 2)))
+            mean = (sums[self.window:] - sums[:-self.window]) / self.window
+            variance = (squares[self.window:] - squares[:-self.window]) / self.window - mean ** 2
+            self._std_sum += float(np.sqrt(np.maximum(variance, 0)).sum())
+            self._windows += len(variance)
+        self._level_tail = levels[-(self.window - 1):]
+
+    def result(self) -> Dict:
+        """
+        Summary after the last block
+
+        Returns:
+            Dict with 'average_volume' and 'peak_volume' (calibrated),
+            'volume_consistency', 'recommendations' and 'statistics'
+        """
+        true_peak = max(self.true_peak.peak if self.true_peak else 0.0, self._sample_peak)
+
+        offset = self.calibration_offset
+        average_dbfs = 10 * np.log10(self._sum_squares / max(self._samples, 1) + EPSILON)
+        true_peak_dbtp = 20 * np.log10(true_peak + EPSILON)
+        if self._windows:
+            rolling_std = self._std_sum / self._windows
+        elif len(self._level_tail) > 1:
+            # Shorter than one window: use what there is
+            rolling_std = float(self._level_tail.std())
+        else:
+            rolling_std = 0.0
+        consistency = classify_consistency(rolling_std)
+        average = round(float(average_dbfs + offset), 1)
+
+        return {
+            'average_volume': average,
+            'peak_volume': round(float(true_peak_dbtp + offset), 1),
+            'volume_consistency': consistency,
+            'recommendations': volume_recommendations(average, true_peak_dbtp, consistency),
+            'statistics': {
+                'average_dbfs': round(float(average_dbfs), 2),
+                'true_peak_dbtp': round(float(true_peak_dbtp), 2),
+                'sample_peak_dbfs': round(float(20 * np.log10(self._sample_peak + EPSILON)), 2),
+                'max_frame_level': round(float(self._max_level + offset), 1) if self._active_frames else None,
+                'rolling_std_db': round(rolling_std, 2),
+                'active_ratio': round(self._active_frames * self.framer.frame_length / max(self._samples, 1), 3),
+                'calibration_offset': offset,
+                'duration': round(self._samples / float(self.sample_rate), 3),
+                'sample_rate': self.sample_rate,
+                'processing_time': time.time() - self._start_time,
+            },
+        }
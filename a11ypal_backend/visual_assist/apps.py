@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class VisualAssistConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'visual_assist'
+
+    def ready(self):
+        from . import signals  # noqa: F401
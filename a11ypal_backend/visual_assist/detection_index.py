@@ -0,0 +1,121 @@
+"""
+Queryable index of stored detections.
+
+ObjectDetection.detected_objects is a JSON list, which cannot be filtered or
+aggregated in SQL. Every detection is also written as a DetectedObject row
+(class, confidence, normalized box, session, date) and counted in the
+DailyDetectionCount row for its day and class. Both are kept in step
+whenever detections are saved, rewritten or deleted (see signals.py), and
+can be rebuilt for older rows with the backfill_detection_index command.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import DailyDetectionCount, DetectedObject, ObjectDetection
+
+
+def _rows_for(record: ObjectDetection) -> List[DetectedObject]:
+    detected_at = record.created_at
+    date = timezone.localtime(detected_at).date()
+    rows = []
+    for detection in record.detected_objects or []:
+        bounds = detection.get('bounds') if isinstance(detection, dict) else None
+        if not bounds or 'name' not in detection:
+            continue  # Entries from older test endpoints carry no usable box
+        rows.append(DetectedObject(
+            detection=record,
+            user_id=record.user_id,
+            class_id=detection.get('class_id', -1),
+            class_name=detection['name'],
+            confidence=detection.get('confidence', 0.0),
+            x=bounds['x'],
+            y=bounds['y'],
+            width=bounds['width'],
+            height=bounds['height'],
+            session_key=record.session_key,
+            date=date,
+            detected_at=detected_at,
+        ))
+    return rows
+
+
+def _apply_deltas(deltas: Dict[Tuple, List]):
+    """Add (count, confidence sum) deltas to the daily counters"""
+    for (date, class_name, class_id), (count, confidence_sum) in deltas.items():
+        if not count:
+            continue
+        updated = DailyDetectionCount.objects.filter(date=date, class_name=class_name).update(
+            count=F('count') + count, confidence_sum=F('confidence_sum') + confidence_sum
+        )
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                DailyDetectionCount.objects.create(
+                    date=date, class_name=class_name, class_id=class_id,
+                    count=count, confidence_sum=confidence_sum,
+                )
+        except IntegrityError:
+            # Another writer created the counter first
+            DailyDetectionCount.objects.filter(date=date, class_name=class_name).update(
+                count=F('count') + count, confidence_sum=F('confidence_sum') + confidence_sum
+            )
+
+
+def _remove_rows(records: List[ObjectDetection], deltas: Dict[Tuple, List]):
+    """Delete the records' index rows, subtracting them in deltas"""
+    existing = DetectedObject.objects.filter(detection__in=records)
+    for old in existing.values('date', 'class_name', 'class_id').annotate(
+            count=Count('id'), confidence_sum=Sum('confidence')):
+        delta = deltas[(old['date'], old['class_name'], old['class_id'])]
+        delta[0] -= old['count']
+        delta[1] -= old['confidence_sum']
+    existing.delete()
+
+
+def index_detections(records: Iterable[ObjectDetection]) -> int:
+    """
+    Write (or rewrite) the index rows and daily counters for detection records
+
+    Safe to call again for the same records: their previous rows are removed
+    and subtracted from the counters first.
+
+    Returns:
+        Number of DetectedObject rows written
+    """
+    records = list(records)
+    if not records:
+        return 0
+
+    deltas = defaultdict(lambda: [0, 0.0])
+    with transaction.atomic():
+        _remove_rows(records, deltas)
+
+        rows = [row for record in records for row in _rows_for(record)]
+        DetectedObject.objects.bulk_create(rows)
+        for row in rows:
+            delta = deltas[(row.date, row.class_name, row.class_id)]
+            delta[0] += 1
+            delta[1] += row.confidence
+
+        _apply_deltas(deltas)
+    return len(rows)
+
+
+def unindex_detections(records: Iterable[ObjectDetection]):
+    """
+    Remove the index rows of detection records and subtract them from the
+    daily counters (called before the records are deleted)
+    """
+    records = list(records)
+    if not records:
+        return
+
+    deltas = defaultdict(lambda: [0, 0.0])
+    with transaction.atomic():
+        _remove_rows(records, deltas)
+        _apply_deltas(deltas)
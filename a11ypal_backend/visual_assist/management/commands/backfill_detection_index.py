@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from visual_assist.detection_index import index_detections
+from visual_assist.models import ObjectDetection
+
+
+class Command(BaseCommand):
+    help = "Build DetectedObject rows and daily per-class counters for stored detections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Detection records per transaction')
+        parser.add_argument('--start-pk', type=int, default=0, help='Resume after this ObjectDetection id')
+
+    def handle(self, *args, **options):
+        last_pk = options['start_pk']
+        records = rows = 0
+        while True:
+            chunk = list(
+                ObjectDetection.objects.filter(pk__gt=last_pk).order_by('pk')[:options['chunk_size']]
+            )
+            if not chunk:
+                break
+            rows += index_detections(chunk)
+            records += len(chunk)
+            last_pk = chunk[-1].pk
+            self.stdout.write(f"Indexed through id {last_pk}: {records} records, {rows} objects")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {records} records, {rows} objects indexed"))
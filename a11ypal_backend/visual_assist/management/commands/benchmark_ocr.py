@@ -0,0 +1,60 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from services.image_decoding import decode_image
+from services.ocr_service import OCRService
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'}
+
+
+class Command(BaseCommand):
+    help = "Compare full-frame OCR with region-gated OCR on sample images"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Image files or directories of images')
+        parser.add_argument('--backend', help='OCR backend name or dotted path (default: settings.OCR)')
+        parser.add_argument('--language', default='en')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per image and mode')
+
+    def handle(self, *args, **options):
+        images = []
+        for path in map(Path, options['paths']):
+            if path.is_dir():
+                images.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES))
+            elif path.is_file():
+                images.append(path)
+        if not images:
+            raise CommandError("No images found")
+
+        service = OCRService.from_settings()
+        if options['backend']:
+            service.backend_name = options['backend']
+
+        totals = {'full': 0.0, 'regions': 0.0}
+        self.stdout.write(f"{'image':40} {'full (s)':>10} {'regions (s)':>12} {'speedup':>8} {'words':>11}")
+        for path in images:
+            image = decode_image(path.read_bytes())
+            timings = {}
+            words = {}
+            for mode, use_regions in (('full', False), ('regions', True)):
+                # First run warms the backend and the process pool
+                service.extract_text(image, options['language'], use_regions=use_regions)
+                start_time = time.perf_counter()
+                for _ in range(options['repeat']):
+                    result = service.extract_text(image, options['language'], use_regions=use_regions)
+                timings[mode] = (time.perf_counter() - start_time) / options['repeat']
+                words[mode] = len(result['bounding_boxes'])
+                totals[mode] += timings[mode]
+
+            self.stdout.write(
+                f"{path.name[:40]:40} {timings['full']:10.3f} {timings['regions']:12.3f} "
+                f"{timings['full'] / max(timings['regions'], 1e-9):7.1f}x "
+                f"{words['full']:5}/{words['regions']:<5}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: full {totals['full']:.3f}s, regions {totals['regions']:.3f}s "
+            f"({totals['full'] / max(totals['regions'], 1e-9):.1f}x)"
+        ))
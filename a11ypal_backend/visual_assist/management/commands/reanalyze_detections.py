@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from services.object_detection_service import get_object_detection_service
+from visual_assist.reanalysis import TARGETS, ReanalysisJob
+
+
+class Command(BaseCommand):
+    help = "Re-run object detection over stored images after a weights change (resumable)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', default='reanalysis',
+                            help='Checkpoint name; use a new name for each weights change')
+        parser.add_argument('--target', choices=sorted(TARGETS), action='append',
+                            help='Table to process (repeatable; default: all)')
+        parser.add_argument('--chunk-size', type=int, default=64, help='Rows committed per checkpoint')
+        parser.add_argument('--batch-size', type=int, default=8, help='Images per detector call')
+        parser.add_argument('--cpu-share', type=float, default=0.25,
+                            help='Fraction of one CPU core to use (1.0 disables throttling)')
+        parser.add_argument('--reset', action='store_true', help='Start over instead of resuming')
+
+    def handle(self, *args, **options):
+        if not 0 < options['cpu_share'] <= 1:
+            raise CommandError("--cpu-share must be in (0, 1]")
+
+        try:
+            detector = get_object_detection_service()
+        except Exception as e:
+            raise CommandError(f"Detection service failed to load: {str(e)}")
+
+        job = ReanalysisJob(
+            detector.detect_objects_batch,
+            options['job'],
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            cpu_share=options['cpu_share'],
+            log=self.stdout.write,
+        )
+        checkpoints = job.run(options['target'] or sorted(TARGETS), reset=options['reset'])
+
+        for target, checkpoint in checkpoints.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{target}: {checkpoint.processed} updated, {checkpoint.failed} failed"
+            ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visual_assist', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imageanalysis',
+            name='analysis_type',
+            field=models.CharField(choices=[('object_detection', 'Object Detection'), ('text_recognition', 'Text Recognition'), ('scene_description', 'Scene Description'), ('color_analysis', 'Color Analysis'), ('face_detection', 'Face Detection'), ('multi_analysis', 'Multiple Analyses')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visual_assist', '0002_image_analysis_multi'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReanalysisCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_name', models.CharField(max_length=100)),
+                ('target', models.CharField(choices=[('object_detection', 'Object Detection'), ('image_analysis', 'Image Analysis')], max_length=20)),
+                ('last_pk', models.BigIntegerField(default=0)),
+                ('processed', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('completed', models.BooleanField(default=False)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('job_name', 'target')},
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visual_assist', '0003_reanalysis_checkpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='objectdetection',
+            name='session_key',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.CreateModel(
+            name='DailyDetectionCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('class_name', models.CharField(max_length=50)),
+                ('class_id', models.SmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('confidence_sum', models.FloatField(default=0.0)),
+            ],
+            options={
+                'unique_together': {('date', 'class_name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DetectedObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('class_id', models.SmallIntegerField()),
+                ('class_name', models.CharField(max_length=50)),
+                ('confidence', models.FloatField()),
+                ('x', models.FloatField()),
+                ('y', models.FloatField()),
+                ('width', models.FloatField()),
+                ('height', models.FloatField()),
+                ('session_key', models.CharField(blank=True, default='', max_length=100)),
+                ('date', models.DateField()),
+                ('detected_at', models.DateTimeField()),
+                ('detection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indexed_objects', to='visual_assist.objectdetection')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detected_objects', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['class_name', 'date'], name='visual_assi_class_n_8e7992_idx'), models.Index(fields=['user', 'date'], name='visual_assi_user_id_c6bca8_idx'), models.Index(fields=['session_key'], name='visual_assi_session_8a0064_idx')],
+            },
+        ),
+    ]
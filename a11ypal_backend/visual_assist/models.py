@@ -17,6 +17,7 @@ class ImageAnalysis(models.Model):
             ('scene_description', 'Scene Description'),
             ('color_analysis', 'Color Analysis'),
             ('face_detection', 'Face Detection'),
+            ('multi_analysis', 'Multiple Analyses'),
         ]
     )
     result = models.JSONField()
@@ -47,12 +48,55 @@ class ObjectDetection(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='object_detections')
     image = models.ImageField(upload_to='visual_assist/objects/')
     detected_objects = models.JSONField()  # List of detected objects with confidence scores
+    session_key = models.CharField(max_length=100, blank=True, default='')  # Camera session the frame came from
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Object Detection {self.id}"
 
 
+class DetectedObject(models.Model):
+    """One detection from ObjectDetection.detected_objects, as an indexed row"""
+    detection = models.ForeignKey(ObjectDetection, on_delete=models.CASCADE, related_name='indexed_objects')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='detected_objects')
+    class_id = models.SmallIntegerField()
+    class_name = models.CharField(max_length=50)
+    confidence = models.FloatField()
+    # Normalized box (0-1)
+    x = models.FloatField()
+    y = models.FloatField()
+    width = models.FloatField()
+    height = models.FloatField()
+    session_key = models.CharField(max_length=100, blank=True, default='')
+    date = models.DateField()
+    detected_at = models.DateTimeField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['class_name', 'date']),
+            models.Index(fields=['user', 'date']),
+            models.Index(fields=['session_key']),
+        ]
+    
+    def __str__(self):
+        return f"{self.class_name} ({self.confidence:.2f}) in detection {self.detection_id}"
+
+
+class DailyDetectionCount(models.Model):
+    """Detections per class per day, kept in step with DetectedObject"""
+    date = models.DateField()
+    class_name = models.CharField(max_length=50)
+    class_id = models.SmallIntegerField()
+    count = models.IntegerField(default=0)
+    confidence_sum = models.FloatField(default=0.0)  # For average confidence
+    
+    class Meta:
+        unique_together = ['date', 'class_name']
+    
+    def __str__(self):
+        return f"{self.date} - {self.class_name}: {self.count}"
+
+
 class SceneDescription(models.Model):
     """Store AI-generated scene descriptions"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scene_descriptions')
@@ -104,4 +148,28 @@ class VisualAssistSession(models.Model):
     session_data = models.JSONField(default=dict)
     
     def __str__(self):
-        return f"Visual Session {self.id} - {self.user.username}"
\ No newline at end of file
+        return f"Visual Session {self.id} - {self.user.username}"
+
+
+class ReanalysisCheckpoint(models.Model):
+    """Progress of a resumable detection re-analysis job over one table"""
+    job_name = models.CharField(max_length=100)
+    target = models.CharField(
+        max_length=20,
+        choices=[
+            ('object_detection', 'Object Detection'),
+            ('image_analysis', 'Image Analysis'),
+        ]
+    )
+    last_pk = models.BigIntegerField(default=0)  # Highest primary key already processed
+    processed = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['job_name', 'target']
+    
+    def __str__(self):
+        return f"Reanalysis {self.job_name} - {self.target} @ {self.last_pk}"
@@ -0,0 +1,191 @@
+"""
+Resumable re-inference of stored detections.
+
+After the detector weights change, stored ObjectDetection.detected_objects
+and the object results inside ImageAnalysis.result are stale. The job walks
+each table in primary-key order, one chunk at a time, runs the stored images
+through the detector in batches and writes each chunk back with
+bulk_update() in the same transaction that advances its checkpoint. A
+restarted job continues after the last committed chunk. Once a chunk is
+committed, the content-hash detection cache entries of its images are
+dropped, so uploads of the same images are not answered with old results.
+
+The job throttles itself to a share of one CPU core so it can run next to
+live traffic.
+"""
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.db import transaction
+
+from services.attribute_classifiers import get_attribute_cascade
+from services.color_analysis_service import image_content_hash
+from services.frame_gates import forget_image_detections
+from services.image_decoding import decode_image
+from services.metrics import metrics
+from services.object_detection_service import format_detections
+from .detection_index import index_detections
+from .models import ImageAnalysis, ObjectDetection, ReanalysisCheckpoint
+
+logger = logging.getLogger(__name__)
+
+
+class CPUThrottle:
+    """
+    Keep process CPU time at or below a share of wall-clock time
+
+    Call pause() between units of work; it sleeps until the CPU time used
+    since start, divided by the share, has elapsed.
+    """
+
+    def __init__(self, share: float):
+        self.share = share
+        self._cpu_start = time.process_time()
+        self._wall_start = time.monotonic()
+        self.slept = 0.0
+
+    def pause(self):
+        if self.share >= 1.0:
+            return
+        cpu = time.process_time() - self._cpu_start
+        wall = time.monotonic() - self._wall_start
+        delay = cpu / self.share - wall
+        if delay > 0:
+            time.sleep(delay)
+            self.slept += delay
+
+
+def _needs_objects(record: ImageAnalysis) -> bool:
+    if record.analysis_type == 'object_detection':
+        return True
+    return isinstance(record.result, dict) and 'objects' in record.result.get('analyses', {})
+
+
+def _apply_object_detection(record: ObjectDetection, detection_result: Dict, image_shape: Tuple[int, ...]):
+    record.detected_objects = detection_result['detections']
+
+
+def _apply_image_analysis(record: ImageAnalysis, detection_result: Dict, image_shape: Tuple[int, ...]):
+    result = record.result if isinstance(record.result, dict) and 'analyses' in record.result else {
+        # Rows from before the analysis pipeline
+        'analyses': {}, 'errors': {}, 'timings': {},
+        'image_size': {'width': image_shape[1], 'height': image_shape[0]},
+    }
+    result['analyses']['objects'] = {
+        **detection_result,
+        'detections': format_detections(detection_result['detections'], image_shape),
+    }
+    result.get('errors', {}).pop('objects', None)
+    record.result = result
+
+
+# target -> (model, updated field, row filter, apply function, after-update hook)
+TARGETS = {
+    'object_detection': (ObjectDetection, 'detected_objects', None, _apply_object_detection, index_detections),
+    'image_analysis': (ImageAnalysis, 'result', _needs_objects, _apply_image_analysis, None),
+}
+
+
+class ReanalysisJob:
+    """
+    Re-run the detector over stored images, resumably
+
+    Args:
+        detect_batch: Detector called with a list of BGR images, returning
+            one result dict with 'detections' per image
+        job_name: Checkpoint name; use a new one per weights change
+        chunk_size: Rows loaded and committed together
+        batch_size: Images per detector call
+        cpu_share: Fraction of one CPU core the job may use (1.0 = unthrottled)
+        log: Optional callable receiving progress lines
+    """
+
+    def __init__(self, detect_batch: Callable[[List[np.ndarray]], List[Dict]], job_name: str,
+                 chunk_size: int = 64, batch_size: int = 8, cpu_share: float = 0.25,
+                 log: Optional[Callable[[str], None]] = None):
+        self.detect_batch = detect_batch
+        self.job_name = job_name
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.throttle = CPUThrottle(cpu_share)
+        self.log = log or logger.info
+
+    def run(self, targets: List[str], reset: bool = False) -> Dict[str, ReanalysisCheckpoint]:
+        """Process each target table to completion; returns the final checkpoints"""
+        return {target: self.run_target(target, reset) for target in targets}
+
+    def run_target(self, target: str, reset: bool = False) -> ReanalysisCheckpoint:
+        model, field, row_filter, apply, after_update = TARGETS[target]
+        checkpoint, _ = ReanalysisCheckpoint.objects.get_or_create(job_name=self.job_name, target=target)
+        if reset:
+            checkpoint.last_pk = checkpoint.processed = checkpoint.failed = 0
+            checkpoint.completed = False
+            checkpoint.save()
+        if checkpoint.completed:
+            self.log(f"{target}: already completed (last pk {checkpoint.last_pk})")
+            return checkpoint
+
+        while True:
+            chunk = list(model.objects.filter(pk__gt=checkpoint.last_pk).order_by('pk')[:self.chunk_size])
+            if not chunk:
+                checkpoint.completed = True
+                checkpoint.save(update_fields=['completed', 'updated_at'])
+                self.log(f"{target}: done, {checkpoint.processed} updated, {checkpoint.failed} failed")
+                return checkpoint
+
+            rows = [record for record in chunk if row_filter is None or row_filter(record)]
+            updated, failed, image_hashes = self._process(rows, apply)
+
+            # Results and progress commit together, so a restart never redoes or skips a chunk
+            with transaction.atomic():
+                if updated:
+                    model.objects.bulk_update(updated, [field])
+                    if after_update:
+                        after_update(updated)
+                checkpoint.last_pk = chunk[-1].pk
+                checkpoint.processed += len(updated)
+                checkpoint.failed += failed
+                checkpoint.save()
+            forget_image_detections(image_hashes)
+
+            metrics.increment('visual.reanalysis.updated', len(updated))
+            metrics.increment('visual.reanalysis.failed', failed)
+            self.log(f"{target}: through pk {checkpoint.last_pk}, {checkpoint.processed} updated, "
+                     f"{checkpoint.failed} failed, throttled {self.throttle.slept:.1f}s")
+
+    def _load(self, record) -> Optional[Tuple[np.ndarray, str]]:
+        """Decoded image and content hash of a record's stored file"""
+        try:
+            with record.image.open('rb') as image_file:
+                data = image_file.read()
+            return decode_image(data), image_content_hash(data)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Reanalysis skipped {record._meta.model_name} {record.pk}: {str(e)}")
+            return None
+
+    def _process(self, rows: List, apply: Callable) -> Tuple[List, int, List[str]]:
+        updated = []
+        failed = 0
+        image_hashes = []
+        for start in range(0, len(rows), self.batch_size):
+            batch = []
+            for record in rows[start:start + self.batch_size]:
+                loaded = self._load(record)
+                if loaded is None:
+                    failed += 1
+                else:
+                    batch.append((record, loaded[0]))
+                    image_hashes.append(loaded[1])
+            if not batch:
+                continue
+
+            results = self.detect_batch([image for _, image in batch])
+            for (record, image), detection_result in zip(batch, results):
+                get_attribute_cascade().annotate(image, detection_result['detections'])
+                apply(record, detection_result, image.shape)
+                updated.append(record)
+
+            self.throttle.pause()
+        return updated, failed, image_hashes
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from services.image_pipeline import STAGES
 from .models import (
     ImageAnalysis, TextRecognition, ObjectDetection, 
     SceneDescription, ColorAnalysis, VisualAssistSession
@@ -90,6 +91,14 @@ class VisualAssistSessionSerializer(serializers.ModelSerializer):
 
 
 class ImageAnalysisCreateSerializer(serializers.Serializer):
+    # Single-analysis types and the pipeline stage that serves each
+    ANALYSIS_STAGES = {
+        'object_detection': 'objects',
+        'text_recognition': 'text',
+        'scene_description': 'scene',
+        'color_analysis': 'colors',
+    }
+    
     image = serializers.ImageField()
     analysis_type = serializers.ChoiceField(choices=[
         ('object_detection', 'Object Detection'),
@@ -97,9 +106,37 @@ class ImageAnalysisCreateSerializer(serializers.Serializer):
         ('scene_description', 'Scene Description'),
         ('color_analysis', 'Color Analysis'),
         ('face_detection', 'Face Detection'),
-    ])
+    ], required=False)
+    analyses = serializers.ListField(child=serializers.CharField(), required=False)
+    
+    def validate_analyses(self, value):
+        # Multipart clients may send one comma-separated value
+        names = [name.strip() for item in value for name in item.split(',') if name.strip()]
+        unknown = [name for name in names if name not in STAGES]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown analyses: {', '.join(unknown)}. Available: {', '.join(sorted(STAGES))}"
+            )
+        return list(dict.fromkeys(names))
+    
+    def validate(self, attrs):
+        analyses = attrs.get('analyses')
+        analysis_type = attrs.get('analysis_type')
+        if analyses:
+            attrs['analysis_type'] = 'multi_analysis' if len(analyses) > 1 else next(
+                (kind for kind, stage in self.ANALYSIS_STAGES.items() if stage == analyses[0]),
+                'multi_analysis'
+            )
+        elif analysis_type:
+            if analysis_type not in self.ANALYSIS_STAGES:
+                raise serializers.ValidationError({'analysis_type': f"{analysis_type} is not supported yet"})
+            attrs['analyses'] = [self.ANALYSIS_STAGES[analysis_type]]
+        else:
+            raise serializers.ValidationError("Provide analysis_type or analyses")
+        return attrs
     
     def create(self, validated_data):
         user = self.context['request'].user
         validated_data['user'] = user
+        validated_data.pop('analyses', None)
         return ImageAnalysis.objects.create(**validated_data)
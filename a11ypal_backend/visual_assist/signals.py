@@ -0,0 +1,24 @@
+"""
+Keep the detection index in step with ObjectDetection rows.
+
+Rows are indexed whenever they are saved, whatever the path (views, the REST
+list endpoint, the admin), and un-indexed before they are deleted, directly,
+through a queryset, or by cascade from their user. Writes that bypass
+signals (bulk_update in the re-analysis job) index their rows themselves.
+"""
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from .detection_index import index_detections, unindex_detections
+from .models import ObjectDetection
+
+
+@receiver(post_save, sender=ObjectDetection)
+def index_saved_detection(sender, instance, raw=False, **kwargs):
+    if not raw:  # Fixtures are loaded without their derived rows
+        index_detections([instance])
+
+
+@receiver(pre_delete, sender=ObjectDetection)
+def unindex_deleted_detection(sender, instance, **kwargs):
+    unindex_detections([instance])
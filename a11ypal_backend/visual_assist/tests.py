@@ -1,3 +1,743 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from services.attribute_classifiers import AttributeCascade, AttributeClassifier, TrafficLightClassifier
+from services.batching import MicroBatcher
+from services.code_scanner import CodeScanner
+from services.color_analysis_service import ColorAnalysisService, image_content_hash
+from services.frame_gates import (
+    FrameQualityGate, MotionGate, frame_session_key, get_image_detections, store_image_detections
+)
+from services.metrics import metrics
+from services.ocr_service import OCRBackend, OCRService
+from services.image_pipeline import DecodedImage, run_analyses
+from services.scene_description import describe_detections
+from services.tensor_pool import LETTERBOX_FILL, TensorPool
+from services.video_analysis import VideoAnalyzer
+from .detection_index import index_detections
+from .models import DailyDetectionCount, DetectedObject, ImageAnalysis, ObjectDetection, ReanalysisCheckpoint
+from .reanalysis import ReanalysisJob
+from .views import ObjectDetectionListView, detect_objects_realtime, scan_codes
+
+
+class TensorPoolTests(SimpleTestCase):
+    """Preallocated detector buffers"""
+
+    def setUp(self):
+        self.pool = TensorPool()
+        self.frame = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+
+    def test_letterbox_geometry(self):
+        with self.pool.acquire((640, 640)) as buffers:
+            tensor = buffers.letterbox_into(self.frame)
+
+            self.assertEqual(tensor.shape, (1, 3, 640, 640))
+            self.assertEqual(tensor.dtype, np.float32)
+            self.assertEqual(buffers.pad, (0, 140))
+            # Padding rows keep the letterbox fill value
+            self.assertTrue(np.all(buffers.letterbox[:140] == LETTERBOX_FILL))
+            self.assertAlmostEqual(float(tensor.max()), float(buffers.letterbox.max()) / 255, places=5)
+
+            boxes = np.array([[0, 140, 640, 500]], dtype=np.float32)
+            restored = buffers.unletterbox_boxes(boxes, self.frame.shape)
+            np.testing.assert_allclose(restored[0], [0, 0, 1280, 720], atol=1)
+
+    def test_buffers_are_reused(self):
+        with self.pool.acquire((640, 640)) as first:
+            pass
+        with self.pool.acquire((640, 640)) as second:
+            pass
+        self.assertIs(first, second)
+
+    def test_no_allocations_after_warm_up(self):
+        def run_once():
+            with self.pool.acquire((640, 640)) as buffers:
+                buffers.letterbox_into(self.frame)
+                buffers.unletterbox_boxes(np.zeros((20, 4), dtype=np.float32), self.frame.shape)
+
+        run_once()
+        tracemalloc.start()
+        try:
+            run_once()
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            for _ in range(20):
+                run_once()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # A fresh 640x640 float tensor alone would be ~4.9 MB
+        self.assertLess(peak - baseline, 64 * 1024)
+
+
+class SceneDescriptionTests(SimpleTestCase):
+    """Descriptions built from detections"""
+
+    def detection(self, name, x, y, width, height, confidence=0.8):
+        return {'name': name, 'confidence': confidence,
+                'bounds': {'x': x, 'y': y, 'width': width, 'height': height}}
+
+    def test_counts_and_layout(self):
+        detections = [
+            self.detection('person', 0.05, 0.2, 0.2, 0.7),
+            self.detection('person', 0.1, 0.3, 0.1, 0.3),
+            self.detection('car', 0.8, 0.5, 0.1, 0.1, confidence=0.6),
+        ]
+        colors = {'dominant_colors': [{'color': '#808080', 'percentage': 60.0},
+                                      {'color': '#FFFFFF', 'percentage': 30.0}]}
+
+        scene = describe_detections(detections, colors)
+
+        self.assertEqual(scene['object_counts'], {'person': 2, 'car': 1})
+        self.assertTrue(scene['description'].startswith('I can see 2 people and a car.'))
+        self.assertIn('A person is close on your left.', scene['description'])
+        self.assertIn('A car is far away on your right.', scene['description'])
+        self.assertIn('mostly gray and white', scene['description'])
+        self.assertEqual(scene['tags'], ['person', 'car', 'gray', 'white'])
+        self.assertAlmostEqual(scene['confidence'], 2.2 / 3)
+
+    def test_empty_scene(self):
+        self.assertEqual(describe_detections([])['description'], 'No objects detected.')
+
+    def test_generation_stays_under_a_millisecond(self):
+        detections = [self.detection('chair', i / 25, 0.4, 0.04, 0.1) for i in range(25)]
+        describe_detections(detections)
+        best = min(describe_detections(detections)['generation_time'] for _ in range(20))
+        self.assertLess(best, 0.001)
+
+
+class ImagePipelineTests(SimpleTestCase):
+    """Stages over one decoded image"""
+
+    def setUp(self):
+        image = np.random.default_rng(0).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+        self.decoded = DecodedImage(cv2.imencode('.png', image)[1].tobytes())
+        self.addCleanup(cache.delete, f'detections:image:{self.decoded.content_hash}')
+
+    def test_detector_failure_is_reported_and_not_cached(self):
+        detector = mock.Mock()
+        detector.detect_objects.return_value = {'error': 'model missing', 'detections': [], 'num_detections': 0}
+        with mock.patch('services.image_pipeline.get_object_detection_service', return_value=detector):
+            pipeline = run_analyses(self.decoded, ['objects'])
+
+        self.assertEqual(pipeline['results'], {})
+        self.assertEqual(pipeline['errors'], {'objects': 'model missing'})
+        self.assertIsNone(get_image_detections(self.decoded.content_hash))
+
+    def test_shape_does_not_decode(self):
+        self.assertEqual(self.decoded.shape, (48, 64, 3))
+        self.assertIsNone(self.decoded._image)
+
+
+class MotionGateTests(SimpleTestCase):
+    """Per-session reuse of detections"""
+
+    def test_read_only_check_leaves_reuse_budget_alone(self):
+        gate = MotionGate(max_reuse=1)
+        frame = np.full((32, 32), 40, dtype=np.uint8)
+        self.addCleanup(cache.delete, gate._state_key('test'))
+        gate.update('test', frame)
+
+        self.assertTrue(gate.unchanged('test', frame))
+        self.assertTrue(gate.unchanged('test', frame))
+        self.assertFalse(gate.unchanged('test', 255 - frame))
+        self.assertTrue(gate.check('test', frame)['reuse'])
+        # The stream used its one reuse; a refresh is due for everyone
+        self.assertFalse(gate.unchanged('test', frame))
+
+
+class FrameQualityGateTests(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.gate = FrameQualityGate(blur_threshold=20.0, min_brightness=25.0)
+        self.sharp = np.random.default_rng(0).integers(0, 256, (120, 160), dtype=np.uint8)
+
+    def test_dark_and_blurry_frames_are_rejected(self):
+        dark = (self.sharp // 20).astype(np.uint8)
+        blurry = cv2.GaussianBlur(self.sharp, (31, 31), 10)
+        self.assertEqual(self.gate.check(dark)['reason'], 'too_dark')
+        self.assertEqual(self.gate.check(blurry)['reason'], 'blurry')
+        result = self.gate.check(self.sharp)
+        self.assertTrue(result['passed'])
+        self.assertIsNone(result['reason'])
+
+    def test_skip_rate(self):
+        for frame in (self.sharp, self.sharp, self.sharp, np.zeros_like(self.sharp)):
+            self.gate.check(frame)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['ratios']['detection.quality_gate.skip_rate'], 0.25)
+        self.assertEqual(snapshot['counters']['detection.quality_gate.skipped.too_dark'], 1)
+
+    def test_disabled_gate_passes_everything(self):
+        self.gate.enabled = False
+        self.assertTrue(self.gate.check(np.zeros_like(self.sharp))['passed'])
+
+
+class FrameSessionKeyTests(SimpleTestCase):
+    def request(self, user=None, session_id=None, address='10.0.0.1'):
+        return mock.Mock(
+            user=user or AnonymousUser(),
+            data={'session_id': session_id} if session_id is not None else {},
+            META={'REMOTE_ADDR': address},
+        )
+
+    def test_session_ids_are_scoped_to_the_caller(self):
+        alice, bob = mock.Mock(id=1, is_authenticated=True), mock.Mock(id=2, is_authenticated=True)
+        self.assertEqual(frame_session_key(self.request(alice, '1')), 'user:1:session:1')
+        self.assertNotEqual(frame_session_key(self.request(alice, '1')), frame_session_key(self.request(bob, '1')))
+        self.assertEqual(frame_session_key(self.request(alice)), 'user:1')
+
+    def test_anonymous_sessions_are_scoped_to_the_address(self):
+        self.assertEqual(frame_session_key(self.request(session_id='cam')), 'ip:10.0.0.1:session:cam')
+        self.assertNotEqual(frame_session_key(self.request(session_id='cam')),
+                            frame_session_key(self.request(session_id='cam', address='10.0.0.2')))
+
+
+class ColorAnalysisTests(SimpleTestCase):
+    """Dominant colors and contrast"""
+
+    def test_small_clusters_are_not_dominant(self):
+        image = np.full((100, 100, 3), 255, dtype=np.uint8)
+        image[:30] = (0, 0, 0)
+        image[:3, :] = (0, 0, 255)  # 3% red
+
+        analysis = ColorAnalysisService(clusters=3).analyze(image)
+
+        self.assertEqual([c['color'] for c in analysis['dominant_colors']], ['#FFFFFF', '#000000'])
+        self.assertEqual(analysis['accessibility_rating'], 'excellent')
+
+    def test_palettes_are_reproducible_across_threads(self):
+        image = np.random.default_rng(1).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+        service = ColorAnalysisService()
+        expected = service.analyze(image)
+
+        results = [None] * 8
+
+        def analyze(i):
+            cv2.setRNGSeed(i)  # Other code using OpenCV's RNG must not matter
+            results[i] = service.analyze(image)
+
+        threads = [threading.Thread(target=analyze, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for result in results:
+            self.assertEqual(result['dominant_colors'], expected['dominant_colors'])
+            self.assertEqual(result['color_palette'], expected['color_palette'])
+
+
+def detection(name, confidence, class_id=0):
+    return {
+        'name': name, 'class_id': class_id, 'confidence': confidence,
+        'bounds': {'x': 0.1, 'y': 0.2, 'width': 0.3, 'height': 0.4},
+    }
+
+
+class DetectionIndexTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='indexer', password='pw')
+
+    def record(self, *detections):
+        return ObjectDetection.objects.create(
+            user=self.user, image='visual_assist/objects/frame.jpg', detected_objects=list(detections)
+        )
+
+    def counts(self):
+        return {
+            row.class_name: (row.count, round(row.confidence_sum, 6))
+            for row in DailyDetectionCount.objects.all()
+        }
+
+    def test_saving_indexes_and_reindexes(self):
+        record = self.record(detection('person', 0.9), detection('person', 0.5), detection('door', 0.7, 1))
+        self.assertEqual(DetectedObject.objects.count(), 3)
+        self.assertEqual(self.counts(), {'person': (2, 1.4), 'door': (1, 0.7)})
+
+        record.detected_objects = [detection('person', 0.8)]
+        record.save()
+        self.assertEqual(DetectedObject.objects.count(), 1)
+        self.assertEqual(self.counts(), {'person': (1, 0.8), 'door': (0, 0.0)})
+
+        # Rewriting without a change (as re-analysis does) is idempotent
+        self.assertEqual(index_detections([record]), 1)
+        self.assertEqual(self.counts(), {'person': (1, 0.8), 'door': (0, 0.0)})
+
+    def test_entries_without_a_box_are_skipped(self):
+        self.record(detection('cup', 0.6), {'name': 'legacy', 'confidence': 0.5})
+        self.assertEqual(DetectedObject.objects.count(), 1)
+
+    def test_deleting_a_record_updates_the_counters(self):
+        first, second = self.record(detection('car', 0.6)), self.record(detection('car', 0.8))
+
+        first.delete()
+        self.assertEqual(self.counts(), {'car': (1, 0.8)})
+        ObjectDetection.objects.all().delete()
+        self.assertEqual(self.counts(), {'car': (0, 0.0)})
+        self.assertFalse(DetectedObject.objects.exists())
+
+    def test_deleting_the_user_updates_the_counters(self):
+        other = get_user_model().objects.create_user(username='other', password='pw')
+        ObjectDetection.objects.create(
+            user=other, image='visual_assist/objects/kept.jpg', detected_objects=[detection('dog', 0.5)]
+        )
+        self.record(detection('dog', 0.9))
+
+        self.user.delete()
+        self.assertEqual(self.counts(), {'dog': (1, 0.5)})
+
+    def test_rows_created_through_the_api_are_counted_once(self):
+        factory = APIRequestFactory()
+        view = ObjectDetectionListView.as_view()
+        request = factory.post('/api/visual-assist/object-detection/', {
+            'image': frame_upload(),
+            'detected_objects': json.dumps([detection('bench', 0.6), detection('bench', 0.4)]),
+        }, format='multipart')
+        force_authenticate(request, self.user)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            response = view(request)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.counts(), {'bench': (2, 1.0)})
+
+        ObjectDetection.objects.get(pk=response.data['id']).delete()
+        self.assertEqual(self.counts(), {'bench': (0, 0.0)})
+
+    def test_backfill_builds_and_rebuilds_the_index(self):
+        # bulk_create sends no signals, like rows stored before the index existed
+        ObjectDetection.objects.bulk_create([
+            ObjectDetection(user=self.user, image='a.jpg', detected_objects=[detection('chair', 0.5)]),
+            ObjectDetection(user=self.user, image='b.jpg',
+                            detected_objects=[detection('chair', 0.7), detection('bottle', 0.4, 39)]),
+        ])
+        self.assertFalse(DetectedObject.objects.exists())
+
+        for _ in range(2):  # A second run must not double count
+            call_command('backfill_detection_index', chunk_size=1, stdout=io.StringIO())
+            self.assertEqual(DetectedObject.objects.count(), 3)
+            self.assertEqual(self.counts(), {'chair': (2, 1.2), 'bottle': (1, 0.4)})
+
+
+class FakeDetector:
+    """detect_objects_batch stand-in finding one cup per image; fails on call fail_on"""
+
+    def __init__(self, fail_on=None):
+        self.calls = 0
+        self.fail_on = fail_on
+
+    def detect_objects_batch(self, images):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise RuntimeError('worker killed')
+        return [{
+            'detections': [{
+                'name': 'cup', 'class_id': 41, 'confidence': 0.75,
+                'bounds': {'x': 0.25, 'y': 0.25, 'width': 0.5, 'height': 0.5, 'x1': 8, 'y1': 8, 'x2': 24, 'y2': 24},
+                'center': {'x': 16, 'y': 16},
+            }],
+            'num_detections': 1,
+        } for _ in images]
+
+
+class ReanalysisTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+
+        self.user = get_user_model().objects.create_user(username='reanalyst', password='pw')
+        self.records = [self.detection_record(shade) for shade in (40, 120, 200)]
+
+    def image_bytes(self, shade):
+        return cv2.imencode('.png', np.full((32, 32, 3), shade, dtype=np.uint8))[1].tobytes()
+
+    def detection_record(self, shade):
+        record = ObjectDetection(user=self.user, detected_objects=[detection('person', 0.4)])
+        record.image.save(f'frame{shade}.png', ContentFile(self.image_bytes(shade)), save=False)
+        record.save()
+        return record
+
+    def job(self, detector, name='weights-v2'):
+        return ReanalysisJob(detector.detect_objects_batch, name, chunk_size=1, batch_size=1,
+                             cpu_share=1.0, log=lambda line: None)
+
+    def test_interrupted_job_resumes_after_last_committed_chunk(self):
+        with self.assertRaises(RuntimeError):
+            self.job(FakeDetector(fail_on=2)).run_target('object_detection')
+
+        checkpoint = ReanalysisCheckpoint.objects.get(job_name='weights-v2', target='object_detection')
+        self.assertEqual((checkpoint.last_pk, checkpoint.processed, checkpoint.completed),
+                         (self.records[0].pk, 1, False))
+        names = [ObjectDetection.objects.get(pk=record.pk).detected_objects[0]['name'] for record in self.records]
+        self.assertEqual(names, ['cup', 'person', 'person'])
+
+        detector = FakeDetector()
+        checkpoint = self.job(detector).run_target('object_detection')
+        self.assertEqual(detector.calls, 2)  # Only the chunks not yet committed
+        self.assertEqual((checkpoint.processed, checkpoint.failed, checkpoint.completed), (3, 0, True))
+        self.assertEqual(set(DetectedObject.objects.values_list('class_name', flat=True)), {'cup'})
+        self.assertEqual(DailyDetectionCount.objects.get(class_name='person').count, 0)
+        self.assertEqual(DailyDetectionCount.objects.get(class_name='cup').count, 3)
+
+        detector = FakeDetector()
+        self.job(detector).run_target('object_detection')
+        self.assertEqual(detector.calls, 0)
+        self.job(detector).run_target('object_detection', reset=True)
+        self.assertEqual(detector.calls, 3)
+
+    def test_image_analysis_rows(self):
+        legacy = ImageAnalysis(user=self.user, analysis_type='object_detection', result={'objects': []})
+        legacy.image.save('legacy.png', ContentFile(self.image_bytes(90)), save=False)
+        legacy.save()
+        colors = ImageAnalysis.objects.create(
+            user=self.user, image='visual_assist/images/colors.png', analysis_type='color_analysis', result={}
+        )
+        missing = ImageAnalysis.objects.create(
+            user=self.user, image='visual_assist/images/gone.png', analysis_type='object_detection', result={}
+        )
+
+        checkpoint = self.job(FakeDetector()).run_target('image_analysis')
+        self.assertEqual((checkpoint.processed, checkpoint.failed), (1, 1))
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.result['image_size'], {'width': 32, 'height': 32})
+        self.assertEqual(legacy.result['analyses']['objects']['detections'][0]['center'], {'x': 0.5, 'y': 0.5})
+        colors.refresh_from_db()
+        missing.refresh_from_db()
+        self.assertEqual((colors.result, missing.result), ({}, {}))
+
+    def test_reanalysis_drops_cached_results_for_its_images(self):
+        image_hashes = [image_content_hash(self.image_bytes(shade)) for shade in (40, 120, 200)]
+        for image_hash in image_hashes:
+            store_image_detections(image_hash, {'detections': [], 'num_detections': 0})
+
+        with self.assertRaises(RuntimeError):
+            self.job(FakeDetector(fail_on=2)).run_target('object_detection')
+        self.assertEqual([get_image_detections(image_hash) is None for image_hash in image_hashes],
+                         [True, False, False])
+
+    def test_command_resumes_and_resets(self):
+        detector = FakeDetector()
+        with mock.patch('visual_assist.management.commands.reanalyze_detections.get_object_detection_service',
+                        return_value=detector):
+            call_command('reanalyze_detections', job='cli', target=['object_detection'], cpu_share=1.0,
+                         stdout=io.StringIO())
+            call_command('reanalyze_detections', job='cli', target=['object_detection'], cpu_share=1.0,
+                         stdout=io.StringIO())
+            self.assertEqual(detector.calls, 1)  # One batch of 3; the second run resumes a finished job
+            out = io.StringIO()
+            call_command('reanalyze_detections', job='cli', target=['object_detection'], cpu_share=1.0,
+                         reset=True, stdout=out)
+        self.assertEqual(detector.calls, 2)
+        self.assertIn('object_detection: 3 updated, 0 failed', out.getvalue())
+
+
+class VideoAnalyzerTests(SimpleTestCase):
+    def setUp(self):
+        # 4 s at 10 fps: black for 1 s, then a static white scene
+        handle = tempfile.NamedTemporaryFile(suffix='.avi', delete=False)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        writer = cv2.VideoWriter(handle.name, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+        if not writer.isOpened():
+            self.skipTest('OpenCV cannot write MJPG clips here')
+        for index in range(40):
+            writer.write(np.full((48, 64, 3), 0 if index < 10 else 255, dtype=np.uint8))
+        writer.release()
+        self.path = handle.name
+        self.analyzer = VideoAnalyzer(sample_fps=5.0, scene_threshold=0.12, min_gap=0.4, max_gap=2.0,
+                                      batch_size=2, queue_batches=1, max_side=32, merge_gap=2.0)
+
+    def test_keyframes_on_scene_change_and_max_gap(self):
+        stats = {'frames_sampled': 0}
+        keyframes = list(self.analyzer.iter_keyframes(self.path, stats))
+
+        self.assertEqual([round(timestamp, 3) for timestamp, _, _ in keyframes], [0.0, 1.0, 3.0])
+        self.assertGreater(keyframes[1][1], 0.9)  # Black to white
+        self.assertLess(keyframes[2][1], 0.12)  # Forced by max_gap, not by a change
+        self.assertEqual(keyframes[0][2].shape, (24, 32, 3))
+        self.assertEqual((stats['frames_read'], stats['frames_sampled']), (40, 20))
+
+    def test_max_duration_stops_decoding(self):
+        self.analyzer.max_duration = 1.5
+        stats = {'frames_sampled': 0}
+        self.assertEqual(len(list(self.analyzer.iter_keyframes(self.path, stats))), 2)
+        self.assertEqual(stats['frames_read'], 16)
+
+    def test_batches_and_timeline(self):
+        batches = []
+
+        def detect_batch(frames):
+            batches.append(len(frames))
+            return [{'detections': [detection('person', 0.5 + 0.1 * len(batches))]} for _ in frames]
+
+        result = self.analyzer.analyze(self.path, detect_batch)
+        self.assertEqual(batches, [2, 1])
+        self.assertEqual(result['num_keyframes'], 3)
+        self.assertEqual(result['object_counts'], {'person': 1})
+        entry = result['timeline'][0]
+        self.assertEqual((entry['first_seen'], entry['last_seen'], entry['sightings']), (0.0, 3.0, 3))
+        self.assertAlmostEqual(entry['confidence'], 0.7)
+
+    def test_detector_failure_stops_the_decoder(self):
+        def detect_batch(frames):
+            raise RuntimeError('out of memory')
+
+        with self.assertRaises(RuntimeError):
+            self.analyzer.analyze(self.path, detect_batch)
+        self.assertFalse([thread for thread in threading.enumerate() if thread.name == 'video-decode'])
+
+    def test_unreadable_clip(self):
+        with self.assertRaises(ValueError):
+            self.analyzer.analyze('/nonexistent/clip.mp4', lambda frames: [])
+
+
+class RecordingClassifier(AttributeClassifier):
+    """Labels each crop with its mean intensity and records batch sizes"""
+
+    name = 'recording'
+    classes = ('cup', 'bottle')
+    input_size = (16, 16)
+    min_size = 8
+
+    def __init__(self, delay=0.0):
+        self.batches = []
+        self.delay = delay
+
+    def classify_batch(self, crops):
+        self.batches.append(len(crops))
+        time.sleep(self.delay)
+        return [{'mean': round(float(crop.mean()))} for crop in crops]
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_result_count_mismatch_fails_every_caller(self):
+        batcher = MicroBatcher(lambda key, items: items[:-1], max_batch_size=3, max_wait=1.0, name='test.batcher')
+        futures = [batcher.submit(i) for i in range(3)]
+        for future in futures:
+            with self.assertRaisesMessage(ValueError, '2 results for 3 items'):
+                future.result(timeout=2)
+
+    def test_results_follow_items(self):
+        batcher = MicroBatcher(lambda key, items: [item * 2 for item in items], max_batch_size=2, name='test.batcher')
+        futures = [batcher.submit(i) for i in range(3)]
+        self.assertEqual([future.result(timeout=2) for future in futures], [0, 2, 4])
+
+
+def pixel_detection(name, x1, y1, x2, y2):
+    return {'name': name, 'confidence': 0.9, 'bounds': {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}}
+
+
+class AttributeCascadeTests(SimpleTestCase):
+    def setUp(self):
+        self.image = np.zeros((100, 100, 3), dtype=np.uint8)
+        self.image[:, 50:] = 200
+
+    def test_base_class_requires_classify_batch(self):
+        with self.assertRaises(TypeError):
+            AttributeClassifier()
+
+    def test_crops_of_one_frame_share_a_batch(self):
+        classifier = RecordingClassifier()
+        cascade = AttributeCascade([classifier], timeout=1.0, max_wait=0.05)
+        detections = [
+            pixel_detection('cup', 0, 0, 40, 40),
+            pixel_detection('bottle', 60, 0, 100, 40),
+            pixel_detection('cup', 10, 10, 14, 14),  # Under min_size
+            pixel_detection('person', 0, 0, 100, 100),  # No classifier for the class
+        ]
+
+        stats = cascade.annotate(self.image, detections)
+        self.assertEqual(classifier.batches, [2])
+        self.assertEqual((stats['crops'], stats['timed_out']), (2, 0))
+        self.assertEqual([detection.get('attributes') for detection in detections],
+                         [{'mean': 0}, {'mean': 200}, None, None])
+
+    def test_slow_classifier_is_cut_off_by_the_budget(self):
+        cascade = AttributeCascade([RecordingClassifier(delay=0.2)], timeout=0.01, max_wait=0.0)
+        detections = [pixel_detection('cup', 0, 0, 40, 40)]
+        self.assertEqual(cascade.annotate(self.image, detections)['timed_out'], 1)
+        self.assertNotIn('attributes', detections[0])
+
+    def test_disabled_cascade_does_nothing(self):
+        cascade = AttributeCascade([RecordingClassifier()], enabled=False)
+        self.assertEqual(cascade.annotate(self.image, [pixel_detection('cup', 0, 0, 40, 40)])['crops'], 0)
+
+    def test_traffic_light_states(self):
+        def lit(bgr):
+            crop = np.zeros((48, 24, 3), dtype=np.uint8)
+            crop[10:30, 6:18] = bgr
+            return crop
+
+        results = TrafficLightClassifier().classify_batch(
+            [lit((0, 0, 255)), lit((0, 255, 0)), np.zeros((48, 24, 3), dtype=np.uint8)]
+        )
+        self.assertEqual([result['state'] for result in results], ['red', 'green', 'unknown'])
+
+
+class CropSizeOCRBackend(OCRBackend):
+    """Reads each crop as one word naming its size; the worker that finds the crash marker file exits"""
+
+    name = 'crop-size'
+
+    def recognize(self, gray, language='en', single_block=False):
+        # Spawned pool workers inherit the environment, not patched attributes
+        crash_marker = os.environ.get('OCR_TEST_CRASH_MARKER')
+        if crash_marker and os.path.exists(crash_marker):
+            os.remove(crash_marker)
+            os._exit(1)
+        return [{'text': f'{gray.shape[1]}x{gray.shape[0]}', 'confidence': 0.9,
+                 'x': 1, 'y': 2, 'width': gray.shape[1] - 2, 'height': gray.shape[0] - 4}]
+
+
+class OCRServiceTests(SimpleTestCase):
+    regions = [(0, 0, 40, 10), (10, 20, 70, 32)]
+
+    def setUp(self):
+        self.service = OCRService(backend_name='visual_assist.tests.CropSizeOCRBackend', workers=2)
+        self.addCleanup(lambda: self.service._pool and self.service._pool.shutdown())
+        self.image = np.zeros((40, 80), dtype=np.uint8)
+
+    def extract(self):
+        with mock.patch.object(self.service, 'detect_text_regions', return_value=self.regions):
+            return self.service.extract_text(self.image)
+
+    def test_base_class_requires_recognize(self):
+        with self.assertRaises(TypeError):
+            OCRBackend()
+
+    def test_crops_run_on_the_pool(self):
+        result = self.extract()
+        self.assertEqual(self.service._pool._mp_context.get_start_method(), 'spawn')
+        self.assertEqual(result['text'], '40x10\n60x12')
+        self.assertEqual([(box['x'], box['y']) for box in result['bounding_boxes']], [(1, 2), (11, 22)])
+
+    def test_pool_is_replaced_after_a_worker_dies(self):
+        handle = tempfile.NamedTemporaryFile(delete=False)
+        handle.close()
+        self.addCleanup(lambda: os.path.exists(handle.name) and os.unlink(handle.name))
+
+        with mock.patch.dict(os.environ, {'OCR_TEST_CRASH_MARKER': handle.name}):
+            first_pool = self.service._get_pool()
+            result = self.extract()
+        self.assertFalse(os.path.exists(handle.name))  # A worker did crash
+        self.assertEqual(result['text'], '40x10\n60x12')
+        self.assertIsNotNone(self.service._pool)
+        self.assertIsNot(self.service._pool, first_pool)
+
+
+def frame_upload(name='frame.png'):
+    """A bright, sharp frame that passes the quality gate"""
+    frame = np.random.default_rng(0).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    return SimpleUploadedFile(name, cv2.imencode('.png', frame)[1].tobytes(), content_type='image/png')
+
+
+class RealtimeDetectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = get_user_model().objects.create_user(username='walker', password='pw')
+
+    def post(self, view, path, data):
+        request = self.factory.post(path, data, format='multipart')
+        force_authenticate(request, self.user)
+        return view(request)
+
+    def test_failed_inference_is_an_error_and_is_not_kept(self):
+        detector = mock.Mock()
+        detector.detect_objects.return_value = {
+            'detections': [], 'num_detections': 0, 'processing_time': 0.01, 'error': 'YOLOv5 detection failed: oom',
+        }
+        with mock.patch('visual_assist.views.get_object_detection_service', return_value=detector), \
+                mock.patch('visual_assist.views.store_last_detections') as store, \
+                mock.patch('visual_assist.views.motion_gate.update') as update:
+            response = self.post(detect_objects_realtime, '/api/visual-assist/detect-objects/',
+                                 {'image': frame_upload()})
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(response.data['success'])
+        self.assertIn('oom', response.data['error'])
+        self.assertFalse(ObjectDetection.objects.exists())
+        self.assertFalse(DetectedObject.objects.exists())
+        store.assert_not_called()
+        update.assert_not_called()
+
+
+def qr_frame(payload='https://a11ypal.example/door/4'):
+    """800x600 white frame with a QR code whose modules are 6 px, placed at (300, 100)"""
+    code = cv2.QRCodeEncoder.create().encode(payload)
+    code = cv2.resize(code, None, fx=6, fy=6, interpolation=cv2.INTER_NEAREST)
+    frame = np.full((600, 800, 3), 255, dtype=np.uint8)
+    frame[100:100 + code.shape[0], 300:300 + code.shape[1]] = code[..., None]
+    return frame
+
+
+class CodeScannerTests(SimpleTestCase):
+    def test_qr_code_is_decoded_with_its_bounds(self):
+        # Located on a 400 px copy, decoded from the full frame
+        result = CodeScanner(detect_size=400).scan(qr_frame())
+
+        self.assertEqual(result['num_codes'], 1)
+        code = result['codes'][0]
+        self.assertEqual((code['type'], code['data']), ('QR_CODE', 'https://a11ypal.example/door/4'))
+        # The symbol starts after a 2-module (12 px) quiet zone
+        expected = {'x': 312 / 800, 'y': 112 / 600, 'width': 150 / 800, 'height': 150 / 600}
+        for key, value in expected.items():
+            self.assertAlmostEqual(code['bounds'][key], value, delta=0.01, msg=key)
+
+    def test_blank_frame_has_no_codes(self):
+        self.assertEqual(CodeScanner().scan(np.full((240, 320, 3), 255, dtype=np.uint8))['codes'], [])
+
+
+class ScanCodesViewTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = get_user_model().objects.create_user(username='scanner', password='pw')
+
+    def post(self, data):
+        request = self.factory.post('/api/visual-assist/scan-codes/', data, format='multipart')
+        force_authenticate(request, self.user)
+        return scan_codes(request)
+
+    def qr_upload(self):
+        return SimpleUploadedFile('code.png', cv2.imencode('.png', qr_frame())[1].tobytes(), content_type='image/png')
+
+    def test_image_is_required(self):
+        response = self.post({})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Image file required'})
+
+    def test_detector_error_still_returns_codes(self):
+        detector = mock.Mock()
+        detector.detect_objects.return_value = {
+            'detections': [], 'num_detections': 0, 'processing_time': 0.01, 'error': 'YOLOv5 detection failed: oom',
+        }
+        with mock.patch('visual_assist.views.get_object_detection_service', return_value=detector):
+            response = self.post({'image': self.qr_upload(), 'detect_objects': 'true'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([code['data'] for code in response.data['codes']], ['https://a11ypal.example/door/4'])
+        self.assertEqual(response.data['detections'], [])
+        self.assertEqual(response.data['detection_error'], 'Object detection failed: YOLOv5 detection failed: oom')
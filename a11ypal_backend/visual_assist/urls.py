@@ -17,6 +17,12 @@ urlpatterns = [
     path('detect-test/', views.detect_objects_test, name='detect-objects-test'),
     path('detect-simple/', views.detect_objects_test_simple, name='detect-objects-simple'),
     
+    # Video clips
+    path('analyze-video/', views.analyze_video, name='analyze-video'),
+    
+    # QR codes and barcodes
+    path('scan-codes/', views.scan_codes, name='scan-codes'),
+    
     # Scene Description
     path('scene-description/', views.SceneDescriptionListView.as_view(), name='scene-description-list'),
     path('describe-scene/', views.describe_scene, name='describe-scene'),
@@ -30,6 +36,7 @@ urlpatterns = [
     
     # Statistics
     path('stats/', views.visual_assist_stats, name='visual-assist-stats'),
+    path('detection-trends/', views.detection_trends, name='detection-trends'),
     
     # Test endpoint (no authentication required)
     path('test/', views.test_api, name='test-api'),
@@ -3,20 +3,41 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Avg, Count, Sum
+from django.utils import timezone
+from datetime import timedelta
+import time
 import cv2
 import numpy as np
 from PIL import Image
 import io
 from .models import (
     ImageAnalysis, TextRecognition, ObjectDetection, 
-    SceneDescription, ColorAnalysis, VisualAssistSession
+    SceneDescription, ColorAnalysis, VisualAssistSession,
+    DetectedObject, DailyDetectionCount
 )
 from .serializers import (
     ImageAnalysisSerializer, TextRecognitionSerializer, ObjectDetectionSerializer,
     SceneDescriptionSerializer, ColorAnalysisSerializer, VisualAssistSessionSerializer,
     ImageAnalysisCreateSerializer
 )
-from services.object_detection_service import get_object_detection_service
+from services.object_detection_service import format_detections, get_object_detection_service
+from services.attribute_classifiers import get_attribute_cascade
+from services.code_scanner import get_code_scanner
+from services.color_analysis_service import get_color_analysis_service
+from services.ocr_service import get_ocr_service
+from services.image_decoding import decode_image, decode_thumbnail
+from services.uploads import read_upload
+from services.image_pipeline import DecodedImage, analysis_executor, run_analyses
+from services.scene_description import describe_detections
+from services.video_analysis import get_video_analyzer, upload_path
+from services.frame_gates import (
+    FrameQualityGate, MotionGate, frame_session_key, get_last_detections, store_last_detections
+)
+
+quality_gate = FrameQualityGate.from_settings()
+motion_gate = MotionGate.from_settings()
 
 
 class ImageAnalysisListView(generics.ListCreateAPIView):
@@ -61,7 +82,9 @@ class ObjectDetectionListView(generics.ListCreateAPIView):
         return ObjectDetection.objects.filter(user=self.request.user).order_by('-created_at')
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # Row and index rows (post_save receiver) commit together
+        with transaction.atomic():
+            serializer.save(user=self.request.user)
 
 
 class SceneDescriptionListView(generics.ListCreateAPIView):
@@ -103,33 +126,50 @@ class VisualAssistSessionListView(generics.ListCreateAPIView):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def analyze_image(request):
-    """Analyze uploaded image with AI"""
+    """Run one or more analyses over a single decode of the uploaded image"""
     serializer = ImageAnalysisCreateSerializer(data=request.data, context={'request': request})
     
-    if serializer.is_valid():
-        # Here you would integrate with your AI service
-        # For now, we'll create a mock response
-        image_analysis = serializer.save()
-        
-        # Mock AI analysis results
-        mock_result = {
-            'objects_detected': ['person', 'car', 'building'],
-            'confidence_scores': [0.95, 0.87, 0.92],
-            'bounding_boxes': [
-                {'object': 'person', 'x': 100, 'y': 150, 'width': 80, 'height': 120},
-                {'object': 'car', 'x': 200, 'y': 200, 'width': 150, 'height': 100},
-                {'object': 'building', 'x': 50, 'y': 50, 'width': 200, 'height': 300}
-            ]
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    start_time = time.time()
+    image = serializer.validated_data['image']
+    analyses = serializer.validated_data['analyses']
+    
+    decoded = DecodedImage(read_upload(image))
+    try:
+        # Header only: stages answered from caches never decode the pixels
+        decoded.shape
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Independent stages run concurrently; a failed stage is reported, not fatal
+    pipeline = run_analyses(decoded, analyses, {'language': request.data.get('language', 'en')})
+    results = pipeline['results']
+    
+    if 'objects' in results:
+        results['objects'] = {
+            **results['objects'],
+            'detections': format_detections(results['objects']['detections'], decoded.shape),
         }
-        
-        image_analysis.result = mock_result
-        image_analysis.confidence_score = 0.91
-        image_analysis.processing_time = 2.5
-        image_analysis.save()
-        
-        return Response(ImageAnalysisSerializer(image_analysis).data, status=status.HTTP_201_CREATED)
     
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    confidences = [
+        result['confidence'] for result in results.values()
+        if isinstance(result.get('confidence'), float)
+    ]
+    
+    image_analysis = serializer.save(
+        result={
+            'analyses': results,
+            'errors': pipeline['errors'],
+            'timings': pipeline['timings'],
+            'image_size': {'width': decoded.shape[1], 'height': decoded.shape[0]},
+        },
+        confidence_score=sum(confidences) / len(confidences) if confidences else None,
+        processing_time=time.time() - start_time,
+    )
+    
+    return Response(ImageAnalysisSerializer(image_analysis).data, status=status.HTTP_201_CREATED)
 
 
 @api_view(['POST'])
@@ -252,16 +292,48 @@ def detect_objects_realtime(request):
     try:
         print(f"🔍 Starting object detection...")
         
+        start_time = time.time()
+        
         # Get the uploaded image
         image_file = request.FILES['image']
         print(f"📸 Image file received: {image_file.name}, size: {image_file.size}")
+        image_bytes = read_upload(image_file)
+        session_key = frame_session_key(request)
         
-        # Convert PIL Image to OpenCV format
-        image_pil = Image.open(image_file)
-        print(f"🖼️ PIL Image opened: {image_pil.size}, mode: {image_pil.mode}")
+        # Quality gate on a reduced grayscale decode before paying for full decode and inference
+        thumbnail = decode_thumbnail(image_bytes, quality_gate.thumbnail_size)
+        quality = quality_gate.check(thumbnail)
+        if not quality['passed']:
+            print(f"⏭️ Skipping inference, frame is {quality['reason']}")
+            last_detections = get_last_detections(session_key) or []
+            return Response({
+                'detections': last_detections,
+                'num_detections': len(last_detections),
+                'processing_time': time.time() - start_time,
+                'retake': True,
+                'retake_reason': quality['reason'],
+                'quality': quality,
+                'success': True
+            }, status=status.HTTP_200_OK)
         
-        image_cv = cv2.cvtColor(np.array(image_pil), cv2.COLOR_RGB2BGR)
-        print(f"🔄 Converted to OpenCV: {image_cv.shape}")
+        # Static scene: reuse the previous detections instead of decoding and inferring again
+        last_detections = get_last_detections(session_key)
+        motion = motion_gate.check(session_key, thumbnail, can_reuse=last_detections is not None)
+        if motion['reuse']:
+            print(f"⏭️ Skipping inference, scene unchanged (score {motion['score']:.4f})")
+            return Response({
+                'detections': last_detections,
+                'num_detections': len(last_detections),
+                'processing_time': time.time() - start_time,
+                'reused': True,
+                'motion_score': motion['score'],
+                'retake': False,
+                'quality': quality,
+                'success': True
+            }, status=status.HTTP_200_OK)
+        
+        image_cv = decode_image(image_bytes)
+        print(f"🔄 Decoded to OpenCV: {image_cv.shape}")
         
         # Get object detection service
         print(f"🔧 Getting detection service...")
@@ -285,6 +357,9 @@ def detect_objects_realtime(request):
         try:
             detection_result = detection_service.detect_objects(image_cv)
             print(f"📊 Detection result: {detection_result}")
+            if detection_result.get('error'):
+                # Never store, index or reuse the empty result of a failed inference
+                raise RuntimeError(detection_result['error'])
         except Exception as e:
             print(f"❌ Object detection failed: {str(e)}")
             print(f"❌ Detection error type: {type(e).__name__}")
@@ -297,40 +372,38 @@ def detect_objects_realtime(request):
                 'success': False
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+        # Second stage: attributes for traffic lights, doors and people, within a latency budget
+        attribute_stats = get_attribute_cascade().annotate(image_cv, detection_result['detections'])
+        
         # Save detection to database (only if user is authenticated)
         detection_record = None
         if request.user.is_authenticated:
-            detection_record = ObjectDetection.objects.create(
-                user=request.user,
-                image=image_file,
-                detected_objects=detection_result['detections']
-            )
+            # The post_save receiver indexes the row in the same transaction
+            with transaction.atomic():
+                detection_record = ObjectDetection.objects.create(
+                    user=request.user,
+                    image=image_file,
+                    detected_objects=detection_result['detections'],
+                    session_key=session_key
+                )
         
         # Format response for frontend
-        formatted_detections = []
-        for detection in detection_result['detections']:
-            formatted_detections.append({
-                'id': f"{detection['class_id']}_{len(formatted_detections)}",
-                'name': detection['name'],
-                'confidence': detection['confidence'],
-                'bounds': {
-                    'x': detection['bounds']['x'],  # Already normalized
-                    'y': detection['bounds']['y'],  # Already normalized
-                    'width': detection['bounds']['width'],  # Already normalized
-                    'height': detection['bounds']['height']  # Already normalized
-                },
-                'center': {
-                    'x': detection['center']['x'] / image_cv.shape[1],  # Normalize to 0-1
-                    'y': detection['center']['y'] / image_cv.shape[0]   # Normalize to 0-1
-                }
-            })
+        formatted_detections = format_detections(detection_result['detections'], image_cv.shape)
+        
+        store_last_detections(session_key, formatted_detections)
+        motion_gate.update(session_key, motion['thumbnail'])
         
         return Response({
             'detections': formatted_detections,
             'num_detections': detection_result['num_detections'],
             'processing_time': detection_result['processing_time'],
+            'attribute_time': attribute_stats['attribute_time'],
             'session_id': detection_record.id if detection_record else None,
             'model_info': detection_result.get('model_info', {}),
+            'reused': False,
+            'motion_score': motion['score'],
+            'retake': False,
+            'quality': quality,
             'success': True
         }, status=status.HTTP_200_OK)
         
@@ -348,6 +421,38 @@ def detect_objects_realtime(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def analyze_video(request):
+    """Build an obstacle timeline from a short video clip"""
+    if 'video' not in request.FILES:
+        return Response({'error': 'Video file required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    video = request.FILES['video']
+    
+    try:
+        detection_service = get_object_detection_service()
+    except Exception as e:
+        return Response({
+            'error': f'Detection service failed to load: {str(e)}',
+            'success': False
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    try:
+        suffix = '.' + video.name.rsplit('.', 1)[-1] if '.' in video.name else '.mp4'
+        with upload_path(video, suffix) as path:
+            result = get_video_analyzer().analyze(path, detection_service.detect_objects_batch)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({
+            'error': f'Video analysis failed: {str(e)}',
+            'success': False
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response({**result, 'success': True}, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def extract_text(request):
@@ -358,22 +463,23 @@ def extract_text(request):
     image = request.FILES['image']
     language = request.data.get('language', 'en')
     
-    # Mock OCR result
-    mock_text = "This is a sample text extracted from the image using OCR technology."
-    mock_confidence = 0.95
-    mock_bounding_boxes = [
-        {'text': 'This is a sample', 'x': 10, 'y': 20, 'width': 200, 'height': 30},
-        {'text': 'text extracted from', 'x': 10, 'y': 60, 'width': 250, 'height': 30},
-        {'text': 'the image using OCR', 'x': 10, 'y': 100, 'width': 220, 'height': 30}
-    ]
+    try:
+        image_cv = decode_image(read_upload(image))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        ocr_result = get_ocr_service().extract_text(image_cv, language)
+    except Exception as e:
+        return Response({'error': f'Text extraction failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     text_recognition = TextRecognition.objects.create(
         user=request.user,
         image=image,
-        extracted_text=mock_text,
+        extracted_text=ocr_result['text'],
         language=language,
-        confidence_score=mock_confidence,
-        bounding_boxes=mock_bounding_boxes
+        confidence_score=ocr_result['confidence'],
+        bounding_boxes=ocr_result['bounding_boxes']
     )
     
     return Response(TextRecognitionSerializer(text_recognition).data, status=status.HTTP_201_CREATED)
@@ -382,26 +488,59 @@ def extract_text(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def describe_scene(request):
-    """Generate AI description of the scene in uploaded image"""
+    """Describe the scene in an uploaded image from its detections and colors"""
     if 'image' not in request.FILES:
         return Response({'error': 'Image file required'}, status=status.HTTP_400_BAD_REQUEST)
     
     image = request.FILES['image']
+    decoded = DecodedImage(read_upload(image))
+    session_key = frame_session_key(request)
+    
+    # The reduced decode is cheap, validates the upload and feeds the motion
+    # gate; derived like detect-objects-realtime's so the two compare alike
+    try:
+        thumbnail = decode_thumbnail(decoded.data, quality_gate.thumbnail_size)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # A frame the session's camera just sent (unchanged scene) reuses its
+    # detections; the check leaves the camera stream's reuse budget alone
+    detections = get_last_detections(session_key)
+    if detections is not None and motion_gate.unchanged(session_key, thumbnail):
+        pipeline = run_analyses(decoded, ['colors'])
+        source = 'session'
+    else:
+        # Objects come from the content-hash cache when this image was seen before
+        pipeline = run_analyses(decoded, ['objects', 'colors'])
+        detections = None
+        if 'objects' in pipeline['results']:
+            detections = pipeline['results']['objects']['detections']
+            source = 'cache' if pipeline['results']['objects']['cached'] else 'detector'
+    
+    if detections is None:
+        return Response({
+            'error': f"Scene description failed: {pipeline['errors'].get('objects')}",
+            'success': False
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    # Mock scene description
-    mock_description = "A busy city street with pedestrians walking on the sidewalk, cars driving on the road, and tall buildings in the background. The scene appears to be during daylight hours with good lighting conditions."
-    mock_confidence = 0.88
-    mock_tags = ['city', 'street', 'pedestrians', 'cars', 'buildings', 'daylight']
+    scene = describe_detections(detections, pipeline['results'].get('colors'))
     
     scene_description = SceneDescription.objects.create(
         user=request.user,
         image=image,
-        description=mock_description,
-        confidence_score=mock_confidence,
-        tags=mock_tags
+        description=scene['description'],
+        confidence_score=scene['confidence'],
+        tags=scene['tags']
     )
     
-    return Response(SceneDescriptionSerializer(scene_description).data, status=status.HTTP_201_CREATED)
+    response_data = SceneDescriptionSerializer(scene_description).data
+    response_data.update({
+        'object_counts': scene['object_counts'],
+        'layout': scene['layout'],
+        'detection_source': source,
+        'generation_time': scene['generation_time'],
+    })
+    return Response(response_data, status=status.HTTP_201_CREATED)
 
 
 @api_view(['POST'])
@@ -413,30 +552,83 @@ def analyze_colors(request):
     
     image = request.FILES['image']
     
-    # Mock color analysis
-    mock_dominant_colors = [
-        {'color': '#FF5733', 'percentage': 35},
-        {'color': '#33FF57', 'percentage': 25},
-        {'color': '#3357FF', 'percentage': 20},
-        {'color': '#FF33F5', 'percentage': 20}
-    ]
-    
-    mock_color_palette = [
-        '#FF5733', '#33FF57', '#3357FF', '#FF33F5', '#F5FF33',
-        '#33F5FF', '#F533FF', '#57FF33', '#FF3357', '#33FF57'
-    ]
-    
-    accessibility_rating = 'good'  # Based on color contrast analysis
+    try:
+        analysis = get_color_analysis_service().analyze_cached(read_upload(image))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     color_analysis = ColorAnalysis.objects.create(
         user=request.user,
         image=image,
-        dominant_colors=mock_dominant_colors,
-        color_palette=mock_color_palette,
-        accessibility_rating=accessibility_rating
+        dominant_colors=analysis['dominant_colors'],
+        color_palette=analysis['color_palette'],
+        accessibility_rating=analysis['accessibility_rating']
     )
     
-    return Response(ColorAnalysisSerializer(color_analysis).data, status=status.HTTP_201_CREATED)
+    response_data = ColorAnalysisSerializer(color_analysis).data
+    response_data.update({
+        'background_color': analysis['background_color'],
+        'foreground_color': analysis['foreground_color'],
+        'contrast_ratio': analysis['contrast_ratio'],
+        'processing_time': analysis['processing_time'],
+        'cached': analysis['cached'],
+    })
+    return Response(response_data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def scan_codes(request):
+    """Decode QR codes and barcodes, optionally running object detection on the same decode"""
+    if 'image' not in request.FILES:
+        return Response({'error': 'Image file required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    run_detection = str(request.data.get('detect_objects', 'false')).lower() in ('1', 'true', 'yes')
+    
+    try:
+        image_cv = decode_image(read_upload(request.FILES['image']))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        # Object detection runs alongside the scan on the same decoded image
+        detection_future = None
+        if run_detection:
+            detection_future = analysis_executor.submit(
+                lambda: get_object_detection_service().detect_objects(image_cv)
+            )
+        
+        scan_result = get_code_scanner().scan(image_cv)
+        response_data = {
+            'codes': scan_result['codes'],
+            'num_codes': scan_result['num_codes'],
+            'processing_time': scan_result['processing_time'],
+            'image_size': {'width': image_cv.shape[1], 'height': image_cv.shape[0]},
+            'success': True
+        }
+        
+        if detection_future is not None:
+            # Codes are still returned when the detector is unavailable
+            try:
+                detection_result = detection_future.result()
+                # The detector reports most failures in its result rather than raising
+                if detection_result.get('error'):
+                    raise Exception(detection_result['error'])
+                response_data['detections'] = format_detections(detection_result['detections'], image_cv.shape)
+                response_data['num_detections'] = detection_result['num_detections']
+                response_data['detection_time'] = detection_result['processing_time']
+            except Exception as e:
+                response_data['detections'] = []
+                response_data['detection_error'] = f'Object detection failed: {str(e)}'
+        
+        return Response(response_data, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return Response({
+            'error': f'Code scanning failed: {str(e)}',
+            'codes': [],
+            'success': False
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 @api_view(['GET'])
@@ -457,6 +649,44 @@ def visual_assist_stats(request):
     return Response(stats)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def detection_trends(request):
+    """Most frequent detected classes over the last N days, overall and for the user"""
+    try:
+        days = max(1, min(int(request.query_params.get('days', 30)), 365))
+    except ValueError:
+        return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    since = timezone.localdate() - timedelta(days=days - 1)
+    
+    overall = (
+        DailyDetectionCount.objects.filter(date__gte=since)
+        .values('class_name')
+        .annotate(count=Sum('count'), confidence_sum=Sum('confidence_sum'))
+        .order_by('-count')[:20]
+    )
+    user_counts = (
+        DetectedObject.objects.filter(user=request.user, date__gte=since)
+        .values('class_name')
+        .annotate(count=Count('id'), average_confidence=Avg('confidence'))
+        .order_by('-count')[:20]
+    )
+    
+    return Response({
+        'days': days,
+        'since': since,
+        'classes': [
+            {
+                'class_name': row['class_name'],
+                'count': row['count'],
+                'average_confidence': row['confidence_sum'] / row['count'] if row['count'] else 0.0,
+            }
+            for row in overall
+        ],
+        'user_classes': list(user_counts),
+    })
+
+
 @api_view(['GET'])
 @permission_classes([])  # No authentication required for testing
 def test_api(request):